@@ -0,0 +1,144 @@
+# backend/alternatives.py
+"""
+备选路线（via-node法）：一次正向最短路径树 + 一次反向最短路径树，生成多条差异明显的备选路线
+- 两棵树都只搜索到 (1 + 最大伸长比) × 最优代价 为止
+- 任一同时被两棵树确定的节点v都对应一条候选路线：起点 →(正向树)→ v →(反向树)→ 终点
+- 候选按总代价升序检查：简单路径、与已选路线的重合长度比例、局部最优（T检验，排除绕圈的迂回路线）
+- 已检查过的候选路线上的节点不再作为via节点重复检查（同一平台路段上的via节点产生相同路线）
+"""
+import heapq
+import math
+
+from routing_engine import NoPathError, RouteResult
+
+# 默认备选路线与已选路线的最大重合长度比例
+DEFAULT_MAX_SHARE = 0.5
+# 默认备选路线相对最优路线的最大代价伸长比
+DEFAULT_MAX_STRETCH = 0.3
+# 局部最优检验的区间长度（占最优代价的比例）
+LOCAL_OPTIMALITY_RATIO = 0.25
+
+
+def alternative_routes(engine, source_id: int, target_id: int, alpha: float, primary: RouteResult,
+                       count: int, max_share: float = DEFAULT_MAX_SHARE,
+                       max_stretch: float = DEFAULT_MAX_STRETCH):
+    """
+    生成最多count条备选路线（不含primary）
+    :param engine: RoutingEngine
+    :param source_id: 起点节点ID
+    :param target_id: 终点节点ID
+    :param alpha: 坡度权重α（与primary一致）
+    :param primary: 已求得的最优路线
+    :param count: 备选路线数上限
+    :param max_share: 与已选路线（含primary）重合长度占本路线长度的比例上限
+    :param max_stretch: 代价伸长比上限（备选代价 ≤ (1 + max_stretch) × 最优代价）
+    :return: ([(RouteResult, 重合比例, 伸长比)], 两棵树确定的节点总数)
+    """
+    engine.check_reachable(source_id, target_id)
+    source = engine.index_of[source_id]
+    target = engine.index_of[target_id]
+    weights, _ = engine.weights_for(alpha)
+    indptr, indices = engine.adjacency
+    dist_f, pred_f = _search_tree(indptr, indices, None, weights, source, target, max_stretch)
+    if target not in dist_f:
+        raise NoPathError(f"起点{source_id}到终点{target_id}无可达路径")
+    optimal = dist_f[target]
+    limit = optimal * (1 + max_stretch)
+    rev_indptr, rev_tails, rev_positions = engine.reverse_adjacency
+    dist_b, pred_b = _search_tree(rev_indptr, rev_tails, rev_positions, weights, target, None, max_stretch, limit)
+    settled = len(dist_f) + len(dist_b)
+
+    lengths = engine.length_m
+    chosen_edges = set(int(engine.edge_id[pos]) for pos in primary.edge_positions)
+    covered = set(engine.index_of[node_id] for node_id in primary.node_path)
+    candidates = sorted(
+        (dist_f[v] + d, v) for v, d in dist_b.items()
+        if v in dist_f and dist_f[v] + d <= limit
+    )
+    result = []
+    for total, v in candidates:
+        if len(result) >= count:
+            break
+        if v in covered:
+            continue
+        positions = _via_path(engine, pred_f, pred_b, source, target, v)
+        nodes = [source] + [int(engine.indices[pos]) for pos in positions]
+        covered.update(nodes)
+        if len(set(nodes)) != len(nodes):
+            continue  # 正反向树拼接出现回头路
+        length = float(sum(lengths[pos] for pos in positions))
+        shared = float(sum(lengths[pos] for pos in positions if int(engine.edge_id[pos]) in chosen_edges))
+        share = shared / length if length > 0 else 1.0
+        if share > max_share:
+            continue
+        if not _locally_optimal(engine, alpha, weights, positions, nodes, dist_f[v], optimal * LOCAL_OPTIMALITY_RATIO):
+            continue
+        chosen_edges.update(int(engine.edge_id[pos]) for pos in positions)
+        node_path = [int(engine.node_ids[i]) for i in nodes]
+        stretch = total / optimal - 1 if optimal > 0 else 0.0
+        result.append((RouteResult(node_path, positions, total, settled), share, stretch))
+    return result, settled
+
+
+def _search_tree(indptr, heads, positions, weights, root: int, target, max_stretch: float, limit: float = math.inf):
+    """
+    受限Dijkstra最短路径树
+    :param positions: 反向邻接的正向CSR边下标列表（正向搜索传None）
+    :param target: 正向搜索的终点下标，确定后把上限收紧为 (1 + max_stretch) × 最优代价
+    :return: (节点下标 → 代价, 节点下标 → 树边CSR下标)
+    """
+    dist = {}
+    best = {root: 0.0}
+    pred = {}
+    heap = [(0.0, root)]
+    while heap:
+        d, u = heapq.heappop(heap)
+        if u in dist:
+            continue
+        if d > limit:
+            break
+        dist[u] = d
+        if u == target:
+            limit = d * (1 + max_stretch)
+        for k in range(indptr[u], indptr[u + 1]):
+            v = heads[k]
+            pos = k if positions is None else positions[k]
+            nd = d + weights[pos]
+            if v not in dist and nd < best.get(v, math.inf):
+                best[v] = nd
+                pred[v] = pos
+                heapq.heappush(heap, (nd, v))
+    return dist, pred
+
+
+def _via_path(engine, pred_f, pred_b, source: int, target: int, via: int) -> list:
+    """起点 →(正向树)→ via →(反向树)→ 终点 的CSR边下标序列"""
+    head = []
+    v = via
+    while v != source:
+        pos = pred_f[v]
+        head.append(pos)
+        v = int(engine.src[pos])
+    head.reverse()
+    v = via
+    while v != target:
+        pos = pred_b[v]
+        head.append(pos)
+        v = int(engine.indices[pos])
+    return head
+
+
+def _locally_optimal(engine, alpha, weights, positions, nodes, via_cost: float, window: float) -> bool:
+    """T检验：via节点前后各window/2代价范围内的子路径必须是最短路径，否则视为迂回路线"""
+    cum = [0.0]
+    for pos in positions:
+        cum.append(cum[-1] + weights[pos])
+    a = max((i for i, c in enumerate(cum) if c <= via_cost - window / 2), default=0)
+    b = min((i for i, c in enumerate(cum) if c >= via_cost + window / 2), default=len(cum) - 1)
+    if b - a <= 1:
+        return True
+    try:
+        shortest = engine.shortest_path(int(engine.node_ids[nodes[a]]), int(engine.node_ids[nodes[b]]), alpha).cost
+    except NoPathError:
+        return False
+    return shortest >= (cum[b] - cum[a]) * (1 - 1e-9)
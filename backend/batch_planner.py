@@ -0,0 +1,144 @@
+# backend/batch_planner.py
+"""
+批量路径规划：多进程并行执行大量起终点规划任务
+- 工作进程池按路网图快照版本（及当前已就绪的CH）创建，初始化时一次性接收RoutingEngine/SnapIndex/CH，之后每个任务只传起终点
+- 每个任务在工作进程内独立完成搜索、结果展开与（可选）20米采样高程/坡度插值，工作进程各自持有数据库会话
+- 任务完成即返回（as_completed），单个任务失败只记录错误，不影响其他任务
+"""
+import os
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from concurrent.futures.process import BrokenProcessPool
+
+import database
+from path_sampling import path_20m_sampling, path_interpolate_elevation_slope
+from route_summary import summarize_snapped_route
+from routing_engine import NoPathError
+from snapping import snapped_route
+from terrain_sampler import reset_terrain_sampler
+from terrain_store import reset_terrain_store
+
+# 默认工作进程数
+DEFAULT_WORKERS = min(4, os.cpu_count() or 1)
+# 单次批量请求最多任务数
+MAX_BATCH_JOBS = 5000
+
+# 工作进程内的只读状态（由_init_worker在进程启动时写入）
+_worker = {}
+
+
+def _init_worker(engine, snap_index, chs: dict) -> None:
+    # Linux下进程池以fork启动：子进程继承了父进程的数据库连接池（与服务进程共用Postgres套接字）
+    # 以及已缓存的地形采样器（含父进程的数据库引擎、分块缓存与锁状态），全部丢弃后在子进程内按需重新建立
+    database.engine.dispose(close=False)
+    reset_terrain_sampler()
+    reset_terrain_store()
+    _worker.update(engine=engine, snap_index=snap_index, chs=chs, db=None)
+
+
+def _worker_db():
+    """工作进程内的数据库会话（首次使用时创建，进程内复用）"""
+    if _worker.get("db") is None:
+        _worker["db"] = database.SessionLocal()
+    return _worker["db"]
+
+
+def run_job(job: dict) -> dict:
+    """
+    工作进程内执行单个规划任务
+    :param job: {"index": 任务序号, "start"/"end": SnapPoint, "strategy": 策略, "alpha": 坡度权重α, "sampling": 是否采样}
+    :return: {"index", "status": "ok"/"error", "elapsed_ms", "data"/"error"}
+    """
+    started = time.perf_counter()
+    result = {"index": job["index"]}
+    engine, alpha = _worker["engine"], job["alpha"]
+    ch = _worker["chs"].get(alpha)
+    try:
+        def search(s, t):
+            if ch is not None:
+                return ch.shortest_path(engine, s, t)
+            return engine.shortest_path(s, t, alpha)
+
+        route = snapped_route(engine, job["start"], job["end"], search, alpha)
+        summary = summarize_snapped_route(engine, _worker["snap_index"], route, job["start"], job["end"], alpha)
+        data = {
+            "strategy": job["strategy"],
+            "slope_weight_alpha": alpha,
+            "search_method": "ch" if ch is not None else "astar",
+            "start_snap": job["start"].to_dict(),
+            "end_snap": job["end"].to_dict(),
+            **summary
+        }
+        if job["sampling"]:
+            db = _worker_db()
+            try:
+                data["sampling_result"] = path_interpolate_elevation_slope(path_20m_sampling(summary["coord_path"]), db)
+            finally:
+                db.rollback()  # 结束只读事务，避免长时间占用连接
+        result.update(status="ok", data=data)
+    except NoPathError:
+        result.update(status="error", error="起点到终点无可达路径")
+    except Exception as e:
+        result.update(status="error", error=f"规划异常：{str(e)[:200]}")
+    result["elapsed_ms"] = round((time.perf_counter() - started) * 1000, 2)
+    return result
+
+
+class BatchPlanner:
+    """
+    批量规划执行器（全局单例）：复用同一个进程池，直到路网图版本或可用CH发生变化
+    :param max_workers: 工作进程数
+    """
+
+    def __init__(self, max_workers: int = DEFAULT_WORKERS):
+        self.max_workers = max_workers
+        self._pool = None
+        self._pool_key = None
+        self._lock = threading.Lock()
+        self.batches = 0
+        self.jobs = 0
+
+    def _get_pool(self, snapshot, chs: dict) -> ProcessPoolExecutor:
+        key = (snapshot.version, tuple(sorted((alpha, ch.fingerprint) for alpha, ch in chs.items())))
+        with self._lock:
+            if self._pool_key != key:
+                if self._pool is not None:
+                    # 旧进程池中已提交的任务继续执行完毕，不阻塞当前请求
+                    self._pool.shutdown(wait=False)
+                self._pool = ProcessPoolExecutor(self.max_workers, initializer=_init_worker,
+                                                 initargs=(snapshot.engine, snapshot.snap_index, chs))
+                self._pool_key = key
+            return self._pool
+
+    def run(self, snapshot, chs: dict, jobs: list):
+        """
+        提交全部任务，按完成顺序逐个产出结果（生成器）
+        :param snapshot: 路网图快照
+        :param chs: α → 已就绪的ContractionHierarchy（未就绪的α工作进程内使用A*）
+        :param jobs: run_job的任务参数列表
+        """
+        pool = self._get_pool(snapshot, chs)
+        with self._lock:
+            self.batches += 1
+            self.jobs += len(jobs)
+        futures = {pool.submit(run_job, job): job["index"] for job in jobs}
+        for future in as_completed(futures):
+            try:
+                yield future.result()
+            except BrokenProcessPool as e:
+                # 工作进程异常退出：下次请求重建进程池
+                with self._lock:
+                    self._pool_key = None
+                yield {"index": futures[future], "status": "error", "error": f"工作进程异常退出：{str(e)[:200]}", "elapsed_ms": None}
+            except Exception as e:
+                yield {"index": futures[future], "status": "error", "error": f"任务执行异常：{str(e)[:200]}", "elapsed_ms": None}
+
+    @property
+    def status(self) -> dict:
+        return {
+            "max_workers": self.max_workers,
+            "pool_graph_version": self._pool_key[0] if self._pool_key else None,
+            "batches": self.batches,
+            "jobs": self.jobs
+        }
@@ -0,0 +1,160 @@
+# backend/chain_contraction.py
+"""
+度为2的链节点收缩：把只起连接作用的折点节点（路线弯折处而非路口）合并进超级边，缩小A*搜索的图规模
+- 途经节点：恰有两个不同邻居a、b，且经过它的通行方向一致（a→v存在当且仅当v→b存在，b→v存在当且仅当v→a存在）；其余节点为核心节点
+- 从每个核心节点沿各出边经途经节点一直走到下一个核心节点，得到一条超级边，记录其依次经过的原始CSR边下标
+- 超级边权重为所经原始边权重之和，按α由原始权重数组一次求和；起终点位于链内部时，按链上权重前缀和计算到链两端核心节点的代价
+- 只依赖CSR数组，搜索结果展开回原始CSR边下标，node_path/path_edges/coord_path与未收缩时一致
+"""
+import numpy as np
+
+
+class ChainIndex:
+    """
+    CSR图的链收缩索引（只读，随RoutingEngine构建）
+    :param indptr/indices/src: 原始CSR邻接（出边区间、终点下标、起点下标）
+    :param rev_indptr/rev_positions: 反向CSR邻接（入边区间、对应的原始CSR边下标）
+    """
+
+    def __init__(self, indptr, indices, src, rev_indptr, rev_positions):
+        n = len(indptr) - 1
+        m = len(indices)
+        indptr, indices, src = list(indptr), list(indices), list(src)
+
+        # 1. 判定途经节点（自环、分叉、路口、端点均为核心节点）
+        passing = [False] * n
+        for v in range(n):
+            outs = indices[indptr[v]:indptr[v + 1]]
+            ins = [src[p] for p in rev_positions[rev_indptr[v]:rev_indptr[v + 1]]]
+            if not outs or not ins or v in outs or v in ins:
+                continue
+            neighbors = set(outs) | set(ins)
+            if len(neighbors) != 2:
+                continue
+            a, b = neighbors
+            passing[v] = (a in ins) == (b in outs) and (b in ins) == (a in outs)
+
+        # 2. 从核心节点出发沿链行走生成超级边；全部由途经节点组成的环任取一点升为核心节点
+        core_of = [-1] * n
+        core_nodes = []
+        se_src, se_dst, chain_ptr, chain_pos = [], [], [0], []
+        se_of_pos = [-1] * m   # 原始CSR边 → 所属超级边
+        offset_of_pos = [0] * m  # 原始CSR边在超级边中的序号
+
+        def walk(u):
+            for p in range(indptr[u], indptr[u + 1]):
+                e = len(se_src)
+                k = 0
+                prev = u
+                while True:
+                    se_of_pos[p] = e
+                    offset_of_pos[p] = k
+                    chain_pos.append(p)
+                    v = indices[p]
+                    if not passing[v]:
+                        break
+                    # 途经节点：沿不折返的出边继续
+                    p = next(q for q in range(indptr[v], indptr[v + 1]) if indices[q] != prev)
+                    prev = v
+                    k += 1
+                se_src.append(core_of[u])
+                se_dst.append(v)
+                chain_ptr.append(len(chain_pos))
+
+        for v in range(n):
+            if not passing[v]:
+                core_of[v] = len(core_nodes)
+                core_nodes.append(v)
+        walked = rest = 0
+        while True:
+            while walked < len(core_nodes):
+                walk(core_nodes[walked])
+                walked += 1
+            while rest < m and se_of_pos[rest] >= 0:
+                rest += 1
+            if rest == m:
+                break
+            v = src[rest]
+            passing[v] = False
+            core_of[v] = len(core_nodes)
+            core_nodes.append(v)
+
+        # 3. 超级边终点转为核心下标，超级边已按起点核心下标有序，直接生成核心CSR
+        self.node_count = n
+        self.core_of = core_of
+        self.core_nodes = np.array(core_nodes, dtype=np.int64)
+        self.se_src = se_src
+        self.se_dst = [core_of[v] for v in se_dst]
+        self.chain_ptr = chain_ptr
+        self.chain_pos = np.array(chain_pos, dtype=np.int64)
+        self.se_of_pos = se_of_pos
+        self.offset_of_pos = offset_of_pos
+        core_indptr = np.zeros(len(core_nodes) + 1, dtype=np.int64)
+        np.cumsum(np.bincount(np.array(se_src, dtype=np.int64), minlength=len(core_nodes)), out=core_indptr[1:])
+        self.core_indptr = core_indptr.tolist()
+        self._indptr, self._rev_indptr, self._rev_positions = indptr, rev_indptr, rev_positions
+
+    @property
+    def core_node_count(self) -> int:
+        return len(self.core_nodes)
+
+    @property
+    def super_edge_count(self) -> int:
+        return len(self.se_src)
+
+    def weights(self, edge_weights: np.ndarray):
+        """
+        原始边权重数组 → (超级边权重列表, 链上权重前缀和列表)
+        前缀和按chain_pos顺序：超级边e中第i..j-1条原始边的权重之和为 cum[chain_ptr[e]+j] - cum[chain_ptr[e]+i]
+        """
+        flat = np.asarray(edge_weights, dtype=np.float64)[self.chain_pos]
+        cum = np.concatenate(([0.0], np.cumsum(flat)))
+        ptr = np.asarray(self.chain_ptr)
+        return (cum[ptr[1:]] - cum[ptr[:-1]]).tolist(), cum.tolist()
+
+    def positions(self, e: int, first: int = 0, last: int = None) -> list:
+        """超级边e中第first..last-1条原始CSR边下标"""
+        start = self.chain_ptr[e]
+        end = self.chain_ptr[e + 1] if last is None else start + last
+        return self.chain_pos[start + first:end].tolist()
+
+    def exits(self, v: int, cum: list) -> list:
+        """从原始节点v出发可到达的核心节点：[(核心下标, 代价, 原始CSR边下标序列)]"""
+        if self.core_of[v] >= 0:
+            return [(self.core_of[v], 0.0, [])]
+        result = []
+        for p in range(self._indptr[v], self._indptr[v + 1]):
+            e, k = self.se_of_pos[p], self.offset_of_pos[p]
+            start, end = self.chain_ptr[e], self.chain_ptr[e + 1]
+            result.append((self.se_dst[e], cum[end] - cum[start + k], self.positions(e, k)))
+        return result
+
+    def entries(self, v: int, cum: list) -> dict:
+        """可到达原始节点v的核心节点：{核心下标: (代价, 原始CSR边下标序列)}，同一核心节点取代价较小者"""
+        if self.core_of[v] >= 0:
+            return {self.core_of[v]: (0.0, [])}
+        result = {}
+        for p in self._rev_positions[self._rev_indptr[v]:self._rev_indptr[v + 1]]:
+            e, k = self.se_of_pos[p], self.offset_of_pos[p]
+            start = self.chain_ptr[e]
+            cost = cum[start + k + 1] - cum[start]
+            if self.se_src[e] not in result or cost < result[self.se_src[e]][0]:
+                result[self.se_src[e]] = (cost, self.positions(e, 0, k + 1))
+        return result
+
+    def direct(self, s: int, t: int, cum: list):
+        """起终点位于同一条超级边上且s在前：沿链直达的 (代价, 原始CSR边下标序列)，否则None"""
+        if self.core_of[s] >= 0 or self.core_of[t] >= 0:
+            return None
+        best = None
+        for p in range(self._indptr[s], self._indptr[s + 1]):
+            for q in self._rev_positions[self._rev_indptr[t]:self._rev_indptr[t + 1]]:
+                e = self.se_of_pos[p]
+                i, j = self.offset_of_pos[p], self.offset_of_pos[q]
+                if self.se_of_pos[q] != e or j < i:
+                    continue
+                start = self.chain_ptr[e]
+                cost = cum[start + j + 1] - cum[start + i]
+                if best is None or cost < best[0]:
+                    best = (cost, self.positions(e, i, j + 1))
+        return best
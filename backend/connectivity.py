@@ -0,0 +1,139 @@
+# backend/connectivity.py
+"""
+路网连通分量索引：随路网图快照预计算，不可达的起终点无需搜索即可拒绝
+- 弱连通分量（忽略通行方向）：起终点不在同一弱连通分量时必然不可达
+- 强连通分量（POI连接线等单向边使部分节点只能进不能出）：Kosaraju算法得到的分量编号即缩点图的拓扑序，
+  起点分量的拓扑序大于终点分量时必然不可达；同一强连通分量内必然可达
+- 提供路网健康检查所需的分量统计（节点数、边数、总长度、范围），便于发现孤立的路段碎片
+"""
+import numpy as np
+
+
+class ComponentIndex:
+    """
+    CSR图的连通分量标签（只读，随RoutingEngine构建）
+    :param indptr/indices: 正向CSR邻接（出边区间、终点下标）
+    :param rev_indptr/rev_tails: 反向CSR邻接（入边区间、入边起点下标）
+    """
+
+    def __init__(self, indptr, indices, rev_indptr, rev_tails):
+        n = len(indptr) - 1
+
+        # 1. 弱连通分量：忽略方向的广度优先遍历，编号按分量节点数降序（0为最大分量）
+        weak = [-1] * n
+        count = 0
+        for root in range(n):
+            if weak[root] >= 0:
+                continue
+            weak[root] = count
+            queue = [root]
+            for v in queue:
+                for neighbors, lo, hi in ((indices, indptr[v], indptr[v + 1]),
+                                          (rev_tails, rev_indptr[v], rev_indptr[v + 1])):
+                    for k in range(lo, hi):
+                        w = neighbors[k]
+                        if weak[w] < 0:
+                            weak[w] = count
+                            queue.append(w)
+            count += 1
+        weak = np.array(weak, dtype=np.int64)
+        sizes = np.bincount(weak, minlength=count)
+        rank = np.empty(count, dtype=np.int64)
+        rank[np.argsort(-sizes, kind="stable")] = np.arange(count)
+        self.weak = rank[weak]
+        self.weak_sizes = np.bincount(self.weak, minlength=count)
+
+        # 2. 强连通分量（Kosaraju）：正向图求完成顺序，再按完成顺序逆序在反向图上遍历，分量按拓扑序编号
+        finished = []
+        visited = [False] * n
+        for root in range(n):
+            if visited[root]:
+                continue
+            visited[root] = True
+            stack = [(root, indptr[root])]
+            while stack:
+                v, k = stack[-1]
+                if k < indptr[v + 1]:
+                    stack[-1] = (v, k + 1)
+                    w = indices[k]
+                    if not visited[w]:
+                        visited[w] = True
+                        stack.append((w, indptr[w]))
+                else:
+                    stack.pop()
+                    finished.append(v)
+        strong = [-1] * n
+        count = 0
+        for root in reversed(finished):
+            if strong[root] >= 0:
+                continue
+            strong[root] = count
+            stack = [root]
+            while stack:
+                v = stack.pop()
+                for k in range(rev_indptr[v], rev_indptr[v + 1]):
+                    w = rev_tails[k]
+                    if strong[w] < 0:
+                        strong[w] = count
+                        stack.append(w)
+            count += 1
+        self.strong = np.array(strong, dtype=np.int64)
+        self.strong_sizes = np.bincount(self.strong, minlength=count)
+        self._weak_list = self.weak.tolist()
+        self._strong_list = strong
+
+    @property
+    def weak_count(self) -> int:
+        return len(self.weak_sizes)
+
+    @property
+    def strong_count(self) -> int:
+        return len(self.strong_sizes)
+
+    def unreachable(self, source: int, target: int) -> bool:
+        """O(1)判定source → target（节点下标）必然不可达：不在同一弱连通分量，或缩点图中终点分量位于起点分量之前"""
+        return self._weak_list[source] != self._weak_list[target] or self._strong_list[source] > self._strong_list[target]
+
+    def summary(self, engine, limit: int = 50) -> dict:
+        """
+        连通分量统计（路网健康检查）
+        :param engine: 同一快照的RoutingEngine（节点坐标、边长度、边ID）
+        :param limit: 最多列出的弱连通分量数（按节点数降序）
+        """
+        n, count = engine.node_count, self.weak_count
+        # 同一路网边的正反向只统计一次
+        _, first = np.unique(engine.edge_id, return_index=True)
+        edge_component = self.weak[engine.src[first]]
+        edge_counts = np.bincount(edge_component, minlength=count)
+        lengths = np.bincount(edge_component, weights=engine.length_m[first], minlength=count)
+        strong_per_weak = np.bincount(self.weak[np.unique(self.strong, return_index=True)[1]], minlength=count)
+        bounds = np.full((4, count), np.nan)
+        for row, values, reduce in ((0, engine.lng, np.fmin), (1, engine.lat, np.fmin),
+                                    (2, engine.lng, np.fmax), (3, engine.lat, np.fmax)):
+            reduce.at(bounds[row], self.weak, values)
+        order = np.argsort(self.weak, kind="stable")
+        starts = np.concatenate(([0], np.cumsum(self.weak_sizes)))
+        largest_strong = int(self.strong_sizes.max()) if self.strong_count else 0
+        components = []
+        for k in range(min(count, limit)):
+            box = bounds[:, k]
+            components.append({
+                "component": k,
+                "node_count": int(self.weak_sizes[k]),
+                "edge_count": int(edge_counts[k]),
+                "total_length_km": round(float(lengths[k]) / 1000, 3),
+                "strong_component_count": int(strong_per_weak[k]),
+                "bbox": [round(float(v), 6) for v in box] if np.isfinite(box).all() else None,
+                "sample_node_ids": engine.node_ids[order[starts[k]:starts[k] + 5]].tolist()
+            })
+        return {
+            "node_count": n,
+            "edge_count": len(first),
+            "weak_component_count": count,
+            "largest_weak_share": round(float(self.weak_sizes[0]) / n, 4) if n else 0.0,
+            "strong_component_count": self.strong_count,
+            "largest_strong_size": largest_strong,
+            # 不在最大强连通分量中的节点：从这些节点出发或到达这些节点的部分路线不可达（单向边造成）
+            "nodes_outside_largest_strong": n - largest_strong,
+            "components": components
+        }
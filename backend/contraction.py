@@ -0,0 +1,454 @@
+# backend/contraction.py
+"""
+收缩层次（Contraction Hierarchies, CH）预处理与查询
+- 预处理：按“边差”优先级逐个收缩节点，必要时添加捷径边（shortcut），见证搜索（witness search）限制搜索规模
+- 查询：双向Dijkstra，仅沿“向上”（节点层级升高）的边搜索，跨全网查询只需确定极少数节点
+- 结果展开：捷径边递归拆回原始CSR边下标，与RoutingEngine.shortest_path返回结构一致
+- 预处理结果按图指纹持久化到磁盘，服务重启且路网未变时直接加载；路网或α变化时后台线程重建
+"""
+import hashlib
+import heapq
+import math
+import os
+import threading
+import time
+
+import numpy as np
+
+from routing_engine import NoPathError, RouteResult
+
+# CH预处理结果持久化目录
+CH_CACHE_DIR = "./ch_cache"
+# 见证搜索最多确定的节点数（越大捷径越少、预处理越慢）
+WITNESS_SETTLE_LIMIT = 60
+# 磁盘上最多保留的CH文件数（按修改时间淘汰）
+MAX_CACHE_FILES = 8
+
+
+def graph_fingerprint(engine, weights: np.ndarray) -> str:
+    """图指纹：节点ID、CSR拓扑、边权重共同决定，任一变化即需重建CH"""
+    digest = hashlib.sha1()
+    for arr in (engine.node_ids, engine.src, engine.indices, np.round(weights, 6)):
+        digest.update(np.ascontiguousarray(arr).tobytes())
+    return digest.hexdigest()
+
+
+class ContractionHierarchy:
+    """
+    收缩层次（只读）
+    边数组：edge_w（权重）、edge_orig（原始CSR边下标，捷径为-1）、edge_child（捷径拆分的两条子边）
+    up_*：向上图（rank[u] < rank[v] 的边，挂在u下）；down_*：向下图反向存储（rank[u] > rank[v] 的边u→v，挂在v下）
+    """
+
+    def __init__(self, fingerprint: str, rank, edge_w, edge_orig, edge_child, up, down, build_seconds: float):
+        self.fingerprint = fingerprint
+        self.rank = rank
+        self.edge_w = edge_w
+        self.edge_orig = edge_orig
+        self.edge_child = edge_child
+        self.up_indptr, self.up_head, self.up_edge = up
+        self.down_indptr, self.down_head, self.down_edge = down
+        self.build_seconds = build_seconds
+        self._prepare()
+
+    def _prepare(self):
+        # 查询内循环使用的Python列表视图
+        self._values = {}  # 附加边值缓存（如长度、努力值），见edge_values
+        self._w = self.edge_w.tolist()
+        self._up = (self.up_indptr.tolist(), self.up_head.tolist(), self.up_edge.tolist())
+        self._down = (self.down_indptr.tolist(), self.down_head.tolist(), self.down_edge.tolist())
+
+    @property
+    def weights(self) -> list:
+        """CH边权重（Python列表视图）"""
+        return self._w
+
+    @property
+    def up_graph(self):
+        """向上图（Python列表视图）：(indptr, head, edge)"""
+        return self._up
+
+    @property
+    def down_graph(self):
+        """向下图反向存储（Python列表视图）：(indptr, head, edge)"""
+        return self._down
+
+    @property
+    def shortcut_count(self) -> int:
+        return int(np.count_nonzero(self.edge_orig < 0))
+
+    # -------------------------- 预处理 --------------------------
+    @classmethod
+    def build(cls, engine, weights: np.ndarray, fingerprint: str = None) -> "ContractionHierarchy":
+        """
+        对引擎图做收缩层次预处理
+        :param engine: RoutingEngine
+        :param weights: 边权重数组（与engine的CSR边一一对应）
+        :param fingerprint: 图指纹（缺省时自动计算）
+        """
+        start = time.perf_counter()
+        n = engine.node_count
+        src = engine.src.tolist()
+        dst = engine.indices.tolist()
+        w_list = weights.tolist()
+
+        # CH边表：原始边在前，捷径边追加在后
+        edge_w, edge_orig, edge_child = [], [], []
+        out_adj = [dict() for _ in range(n)]  # 剩余图出边：v → (权重, CH边下标)
+        in_adj = [dict() for _ in range(n)]   # 剩余图入边：u → (权重, CH边下标)
+        for pos, (u, v, w) in enumerate(zip(src, dst, w_list)):
+            if u == v:
+                continue  # 自环对最短路无意义
+            idx = len(edge_w)
+            edge_w.append(w)
+            edge_orig.append(pos)
+            edge_child.append((-1, -1))
+            if v not in out_adj[u] or w < out_adj[u][v][0]:
+                out_adj[u][v] = (w, idx)
+                in_adj[v][u] = (w, idx)
+
+        contracted = [False] * n
+        neighbor_contracted = [0] * n
+
+        def witness_cost(u, skip, targets, max_cost):
+            """剩余图中从u出发（绕开skip）的受限Dijkstra，返回到各目标的已知最短距离"""
+            dist = {u: 0.0}
+            heap = [(0.0, u)]
+            remaining = set(targets)
+            settled = 0
+            while heap and remaining and settled < WITNESS_SETTLE_LIMIT:
+                d, x = heapq.heappop(heap)
+                if d > dist[x]:
+                    continue
+                if d > max_cost:
+                    break
+                settled += 1
+                remaining.discard(x)
+                for y, (w, _) in out_adj[x].items():
+                    if y == skip or contracted[y]:
+                        continue
+                    nd = d + w
+                    if nd < dist.get(y, math.inf):
+                        dist[y] = nd
+                        heapq.heappush(heap, (nd, y))
+            return dist
+
+        def shortcuts_needed(v):
+            """收缩v需要添加的捷径：[(u, x, 权重, 入边下标, 出边下标), ...]"""
+            needed = []
+            outs = [(x, w, e) for x, (w, e) in out_adj[v].items() if not contracted[x]]
+            if not outs:
+                return needed
+            for u, (w_in, e_in) in in_adj[v].items():
+                if contracted[u]:
+                    continue
+                targets = [x for x, _, _ in outs if x != u]
+                if not targets:
+                    continue
+                max_cost = w_in + max(w for x, w, _ in outs if x != u)
+                dist = witness_cost(u, v, targets, max_cost)
+                for x, w_out, e_out in outs:
+                    if x == u:
+                        continue
+                    via = w_in + w_out
+                    if dist.get(x, math.inf) > via:
+                        needed.append((u, x, via, e_in, e_out))
+            return needed
+
+        def priority(v):
+            # 边差 = 新增捷径数 − 移除边数，再加已收缩邻居数（让收缩在图中均匀分布）
+            removed = sum(1 for x in out_adj[v] if not contracted[x]) + sum(1 for u in in_adj[v] if not contracted[u])
+            return len(shortcuts_needed(v)) - removed + neighbor_contracted[v]
+
+        heap = [(priority(v), v) for v in range(n)]
+        heapq.heapify(heap)
+        rank = np.zeros(n, dtype=np.int64)
+        order = 0
+        while heap:
+            _, v = heapq.heappop(heap)
+            if contracted[v]:
+                continue
+            # 懒更新：重新计算优先级，若不再最小则放回
+            p = priority(v)
+            if heap and p > heap[0][0]:
+                heapq.heappush(heap, (p, v))
+                continue
+            for u, x, via, e_in, e_out in shortcuts_needed(v):
+                existing = out_adj[u].get(x)
+                if existing is not None and existing[0] <= via:
+                    continue
+                idx = len(edge_w)
+                edge_w.append(via)
+                edge_orig.append(-1)
+                edge_child.append((e_in, e_out))
+                out_adj[u][x] = (via, idx)
+                in_adj[x][u] = (via, idx)
+            contracted[v] = True
+            rank[v] = order
+            order += 1
+            for x in list(out_adj[v]) + list(in_adj[v]):
+                if not contracted[x]:
+                    neighbor_contracted[x] += 1
+
+        # 按层级拆分为向上图/向下图（CSR）
+        edge_w = np.array(edge_w, dtype=np.float64)
+        edge_orig = np.array(edge_orig, dtype=np.int64)
+        edge_child = np.array(edge_child, dtype=np.int64).reshape(-1, 2)
+        tails, heads = _edge_endpoints(edge_orig, edge_child, engine.src, engine.indices)
+        up_mask = rank[tails] < rank[heads]
+        up = _csr(n, tails[up_mask], heads[up_mask], np.flatnonzero(up_mask))
+        down_mask = ~up_mask
+        down = _csr(n, heads[down_mask], tails[down_mask], np.flatnonzero(down_mask))
+        return cls(fingerprint or graph_fingerprint(engine, weights), rank, edge_w, edge_orig, edge_child,
+                   up, down, time.perf_counter() - start)
+
+    # -------------------------- 查询 --------------------------
+    def shortest_path(self, engine, source_id: int, target_id: int) -> RouteResult:
+        """双向CH查询，返回原始CSR边下标序列（与RoutingEngine.shortest_path结构一致）"""
+        engine.check_reachable(source_id, target_id)
+        source = engine.index_of[source_id]
+        target = engine.index_of[target_id]
+        w = self._w
+        dist = ({source: 0.0}, {target: 0.0})
+        pred = ({}, {})  # 节点 → 到达该节点的CH边下标
+        heaps = ([(0.0, source)], [(0.0, target)])
+        graphs = (self._up, self._down)
+        best, meet = math.inf, -1
+        settled = 0
+        while heaps[0] or heaps[1]:
+            # 两侧堆顶都不小于当前最优值时终止
+            tops = [h[0][0] if h else math.inf for h in heaps]
+            if min(tops) >= best:
+                break
+            side = 0 if tops[0] <= tops[1] else 1
+            d, u = heapq.heappop(heaps[side])
+            if d > dist[side][u]:
+                continue
+            settled += 1
+            other = dist[1 - side].get(u)
+            if other is not None and d + other < best:
+                best, meet = d + other, u
+            indptr, head, edge = graphs[side]
+            for k in range(indptr[u], indptr[u + 1]):
+                v = head[k]
+                nd = d + w[edge[k]]
+                if nd < dist[side].get(v, math.inf):
+                    dist[side][v] = nd
+                    pred[side][v] = edge[k]
+                    heapq.heappush(heaps[side], (nd, v))
+        if meet < 0:
+            raise NoPathError(f"起点{source_id}到终点{target_id}无可达路径")
+
+        # 拼接CH边序列：起点→相遇点（正向），相遇点→终点（反向图中的前驱边）
+        forward, v = [], meet
+        while v != source:
+            e = pred[0][v]
+            forward.append(e)
+            v = self._tail(engine, e)
+        forward.reverse()
+        backward, v = [], meet
+        while v != target:
+            e = pred[1][v]
+            backward.append(e)
+            v = self._head(engine, e)
+        edge_positions = self.unpack(forward + backward)
+        node_path = [source_id] + [int(engine.node_ids[engine.indices[pos]]) for pos in edge_positions]
+        return RouteResult(node_path, edge_positions, best, settled)
+
+    def edge_values(self, name: str, values: np.ndarray) -> list:
+        """
+        将原始边上的可加属性（如length_m）累加到CH边上（捷径 = 两条子边之和），结果按name缓存
+        :param name: 属性名（缓存键）
+        :param values: 原始CSR边属性数组
+        :return: 与CH边下标对应的Python列表
+        """
+        cached = self._values.get(name)
+        if cached is not None:
+            return cached
+        result = np.zeros(len(self.edge_w), dtype=np.float64)
+        original = self.edge_orig >= 0
+        result[original] = values[self.edge_orig[original]]
+        # 捷径的子边下标一定小于自身，按下标顺序累加即可
+        for e in np.flatnonzero(~original):
+            first, second = self.edge_child[e]
+            result[e] = result[first] + result[second]
+        cached = result.tolist()
+        self._values[name] = cached
+        return cached
+
+    def unpack(self, ch_edges: list) -> list:
+        """捷径边递归展开为原始CSR边下标序列"""
+        result = []
+        stack = list(reversed(ch_edges))
+        while stack:
+            e = stack.pop()
+            orig = self.edge_orig[e]
+            if orig >= 0:
+                result.append(int(orig))
+            else:
+                first, second = self.edge_child[e]
+                stack.append(int(second))
+                stack.append(int(first))
+        return result
+
+    def _tail(self, engine, e: int) -> int:
+        while self.edge_orig[e] < 0:
+            e = int(self.edge_child[e][0])
+        return int(engine.src[self.edge_orig[e]])
+
+    def _head(self, engine, e: int) -> int:
+        while self.edge_orig[e] < 0:
+            e = int(self.edge_child[e][1])
+        return int(engine.indices[self.edge_orig[e]])
+
+    # -------------------------- 持久化 --------------------------
+    def save(self, path: str) -> None:
+        np.savez_compressed(
+            path, fingerprint=np.array(self.fingerprint), rank=self.rank,
+            edge_w=self.edge_w, edge_orig=self.edge_orig, edge_child=self.edge_child,
+            up_indptr=self.up_indptr, up_head=self.up_head, up_edge=self.up_edge,
+            down_indptr=self.down_indptr, down_head=self.down_head, down_edge=self.down_edge,
+            build_seconds=np.array(self.build_seconds)
+        )
+
+    @classmethod
+    def load(cls, path: str) -> "ContractionHierarchy":
+        with np.load(path) as f:
+            return cls(str(f["fingerprint"]), f["rank"], f["edge_w"], f["edge_orig"], f["edge_child"],
+                       (f["up_indptr"], f["up_head"], f["up_edge"]),
+                       (f["down_indptr"], f["down_head"], f["down_edge"]),
+                       float(f["build_seconds"]))
+
+
+def _edge_endpoints(edge_orig, edge_child, src, dst):
+    """计算每条CH边的起止节点（捷径边取第一条子边的起点、第二条子边的终点）"""
+    m = len(edge_orig)
+    tails = np.empty(m, dtype=np.int64)
+    heads = np.empty(m, dtype=np.int64)
+    original = edge_orig >= 0
+    tails[original] = src[edge_orig[original]]
+    heads[original] = dst[edge_orig[original]]
+    # 捷径边的子边下标一定小于自身，按下标顺序即可逐条推导
+    for e in np.flatnonzero(~original):
+        tails[e] = tails[edge_child[e][0]]
+        heads[e] = heads[edge_child[e][1]]
+    return tails, heads
+
+
+def _csr(n, tails, heads, edge_ids):
+    order = np.argsort(tails, kind="stable")
+    indptr = np.zeros(n + 1, dtype=np.int64)
+    np.cumsum(np.bincount(tails, minlength=n), out=indptr[1:])
+    return indptr, heads[order].astype(np.int64), edge_ids[order].astype(np.int64)
+
+
+class CHManager:
+    """
+    CH预处理管理：按（图快照版本, α）提供已就绪的CH，未就绪时后台线程构建、请求回退A*
+    - 预处理结果按图指纹持久化，重启后路网未变时直接从磁盘加载
+    - 同一时刻只有一个后台构建线程，排队任务只保留最新的，避免路网频繁编辑时重复构建过期版本
+    """
+
+    def __init__(self, cache_dir: str = CH_CACHE_DIR, enabled: bool = True):
+        self.cache_dir = cache_dir
+        self.enabled = enabled
+        self.gentlest_alpha = None  # 最近使用的gentlest策略α（快照更新时一并预处理）
+        self._ready = {}       # (快照版本, α) → ContractionHierarchy
+        self._pending = {}     # (快照版本, α) → (snapshot, α)，等待构建
+        self._lock = threading.Lock()
+        self._worker = None
+        self._last_error = None
+
+    def get(self, snapshot, alpha: float):
+        """返回可用的CH；未就绪时安排后台构建并返回None（调用方回退A*）"""
+        if not self.enabled:
+            return None
+        key = (snapshot.version, alpha)
+        ch = self._ready.get(key)
+        if ch is None:
+            self.schedule(snapshot, alpha)
+        return ch
+
+    def on_snapshot(self, snapshot) -> None:
+        """路网图快照发布回调：预处理shortest（α=0）及当前gentlest α"""
+        self.schedule(snapshot, 0.0)
+        if self.gentlest_alpha is not None:
+            self.schedule(snapshot, self.gentlest_alpha)
+
+    def schedule(self, snapshot, alpha: float) -> None:
+        """安排后台构建（已就绪/已排队则忽略），并清理旧版本快照的CH"""
+        if not self.enabled:
+            return
+        key = (snapshot.version, alpha)
+        with self._lock:
+            if key in self._ready or key in self._pending:
+                return
+            # 只保留最新快照版本的任务和结果
+            for stale in [k for k in self._pending if k[0] < snapshot.version]:
+                self._pending.pop(stale)
+            for stale in [k for k in self._ready if k[0] < snapshot.version]:
+                self._ready.pop(stale)
+            self._pending[key] = (snapshot, alpha)
+            if self._worker is None or not self._worker.is_alive():
+                self._worker = threading.Thread(target=self._run, name="ch-builder", daemon=True)
+                self._worker.start()
+
+    @property
+    def status(self) -> dict:
+        return {
+            "enabled": self.enabled,
+            "building": self._worker is not None and self._worker.is_alive(),
+            "pending": [{"graph_version": v, "alpha": a} for v, a in self._pending],
+            "ready": [{
+                "graph_version": v,
+                "alpha": a,
+                "shortcut_count": ch.shortcut_count,
+                "build_seconds": round(ch.build_seconds, 3)
+            } for (v, a), ch in self._ready.items()],
+            "last_error": self._last_error
+        }
+
+    def _run(self):
+        while True:
+            with self._lock:
+                if not self._pending:
+                    return
+                key = max(self._pending)  # 优先构建最新版本
+                snapshot, alpha = self._pending[key]
+            try:
+                ch = self._load_or_build(snapshot.engine, alpha)
+                with self._lock:
+                    if key in self._pending:
+                        self._pending.pop(key)
+                        self._ready[key] = ch
+                self._last_error = None
+            except Exception as e:
+                with self._lock:
+                    self._pending.pop(key, None)
+                self._last_error = str(e)[:200]
+                print(f"❌ CH预处理失败：{str(e)}")
+
+    def _load_or_build(self, engine, alpha: float) -> ContractionHierarchy:
+        weights = engine.edge_weights(alpha)
+        fingerprint = graph_fingerprint(engine, weights)
+        path = os.path.join(self.cache_dir, f"ch_{fingerprint}.npz")
+        if os.path.exists(path):
+            try:
+                ch = ContractionHierarchy.load(path)
+                if ch.fingerprint == fingerprint:
+                    print(f"✅ CH预处理结果已从磁盘加载：α={alpha}")
+                    return ch
+            except Exception as e:
+                print(f"⚠️  CH缓存文件损坏，重新构建：{str(e)}")
+        ch = ContractionHierarchy.build(engine, weights, fingerprint)
+        print(f"✅ CH预处理完成：α={alpha}，捷径{ch.shortcut_count}条，耗时{ch.build_seconds:.2f}秒")
+        os.makedirs(self.cache_dir, exist_ok=True)
+        ch.save(path)
+        self._evict_cache_files()
+        return ch
+
+    def _evict_cache_files(self):
+        files = [os.path.join(self.cache_dir, f) for f in os.listdir(self.cache_dir) if f.startswith("ch_")]
+        files.sort(key=os.path.getmtime, reverse=True)
+        for path in files[MAX_CACHE_FILES:]:
+            os.remove(path)
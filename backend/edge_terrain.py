@@ -0,0 +1,213 @@
+# backend/edge_terrain.py
+"""
+路网边地形属性物化：平均坡度、最大坡度比、累计爬升、累计下降
+- 拓扑构建/地形导入时一条SQL批量计算，路径规划图加载时直接读取，无需逐边空间关联
+- 以几何MD5识别几何变化的边，日常刷新只重算新增/几何变更的边
+- 地形数据局部更新（增量导入）时按变化范围把受影响的边标记为待重算
+- 已导入分块地形表（terrain_tiles）时，沿边采样点按行列号直接从分块取值（向量化双线性插值），否则回退高程/坡度点表的KNN查询
+"""
+import numpy as np
+from shapely import wkb
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+
+from terrain_sampler import haversine_m
+from terrain_store import get_terrain_store
+
+# 沿边采样步长（米），与路径20米等距采样保持一致
+EDGE_TERRAIN_SAMPLE_STEP_M = 20.0
+# 采样点匹配地形点的最大距离（度，约3个DEM像元），超出视为无地形数据
+TERRAIN_MATCH_MAX_DEG = 0.001
+
+# 分块地形计算时每批处理的边数
+REFRESH_BATCH_EDGES = 5000
+
+# 旧库补列（create_all不会修改已存在的表，无迁移工具时启动时幂等补齐）
+_ADD_COLUMNS_SQL = """
+ALTER TABLE network_edges
+    ADD COLUMN IF NOT EXISTS slope_avg NUMERIC(5,2) DEFAULT 0,
+    ADD COLUMN IF NOT EXISTS max_grade NUMERIC(6,2) DEFAULT 0,
+    ADD COLUMN IF NOT EXISTS ascent_m NUMERIC(10,2) DEFAULT 0,
+    ADD COLUMN IF NOT EXISTS descent_m NUMERIC(10,2) DEFAULT 0,
+    ADD COLUMN IF NOT EXISTS terrain_geom_md5 VARCHAR(32),
+    ADD COLUMN IF NOT EXISTS terrain_update_time TIMESTAMP;
+"""
+
+# 批量计算SQL：沿边按步长加密 → 每个顶点KNN匹配最近高程/坡度点 → 窗口函数求相邻高差 → 按边聚合
+_REFRESH_SQL = """
+WITH dirty AS (
+    SELECT id, geom FROM network_edges
+    WHERE (:all_edges OR id = ANY(CAST(:edge_ids AS integer[])))
+      AND (:force OR terrain_geom_md5 IS DISTINCT FROM md5(ST_AsBinary(geom)))
+),
+samples AS (
+    SELECT d.id AS edge_id, dp.path[1] AS seq, dp.geom AS pt
+    FROM dirty d,
+    LATERAL ST_DumpPoints(ST_Segmentize(d.geom::geography, :step)::geometry) dp
+),
+sampled AS (
+    SELECT s.edge_id, s.seq, s.pt,
+        (SELECT e.elevation_m FROM elevation_points e
+         WHERE ST_DWithin(e.geom, s.pt, :max_deg)
+         ORDER BY e.geom <-> s.pt LIMIT 1) AS elev,
+        (SELECT sp.slope_deg FROM slope_points sp
+         WHERE ST_DWithin(sp.geom, s.pt, :max_deg)
+         ORDER BY sp.geom <-> s.pt LIMIT 1) AS slope
+    FROM samples s
+),
+steps AS (
+    SELECT edge_id, slope,
+        elev - LAG(elev) OVER w AS d_elev,
+        ST_DistanceSphere(pt, LAG(pt) OVER w) AS d_len
+    FROM sampled
+    WINDOW w AS (PARTITION BY edge_id ORDER BY seq)
+),
+stats AS (
+    SELECT edge_id,
+        COALESCE(AVG(GREATEST(slope, 0)), 0) AS slope_avg,
+        COALESCE(MAX(ABS(d_elev) / NULLIF(d_len, 0)) * 100, 0) AS max_grade,
+        COALESCE(SUM(GREATEST(d_elev, 0)), 0) AS ascent_m,
+        COALESCE(SUM(GREATEST(-d_elev, 0)), 0) AS descent_m
+    FROM steps
+    GROUP BY edge_id
+)
+UPDATE network_edges n
+SET slope_avg = ROUND(stats.slope_avg::numeric, 2),
+    max_grade = LEAST(ROUND(stats.max_grade::numeric, 2), 9999.99),
+    ascent_m = ROUND(stats.ascent_m::numeric, 2),
+    descent_m = ROUND(stats.descent_m::numeric, 2),
+    terrain_geom_md5 = md5(ST_AsBinary(n.geom)),
+    terrain_update_time = NOW()
+FROM stats
+WHERE n.id = stats.edge_id;
+"""
+
+
+_DIRTY_EDGES_SQL = """
+SELECT id, ST_AsBinary(geom) AS wkb FROM network_edges
+WHERE (:all_edges OR id = ANY(CAST(:edge_ids AS integer[])))
+  AND (:force OR terrain_geom_md5 IS DISTINCT FROM md5(ST_AsBinary(geom)))
+"""
+
+_UPDATE_STATS_SQL = """
+UPDATE network_edges n
+SET slope_avg = ROUND(s.slope_avg::numeric, 2),
+    max_grade = LEAST(ROUND(s.max_grade::numeric, 2), 9999.99),
+    ascent_m = ROUND(s.ascent_m::numeric, 2),
+    descent_m = ROUND(s.descent_m::numeric, 2),
+    terrain_geom_md5 = md5(ST_AsBinary(n.geom)),
+    terrain_update_time = NOW()
+FROM unnest(CAST(:ids AS integer[]), CAST(:slope_avg AS float8[]), CAST(:max_grade AS float8[]),
+            CAST(:ascent_m AS float8[]), CAST(:descent_m AS float8[]))
+    AS s(id, slope_avg, max_grade, ascent_m, descent_m)
+WHERE n.id = s.id;
+"""
+
+
+def ensure_edge_terrain_columns(engine) -> None:
+    """为已存在的network_edges表补齐地形属性列（幂等）"""
+    with engine.begin() as conn:
+        conn.execute(text(_ADD_COLUMNS_SQL))
+
+
+def mark_terrain_dirty(db: Session, envelopes: list) -> list:
+    """
+    地形数据局部更新后，把范围内的路网边标记为待重算（清空terrain_geom_md5，下次增量刷新时重算）
+    :param envelopes: 地形变化范围 [(min_lon, min_lat, max_lon, max_lat), ...]
+    :return: 受影响的路网边ID列表
+    """
+    if not envelopes:
+        return []
+    min_lon, min_lat, max_lon, max_lat = (list(v) for v in zip(*envelopes))
+    # 边采样点在TERRAIN_MATCH_MAX_DEG范围内匹配地形点，范围向外扩展同样距离
+    rows = db.execute(text("""
+        UPDATE network_edges e SET terrain_geom_md5 = NULL
+        FROM unnest(CAST(:min_lon AS float8[]), CAST(:min_lat AS float8[]),
+                    CAST(:max_lon AS float8[]), CAST(:max_lat AS float8[])) AS b(min_lon, min_lat, max_lon, max_lat)
+        WHERE e.geom && ST_MakeEnvelope(b.min_lon - :m, b.min_lat - :m, b.max_lon + :m, b.max_lat + :m, 4326)
+        RETURNING e.id
+    """), {"min_lon": min_lon, "min_lat": min_lat, "max_lon": max_lon, "max_lat": max_lat,
+           "m": TERRAIN_MATCH_MAX_DEG}).fetchall()
+    db.commit()
+    return sorted(row[0] for row in rows)
+
+
+def refresh_edge_terrain(db: Session, force: bool = False, edge_ids: list = None) -> int:
+    """
+    批量计算路网边地形属性（单条SQL，无逐边查询）
+    :param db: 数据库会话
+    :param force: True=重算全部边（地形数据重新导入后使用），False=仅重算新增/几何变更的边
+    :param edge_ids: 只处理这些边（如单条新增的边，按主键查找，无需扫描全表计算几何MD5）；None表示全部边
+    :return: 本次更新的边数量
+    """
+    scope = {"all_edges": edge_ids is None, "edge_ids": list(edge_ids or [])}
+    store = get_terrain_store(db.get_bind())
+    if store is not None:
+        updated_count = _refresh_from_store(db, store, force, scope)
+    else:
+        updated_count = db.execute(text(_REFRESH_SQL), {
+            **scope,
+            "force": force,
+            "step": EDGE_TERRAIN_SAMPLE_STEP_M,
+            "max_deg": TERRAIN_MATCH_MAX_DEG
+        }).rowcount
+    db.commit()
+    print(f"✅ 路网边地形属性已刷新：{updated_count}条（{'全量' if force else '增量'}，"
+          f"{'分块地形' if store is not None else '地形点表'}）")
+    return updated_count
+
+
+def _densify(coords: np.ndarray, step: float) -> np.ndarray:
+    """折线按步长加密（与ST_Segmentize一致：每段等分为不超过step米的子段，保留原有顶点）"""
+    seg_len = haversine_m(coords[:-1, 0], coords[:-1, 1], coords[1:, 0], coords[1:, 1])
+    parts = np.maximum(np.ceil(seg_len / step), 1).astype(np.int64)
+    seg = np.repeat(np.arange(len(parts)), parts)
+    t = (np.arange(parts.sum()) - np.repeat(np.cumsum(parts) - parts, parts)) / np.repeat(parts, parts)
+    points = coords[seg] + (coords[seg + 1] - coords[seg]) * t[:, None]
+    return np.vstack([points, coords[-1:]])
+
+
+def edge_terrain_stats(store, geometries: list, step: float = EDGE_TERRAIN_SAMPLE_STEP_M) -> dict:
+    """
+    批量计算多条边的地形属性（全部采样点一次插值，按边分组聚合，口径与_REFRESH_SQL一致）
+    :param store: 地形采样器（terrain_sampler.TerrainSampler接口）
+    :param geometries: 各边折线坐标数组列表
+    :return: {"slope_avg", "max_grade", "ascent_m", "descent_m"}，各为与geometries等长的数组
+    """
+    points = [_densify(np.asarray(coords, dtype=np.float64)[:, :2], step) for coords in geometries]
+    owner = np.repeat(np.arange(len(points)), [len(p) for p in points])
+    xy = np.vstack(points)
+    elev, slope = store.sample(xy[:, 0], xy[:, 1])
+    n = len(points)
+
+    # 平均坡度：有坡度值的采样点取平均（坡度非负）
+    has_slope = np.isfinite(slope)
+    slope_sum = np.bincount(owner[has_slope], weights=np.maximum(slope[has_slope], 0), minlength=n)
+    slope_cnt = np.bincount(owner[has_slope], minlength=n)
+    slope_avg = np.divide(slope_sum, slope_cnt, out=np.zeros(n), where=slope_cnt > 0)
+
+    # 同一条边内相邻采样点的高差与距离
+    same = owner[1:] == owner[:-1]
+    d_elev = np.diff(elev)
+    d_len = haversine_m(xy[:-1, 0], xy[:-1, 1], xy[1:, 0], xy[1:, 1])
+    step_mask = same & np.isfinite(d_elev)
+    step_owner = owner[1:][step_mask]
+    ascent = np.bincount(step_owner, weights=np.maximum(d_elev[step_mask], 0), minlength=n)
+    descent = np.bincount(step_owner, weights=np.maximum(-d_elev[step_mask], 0), minlength=n)
+    grade_mask = step_mask & (d_len > 0)
+    max_grade = np.zeros(n)
+    np.maximum.at(max_grade, owner[1:][grade_mask], np.abs(d_elev[grade_mask]) / d_len[grade_mask] * 100)
+    return {"slope_avg": slope_avg, "max_grade": max_grade, "ascent_m": ascent, "descent_m": descent}
+
+
+def _refresh_from_store(db: Session, store, force: bool, scope: dict) -> int:
+    """分块地形计算待刷新边的地形属性，按批unnest批量更新"""
+    rows = db.execute(text(_DIRTY_EDGES_SQL), {**scope, "force": force}).fetchall()
+    for i in range(0, len(rows), REFRESH_BATCH_EDGES):
+        batch = rows[i:i + REFRESH_BATCH_EDGES]
+        stats = edge_terrain_stats(store, [np.asarray(wkb.loads(bytes(row.wkb)).coords) for row in batch])
+        db.execute(text(_UPDATE_STATS_SQL), {
+            "ids": [row.id for row in batch],
+            **{key: values.tolist() for key, values in stats.items()}
+        })
+    return len(rows)
@@ -0,0 +1,198 @@
+# backend/graph_service.py
+"""
+路网图缓存服务：进程内长期持有路径规划图，避免每次请求都从数据库重建路网图
+- 图以只读快照（GraphSnapshot）形式发布，每个快照携带版本号和构建时间
+- 快照数据源为路网紧凑边表（road_network.RoadNetwork），不再常驻NetworkX图
+- 路网边增删时请求线程只登记变更（查询该节点对的边），后台线程在上一快照的边表上替换这些行并重建引擎与索引（O(N)），
+  完成后原子发布；短时间内的多次编辑合并为一次构建。拓扑重建时整体失效、下次请求时重建
+- 重建/编辑构建过程中，并发请求继续读取旧快照，保证读到的始终是一致的图（刚提交的编辑在新快照发布前不可见）
+- 每个快照同时生成只读的CSR路径规划引擎（routing_engine.RoutingEngine），路径搜索只读引擎数组
+- 每个快照同时生成坐标吸附空间索引（snapping.SnapIndex），经纬度 → 路网边/节点无需查库
+- 引擎构建时预计算连通分量（connectivity.ComponentIndex），不可达请求O(1)拒绝
+"""
+import threading
+import time
+from datetime import datetime
+
+from road_network import RoadNetwork
+from routing_engine import RoutingEngine
+from snapping import SnapIndex
+
+
+class GraphSnapshot:
+    """路网图只读快照：发布后不再修改，请求内可放心多次读取"""
+
+    def __init__(self, network: RoadNetwork, change: str, started: float):
+        """
+        :param network: 路网紧凑边表
+        :param change: 生成方式：rebuild=全量重建（读库），edit=路网编辑（上一快照边表替换变更节点对的行后重建）
+        :param started: 开始构建的时间（time.perf_counter()），build_seconds覆盖读库/替换边表与全部引擎、索引的构建
+        """
+        self.network = network              # 路网紧凑边表（只读，作为路网编辑的数据源）
+        self.engine = RoutingEngine(network)  # CSR路径规划引擎（含链收缩、连通分量，路径搜索使用）
+        self.snap_index = SnapIndex(network, self.engine)  # 坐标吸附空间索引（节点/边线段STR树）
+        self.version = None                 # 图版本号（发布时分配，每次发布+1）
+        self.built_at = datetime.now()      # 快照生成时间
+        self.build_seconds = time.perf_counter() - started  # 生成耗时（秒）
+        self.change = change
+
+    def to_dict(self) -> dict:
+        return {
+            "version": self.version,
+            "built_at": self.built_at.strftime("%Y-%m-%d %H:%M:%S"),
+            "build_seconds": round(self.build_seconds, 4),
+            "change": self.change,
+            "node_count": self.engine.node_count,
+            "edge_count": self.engine.edge_count,
+            "network_mb": round(self.network.nbytes / 1024 / 1024, 2),  # 路网边表（含折线坐标）内存占用
+            "core_node_count": self.engine.chains.core_node_count,  # 链收缩后A*搜索图的节点数
+            "core_edge_count": self.engine.chains.super_edge_count,  # 链收缩后A*搜索图的（超级）边数
+            "weak_component_count": self.engine.components.weak_count,     # 弱连通分量数
+            "strong_component_count": self.engine.components.strong_count  # 强连通分量数
+        }
+
+
+class GraphService:
+    """
+    路网图缓存服务
+    :param builder: 全量构建函数 builder(db) -> RoadNetwork
+    :param pair_loader: 节点对边加载函数 pair_loader(db, u, v) -> (rows, geoms, terrain_version)，
+                        返回u、v之间（任意方向）当前数据库中的全部路网边（行格式见RoadNetwork.from_rows），按边ID升序
+    :param node_loader: 节点坐标加载函数 node_loader(db, node_ids) -> {node_id: (lng, lat)}
+    """
+
+    def __init__(self, builder, pair_loader, node_loader):
+        self._builder = builder
+        self._pair_loader = pair_loader
+        self._node_loader = node_loader
+        self._snapshot = None               # 当前发布的快照
+        self._version = 0                   # 最新版本号
+        self._generation = 0                # 路网变更代数（每次失效+1，用于识别重建期间的新变更）
+        self._built_generation = -1         # 当前快照对应的变更代数
+        self._build_lock = threading.Lock()  # 全量重建互斥锁（同一时刻只允许一个线程重建）
+        self._state_lock = threading.Lock()  # 快照发布/编辑队列互斥锁
+        self._listeners = []                # 快照发布回调（如CH后台预处理）
+        self._edits = []                    # 待应用的路网编辑：[(u, v, rows, geoms, node_coords, terrain_version), ...]
+        self._worker = None                 # 路网编辑后台构建线程
+
+    def add_listener(self, callback) -> None:
+        """注册快照发布回调 callback(snapshot)，回调需快速返回（耗时工作请自行转入后台）"""
+        self._listeners.append(callback)
+
+    def peek(self):
+        """返回当前快照（可能已失效），不触发重建；尚未构建时返回None"""
+        return self._snapshot
+
+    # -------------------------- 读取 --------------------------
+    def get_snapshot(self, db) -> GraphSnapshot:
+        """
+        获取当前路网图快照，必要时触发全量重建
+        - 快照有效：直接返回
+        - 快照失效且其他线程正在重建：返回旧快照（若存在），不阻塞请求
+        - 快照失效且无人重建：当前线程负责重建
+        """
+        snapshot = self._snapshot
+        if snapshot is not None and self._built_generation == self._generation:
+            return snapshot
+        # 已有旧快照时非阻塞抢锁，抢不到说明正在重建，直接读旧快照
+        if not self._build_lock.acquire(blocking=snapshot is None):
+            return snapshot
+        try:
+            # 双重检查：等待锁期间可能已被其他线程重建完成
+            if self._snapshot is not None and self._built_generation == self._generation:
+                return self._snapshot
+            return self._rebuild(db)
+        finally:
+            self._build_lock.release()
+
+    @property
+    def status(self) -> dict:
+        """当前缓存状态（版本号、构建时间、是否待重建）"""
+        snapshot = self._snapshot
+        return {
+            "cached": snapshot is not None,
+            "stale": snapshot is None or self._built_generation != self._generation,
+            "rebuilding": self._build_lock.locked(),
+            "pending_edits": len(self._edits),  # 已登记、尚未发布的路网编辑数
+            "applying_edits": self._worker is not None,
+            "snapshot": snapshot.to_dict() if snapshot else None
+        }
+
+    # -------------------------- 写入 --------------------------
+    def invalidate(self) -> None:
+        """整体失效（如拓扑重建后节点ID全部变化），下次请求时全量重建"""
+        with self._state_lock:
+            self._generation += 1
+
+    def update_node_pair(self, db, u: int, v: int) -> None:
+        """
+        登记路网编辑：路网边新增/删除后，按数据库现状装载u、v之间的全部边，交由后台线程生成新快照
+        请求线程只做一次小查询，不构建引擎/索引；新快照发布前请求继续读取旧快照
+        """
+        with self._state_lock:
+            # 全量重建进行中：无法确定重建是否读到本次变更，标记为需再次重建
+            if self._build_lock.locked():
+                self._generation += 1
+            # 尚无快照或已整体失效：无需登记，等待下次全量重建
+            if self._snapshot is None or self._built_generation != self._generation:
+                return
+        rows, geoms, terrain_version = self._pair_loader(db, u, v)
+        # 节点坐标（新加入路网的节点使用；删除边后遗留的孤立节点由边表自动移除）
+        node_coords = self._node_loader(db, [u, v])
+        with self._state_lock:
+            self._edits.append((u, v, rows, geoms, node_coords, terrain_version))
+            if self._worker is None:
+                self._worker = threading.Thread(target=self._apply_edits, name="graph-editor", daemon=True)
+                self._worker.start()
+
+    # -------------------------- 内部实现 --------------------------
+    def _rebuild(self, db) -> GraphSnapshot:
+        generation = self._generation
+        start = time.perf_counter()
+        snapshot = GraphSnapshot(self._builder(db), "rebuild", start)
+        with self._state_lock:
+            # 重建期间若有新的变更，本次结果仍先发布（保证有图可读），代数保持旧值以便下次再重建
+            return self._publish(snapshot, generation)
+
+    def _apply_edits(self) -> None:
+        """后台线程：把已登记的编辑合并应用到当前快照的边表，构建并发布新快照，直到队列为空"""
+        while True:
+            with self._state_lock:
+                edits, self._edits = self._edits, []
+                snapshot, generation = self._snapshot, self._generation
+                if not edits:
+                    self._worker = None
+                    return
+                # 已整体失效：下次全量重建会读到这些变更
+                if snapshot is None or self._built_generation != generation:
+                    continue
+            try:
+                start = time.perf_counter()
+                network = snapshot.network
+                for u, v, *edit in edits:
+                    network = network.replace_pair(u, v, *edit)
+                edited = GraphSnapshot(network, "edit", start)
+            except Exception as e:
+                print(f"❌ 路网编辑应用失败，等待全量重建：{str(e)}")
+                with self._state_lock:
+                    self._generation += 1
+                continue
+            with self._state_lock:
+                # 构建期间快照被全量重建替换或已失效：放回队首，基于最新快照重新应用（按节点对替换，可重复执行）
+                if self._snapshot is not snapshot or self._generation != generation:
+                    self._edits = edits + self._edits
+                    continue
+                self._publish(edited, generation)
+
+    def _publish(self, snapshot: GraphSnapshot, generation: int) -> GraphSnapshot:
+        self._version += 1
+        snapshot.version = self._version
+        self._snapshot = snapshot
+        self._built_generation = generation
+        print(f"✅ 路网图快照已更新：版本{self._version}（{snapshot.change}），耗时{snapshot.build_seconds:.3f}秒")
+        for callback in self._listeners:
+            try:
+                callback(self._snapshot)
+            except Exception as e:
+                print(f"⚠️  路网图快照回调失败：{str(e)}")
+        return self._snapshot
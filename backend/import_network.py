@@ -0,0 +1,41 @@
+# backend/import_network.py
+"""
+命令行批量导入路网：python import_network.py 路网文件 [--type-field 字段名] [--default-type 支路]
+支持GeoJSON / GPX / Shapefile等OGR可读取的道路图层，导入后计算新增边的地形属性
+"""
+import argparse
+import json
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import Session
+
+from database import SQLALCHEMY_DATABASE_URL  # 复用数据库连接配置
+from edge_terrain import ensure_edge_terrain_columns, refresh_edge_terrain
+from network_import import DEFAULT_EDGE_TYPE, VALID_EDGE_TYPES, import_network
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="批量导入路网边（GeoJSON / GPX / Shapefile）")
+    parser.add_argument("path", help="矢量文件路径")
+    parser.add_argument("--type-field", default="type", help="道路类型字段名（默认type）")
+    parser.add_argument("--default-type", default=DEFAULT_EDGE_TYPE, choices=VALID_EDGE_TYPES,
+                        help="要素未提供道路类型时的默认类型")
+    args = parser.parse_args()
+
+    engine = create_engine(SQLALCHEMY_DATABASE_URL)
+    db = Session(bind=engine)
+    try:
+        print(f"=== 开始导入路网：{args.path} ===")
+        report = import_network(engine, args.path, args.type_field, args.default_type)
+        print(json.dumps({k: v for k, v in report.items() if k != "rejected_samples"}, ensure_ascii=False, indent=2))
+        for sample in report["rejected_samples"][:20]:
+            print(f"  无效要素 #{sample['feature']}（图层{sample['layer']}）：{sample['reason']}")
+
+        print("\n=== 开始计算新增路网边地形属性 ===")
+        ensure_edge_terrain_columns(engine)
+        print(f"已更新 {refresh_edge_terrain(db)} 条路网边的地形属性")
+        print("\n✅ 路网导入完成！如需按交叉口打断节点，请调用 /network/build-topology")
+    except Exception as e:
+        print(f"\n❌ 导入失败：{str(e)}")
+        db.rollback()
+    finally:
+        db.close()
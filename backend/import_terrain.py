@@ -1,22 +1,31 @@
 # backend/import_terrain.py
 from osgeo import gdal 
 import pandas as pd
-import numpy as np
+import time
 from sqlalchemy import create_engine
-from shapely.geometry import Point
-from geoalchemy2.shape import from_shape
 from database import SQLALCHEMY_DATABASE_URL  # 复用数据库连接配置
 from models import ElevationPoint, SlopePoint  # 导入高程/坡度模型
+from edge_terrain import ensure_edge_terrain_columns, mark_terrain_dirty, refresh_edge_terrain
+from terrain_loader import (bulk_load_points, has_block_fingerprints, incremental_load, load_terrain_tiles,
+                            raster_block_points, record_block_fingerprints)
+from terrain_store import ELEVATION_LAYER, SLOPE_LAYER
 from sqlalchemy.orm import Session
 
 # -------------------------- 1. 修改：DEM文件路径 --------------------------
-# 指向 terrain_data 文件夹下的 fangshan_dem.tif
-DEM_FILE_PATH = "./terrain_data/fangshan_dem.tiff"
-# 生成的坡度文件路径（自动保存到 terrain_data）
-SLOPE_FILE_PATH = "./terrain_data/slope.tif"
+# DEM（terrain_data/fangshan_dem.tiff）与生成的坡度文件（terrain_data/slope.tif）路径，
+# 与路径规划内存栅格采样（terrain_sampler）共用同一配置
+from terrain_sampler import DEM_FILE_PATH, SLOPE_FILE_PATH
 # 临时CSV文件路径（导入后可删除）
 ELEVATION_CSV = "./terrain_data/elevation.csv"
 SLOPE_CSV = "./terrain_data/slope.csv"
+# 是否同时导入逐像元高程点/坡度点表（旧存储方式；路径采样与边地形属性已改用分块地形表terrain_tiles）
+IMPORT_POINT_TABLES = False
+# DEM转CSV每个行块的目标像元数
+BLOCK_PIXELS = 1 << 20
+# 每处理多少个行块输出一次进度
+PROGRESS_EVERY_BLOCKS = 16
+# 输出受地形变化影响的路网边ID时最多列出的条数（全量导入时可达全部路网边）
+MAX_REPORTED_EDGE_IDS = 20
 
 # -------------------------- 2. 初始化数据库连接（无需修改） --------------------------
 engine = create_engine(SQLALCHEMY_DATABASE_URL)
@@ -26,9 +35,12 @@ db = Session(bind=engine)
 def tif_to_csv(tif_path, output_csv, is_slope=False):
     """
     将DEM/坡度TIF文件转为CSV（经纬度+高程/坡度）
+    按行块流式处理：每次读取一个行块，NumPy掩膜过滤无效值、按地理参数向量化计算经纬度后直接追加写入CSV，
+    不在内存中保留整幅栅格或全部数据点
     :param tif_path: TIF文件路径（fangshan_dem.tif 或 slope.tif）
     :param output_csv: 输出CSV路径
     :param is_slope: 是否为坡度文件（区分高程/坡度字段名）
+    :return: 写入的数据点数
     """
     # 读取TIF文件（依赖GDAL，需提前安装成功）
     ds = gdal.Open(tif_path)
@@ -36,35 +48,34 @@ def tif_to_csv(tif_path, output_csv, is_slope=False):
         raise FileNotFoundError(f"找不到TIF文件：{tif_path}，请检查路径是否正确")
     
     band = ds.GetRasterBand(1)
-    arr = band.ReadAsArray()  # 读取高程/坡度矩阵
-    geotransform = ds.GetGeoTransform()  # 获取地理坐标信息（关键）
+    width, height = ds.RasterXSize, ds.RasterYSize
+    nodata = band.GetNoDataValue()
+    geotransform = ds.GetGeoTransform()  # 获取地理坐标信息（关键，WGS84经纬度，与数据库保持一致）
     
-    # 计算经纬度范围（WGS84坐标，与数据库保持一致）
-    min_lon = geotransform[0]  # 左上角经度
-    max_lat = geotransform[3]  # 左上角纬度
-    lon_res = geotransform[1]  # 经度分辨率（每像素代表的经度差）
-    lat_res = geotransform[5]  # 纬度分辨率（每像素代表的纬度差，通常为负数）
+    # 行块高度：取文件自身分块高度的整数倍，且每块约BLOCK_PIXELS个像元
+    block_rows = band.GetBlockSize()[1]
+    block_rows *= max(1, BLOCK_PIXELS // max(width * block_rows, 1))
+    value_field = "slope_deg" if is_slope else "elevation_m"
     
-    # 提取有效数据（过滤NaN/无效值）
-    data = []
-    for i in range(arr.shape[0]):  # 行（纬度方向）
-        for j in range(arr.shape[1]):  # 列（经度方向）
-            value = arr[i, j]
-            # 过滤无效值（DEM常见无效值为-9999或NaN）
-            if value < 0 or np.isnan(value):
-                continue
-            # 计算当前像素的经纬度
-            lon = min_lon + j * lon_res
-            lat = max_lat + i * lat_res
-            # 按类型添加数据（高程/坡度字段名区分）
-            if is_slope:
-                data.append({"lon": lon, "lat": lat, "slope_deg": value})
-            else:
-                data.append({"lon": lon, "lat": lat, "elevation_m": value})
+    count = 0
+    started = time.perf_counter()
+    with open(output_csv, "w", encoding="utf-8", newline="") as f:
+        for y in range(0, height, block_rows):
+            rows = min(block_rows, height - y)
+            arr = band.ReadAsArray(0, y, width, rows)  # 读取当前行块的高程/坡度矩阵
+            # 过滤无效值并计算有效像素的经纬度（与增量导入共用同一换算）
+            lons, lats, values = raster_block_points(arr, y, 0, geotransform, nodata)
+            pd.DataFrame({"lon": lons, "lat": lats, value_field: values}).to_csv(f, header=(y == 0), index=False)
+            count += len(values)
+            
+            done = y + rows
+            if done == height or (y // block_rows) % PROGRESS_EVERY_BLOCKS == 0:
+                elapsed = max(time.perf_counter() - started, 1e-9)
+                print(f"  {tif_path}：已处理 {done}/{height} 行（{done * 100 // height}%），"
+                      f"{count} 个有效点，{done * width / elapsed / 1e6:.2f} 百万像元/秒")
     
-    # 保存为CSV（后续导入数据库用）
-    pd.DataFrame(data).to_csv(output_csv, index=False, encoding="utf-8")
-    print(f"成功生成CSV：{output_csv}，共 {len(data)} 条数据")
+    print(f"成功生成CSV：{output_csv}，共 {count} 条数据，耗时 {time.perf_counter() - started:.2f} 秒")
+    return count
 
 # -------------------------- 4. 生成坡度文件（从fangshan_dem.tif派生） --------------------------
 def generate_slope_tif():
@@ -83,82 +94,62 @@ def generate_slope_tif():
 
 # -------------------------- 5. CSV导入数据库（高程点/坡度点） --------------------------
 def import_elevation_to_db(csv_path):
-    """将高程CSV导入elevation_points表"""
-    df = pd.read_csv(csv_path)
-    batch_size = 1000  # 批量插入，避免数据库压力
-    count = 0
-    
-    for _, row in df.iterrows():
-        # 创建Shapely点（经纬度顺序：lon在前，lat在后）
-        point = Point(row["lon"], row["lat"])
-        # 转为PostGIS的Geometry类型（SRID=4326，与数据库一致）
-        geom = from_shape(point, srid=4326)
-        
-        # 构造高程点对象
-        elev_point = ElevationPoint(
-            geom=geom,
-            elevation_m=round(row["elevation_m"], 2)  # 保留2位小数
-        )
-        
-        db.add(elev_point)
-        count += 1
-        
-        # 每1000条提交一次
-        if count % batch_size == 0:
-            db.commit()
-            print(f"已导入 {count} 个高程点")
-    
-    # 提交剩余数据
-    db.commit()
-    print(f"高程点导入完成，共 {count} 条数据")
+    """将高程CSV导入elevation_points表（COPY并行批量导入，中断后重新执行自动续传）"""
+    return bulk_load_points(engine, ElevationPoint, "elevation_m", csv_path)
 
 def import_slope_to_db(csv_path):
-    """将坡度CSV导入slope_points表（逻辑与高程类似）"""
-    df = pd.read_csv(csv_path)
-    batch_size = 1000
-    count = 0
-    
-    for _, row in df.iterrows():
-        point = Point(row["lon"], row["lat"])
-        geom = from_shape(point, srid=4326)
-        
-        slope_point = SlopePoint(
-            geom=geom,
-            slope_deg=round(row["slope_deg"], 2)
-        )
-        
-        db.add(slope_point)
-        count += 1
-        
-        if count % batch_size == 0:
-            db.commit()
-            print(f"已导入 {count} 个坡度点")
-    
-    db.commit()
-    print(f"坡度点导入完成，共 {count} 条数据")
+    """将坡度CSV导入slope_points表（逻辑与高程相同）"""
+    return bulk_load_points(engine, SlopePoint, "slope_deg", csv_path)
+
+def import_point_tables():
+    """逐像元高程点/坡度点表导入（已有分块指纹时增量导入，否则经CSV全量导入）"""
+    if has_block_fingerprints(engine, ElevationPoint) and has_block_fingerprints(engine, SlopePoint):
+        print("\n=== 开始增量导入高程点 ===")
+        incremental_load(engine, ElevationPoint, "elevation_m", gdal.Open(DEM_FILE_PATH))
+        print("\n=== 开始增量导入坡度点 ===")
+        incremental_load(engine, SlopePoint, "slope_deg", gdal.Open(SLOPE_FILE_PATH))
+        return
+    # DEM/坡度TIF转CSV
+    print("\n=== 开始处理DEM文件 ===")
+    tif_to_csv(DEM_FILE_PATH, ELEVATION_CSV, is_slope=False)
+    print("\n=== 开始处理坡度文件 ===")
+    tif_to_csv(SLOPE_FILE_PATH, SLOPE_CSV, is_slope=True)
+    # 导入高程/坡度数据到数据库
+    print("\n=== 开始导入高程点 ===")
+    import_elevation_to_db(ELEVATION_CSV)
+    print("\n=== 开始导入坡度点 ===")
+    import_slope_to_db(SLOPE_CSV)
+    # 记录分块指纹，作为下次增量导入的基准
+    record_block_fingerprints(engine, ElevationPoint, gdal.Open(DEM_FILE_PATH))
+    record_block_fingerprints(engine, SlopePoint, gdal.Open(SLOPE_FILE_PATH))
 
 # -------------------------- 6. 主执行逻辑（按顺序调用） --------------------------
 if __name__ == "__main__":
     try:
-        # 步骤1：DEM转高程CSV
-        print("=== 开始处理DEM文件 ===")
-        tif_to_csv(DEM_FILE_PATH, ELEVATION_CSV, is_slope=False)
-        
-        # 步骤2：生成坡度TIF
-        print("\n=== 开始生成坡度文件 ===")
+        # 步骤1：生成坡度TIF
+        print("=== 开始生成坡度文件 ===")
         generate_slope_tif()
         
-        # 步骤3：坡度TIF转CSV
-        print("\n=== 开始处理坡度文件 ===")
-        tif_to_csv(SLOPE_FILE_PATH, SLOPE_CSV, is_slope=True)
+        # 步骤2：高程/坡度栅格及其降采样金字塔按块写入分块地形表（只写入内容变化的块）
+        print("\n=== 开始导入分块地形 ===")
+        envelopes = load_terrain_tiles(engine, ELEVATION_LAYER, gdal.Open(DEM_FILE_PATH))["envelopes"]
+        envelopes += load_terrain_tiles(engine, SLOPE_LAYER, gdal.Open(SLOPE_FILE_PATH))["envelopes"]
         
-        # 步骤4：导入高程数据到数据库
-        print("\n=== 开始导入高程点 ===")
-        import_elevation_to_db(ELEVATION_CSV)
+        # 步骤3（可选）：逐像元点表
+        if IMPORT_POINT_TABLES:
+            import_point_tables()
         
-        # 步骤5：导入坡度数据到数据库
-        print("\n=== 开始导入坡度点 ===")
-        import_slope_to_db(SLOPE_CSV)
+        # 步骤4：只重算地形变化范围内的路网边地形属性（首次导入时全部块均为变化块）
+        print("\n=== 开始刷新路网边地形属性 ===")
+        ensure_edge_terrain_columns(engine)
+        edge_ids = mark_terrain_dirty(db, envelopes)
+        sample = edge_ids[:MAX_REPORTED_EDGE_IDS]
+        print(f"受地形变化影响的路网边：{len(edge_ids)} 条" + (f"，ID示例：{sample}" if sample else "")
+              + ("…" if len(edge_ids) > len(sample) else ""))
+        refresh_edge_terrain(db)
+        if edge_ids:
+            # 路网边地形属性已在数据库中刷新，运行中的后端服务需重新加载路径规划图
+            print("💡 后端服务运行中时，请调用 POST /network/refresh-terrain 重新加载路径规划图")
         
         print("\n✅ 所有地形数据处理完成！")
     
@@ -166,4 +157,4 @@ if __name__ == "__main__":
         print(f"\n❌ 处理失败：{str(e)}")
         db.rollback()  # 出错时回滚数据库
     finally:
-        db.close()  # 关闭数据库连接
\ No newline at end of file
+        db.close()  # 关闭数据库连接
@@ -0,0 +1,91 @@
+# backend/isochrone.py
+"""
+等时圈/可达范围：单源受限Dijkstra一次搜索，得到预算内全部可达节点及其代价
+- 预算类型：distance=按策略权重（shortest即米），time=按Naismith徒步用时（分钟）
+- 可选凹包多边形：可达节点 + 预算边界处边上的插值点，供地图渲染可达范围
+"""
+import heapq
+import math
+
+import numpy as np
+import shapely
+from shapely.geometry import MultiPoint, mapping
+
+from routing_engine import haversine_array
+
+# Naismith规则：平路步行速度（米/分钟，约5km/h），每爬升600米另加1小时
+NAISMITH_FLAT_M_PER_MIN = 5000 / 60
+NAISMITH_ASCENT_M_PER_MIN = 600 / 60
+
+
+def naismith_minutes(engine) -> np.ndarray:
+    """各边的Naismith徒步用时（分钟），考虑通行方向上的累计爬升"""
+    return engine.length_m / NAISMITH_FLAT_M_PER_MIN + engine.ascent_m / NAISMITH_ASCENT_M_PER_MIN
+
+
+def bounded_search(engine, source_id: int, weights: list, budget: float):
+    """
+    单源受限Dijkstra
+    :param engine: RoutingEngine
+    :param source_id: 起点节点ID
+    :param weights: 边权重列表（与CSR边一一对应）
+    :param budget: 代价上限
+    :return: (节点下标 → 最小代价, 已确定节点数)
+    """
+    source = engine.index_of[source_id]
+    indptr, indices = engine.adjacency
+    dist = {source: 0.0}
+    done = {}
+    heap = [(0.0, source)]
+    while heap:
+        d, u = heapq.heappop(heap)
+        if u in done:
+            continue
+        if d > budget:
+            break
+        done[u] = d
+        for pos in range(indptr[u], indptr[u + 1]):
+            v = indices[pos]
+            nd = d + weights[pos]
+            if nd <= budget and v not in done and nd < dist.get(v, math.inf):
+                dist[v] = nd
+                heapq.heappush(heap, (nd, v))
+    return done, len(done)
+
+
+def frontier_points(network, engine, reached: dict, weights: list, budget: float) -> list:
+    """
+    预算边界：从可达节点出发但终点超出预算的边，按剩余预算比例沿边折线（按累计长度）插值
+    :param network: 路网边表（RoadNetwork，提供边折线坐标）
+    :param engine: 由network生成的RoutingEngine
+    """
+    points = []
+    indptr, indices = engine.adjacency
+    for u, d in reached.items():
+        for pos in range(indptr[u], indptr[u + 1]):
+            v = indices[pos]
+            w = weights[pos]
+            if v in reached or w <= 0:
+                continue
+            ratio = min((budget - d) / w, 1.0)
+            # 通行方向上的折线坐标（起点为u）
+            coords = network.line_coords(int(engine.edge_row[pos]), bool(engine.edge_reversed[pos]))
+            cum = np.concatenate(([0.0], np.cumsum(haversine_array(coords[:-1, 0], coords[:-1, 1],
+                                                                   coords[1:, 0], coords[1:, 1]))))
+            if len(coords) < 2 or cum[-1] <= 0:
+                continue
+            lng = np.interp(ratio * cum[-1], cum, coords[:, 0])
+            lat = np.interp(ratio * cum[-1], cum, coords[:, 1])
+            if np.isfinite(lng) and np.isfinite(lat):
+                points.append((float(lng), float(lat)))
+    return points
+
+
+def reachability_polygon(points: list, ratio: float):
+    """凹包多边形（GeoJSON），点数不足3个时返回None"""
+    if len(points) < 3:
+        return None
+    hull = shapely.concave_hull(MultiPoint(points), ratio=ratio)
+    if hull.is_empty or hull.geom_type not in ("Polygon", "MultiPolygon"):
+        return None
+    return mapping(hull)
@@ -0,0 +1,186 @@
+# backend/listing.py
+"""
+POI/路网点/路网边列表查询：一条SQL取出属性与坐标，按ID键集分页，支持字段选择与流式输出
+- 点坐标由ST_X/ST_Y在主查询中直接取出；线坐标取WKB二进制，整页用shapely一次批量解码，不再逐行查询ST_AsText并用正则解析
+- 键集分页：按ID升序，after_id为上一页最后一条的ID（比OFFSET分页稳定，深翻页不变慢）
+- 流式输出（NDJSON / GeoJSON）按批次键集查询逐批产出，不在内存中保留整个集合
+"""
+import json
+
+import numpy as np
+import shapely
+from sqlalchemy import func, select
+
+import database
+import models
+
+# 流式输出每批查询的行数
+STREAM_BATCH_ROWS = 5000
+# 单页最多行数
+MAX_PAGE_ROWS = 10000
+# 支持的输出格式
+OUTPUT_FORMATS = ("json", "ndjson", "geojson")
+
+
+def _time(value):
+    return value.strftime("%Y-%m-%d %H:%M:%S") if value is not None else None
+
+
+# 各集合：模型、可选字段 → (查询列, 取值函数)，几何字段（lng/lat/coords）用于GeoJSON几何
+# 取值函数只作用于非空值；需要把NULL转成默认值的字段见_NULL_DEFAULTS
+_COLLECTIONS = {
+    "pois": (models.Poi, {
+        "id": (models.Poi.id, int),
+        "name": (models.Poi.name, str),
+        "type": (models.Poi.type, str),
+        "description": (models.Poi.description, str),
+        "lat": (func.ST_Y(models.Poi.geom), float),
+        "lng": (func.ST_X(models.Poi.geom), float),
+        "is_active": (models.Poi.is_active, bool),
+        "create_time": (models.Poi.create_time, _time)
+    }),
+    "nodes": (models.NetworkNode, {
+        "id": (models.NetworkNode.id, int),
+        "lat": (func.ST_Y(models.NetworkNode.geom), float),
+        "lng": (func.ST_X(models.NetworkNode.geom), float),
+        "degree": (models.NetworkNode.degree, lambda v: v),
+        "create_time": (models.NetworkNode.create_time, _time)
+    }),
+    "edges": (models.NetworkEdge, {
+        "id": (models.NetworkEdge.id, int),
+        "source": (models.NetworkEdge.source, int),  # 起点节点ID
+        "target": (models.NetworkEdge.target, int),  # 终点节点ID
+        "coords": (func.ST_AsBinary(models.NetworkEdge.geom), None),  # 路径经纬度数组：[[lng1,lat1], [lng2,lat2], ...]
+        "length_m": (models.NetworkEdge.length_m, float),
+        "type": (models.NetworkEdge.type, str),
+        "create_time": (models.NetworkEdge.create_time, _time)
+    })
+}
+
+# NULL值的返回默认值（与原接口保持一致：POI描述为空时返回空字符串）
+_NULL_DEFAULTS = {("pois", "description"): ""}
+
+
+def parse_fields(collection: str, fields: str = None) -> list:
+    """
+    字段选择参数（逗号分隔）→ 字段列表，未指定时返回全部字段
+    :raises ValueError: 含不支持的字段
+    """
+    available = list(_COLLECTIONS[collection][1])
+    if not fields:
+        return available
+    selected = [f.strip() for f in fields.split(",") if f.strip()]
+    unknown = [f for f in selected if f not in available]
+    if unknown or not selected:
+        raise ValueError(f"字段无效：{unknown or fields}，可选字段：{available}")
+    return selected
+
+
+def _decode_lines(wkbs: list) -> list:
+    """整页WKB线几何一次批量解码 → 每条边的经纬度二维数组"""
+    if not wkbs:
+        return []
+    geoms = shapely.from_wkb([bytes(w) for w in wkbs])
+    coords, index = shapely.get_coordinates(geoms, return_index=True)
+    counts = np.bincount(index, minlength=len(wkbs))
+    return [part.tolist() for part in np.split(coords, np.cumsum(counts)[:-1])]
+
+
+def fetch_page(db, collection: str, fields: list, after_id: int = None, limit: int = None,
+               filters: tuple = ()) -> list:
+    """
+    单次查询一页数据（按ID升序）
+    :param collection: pois / nodes / edges
+    :param fields: parse_fields返回的字段列表
+    :param after_id: 只返回ID大于该值的行（键集分页游标）
+    :param limit: 最多行数（None为不限）
+    :param filters: 附加过滤条件（SQLAlchemy表达式）
+    :return: [{字段: 值}, ...]
+    """
+    model, spec = _COLLECTIONS[collection]
+    query = select(model.id.label("_id"), *(spec[f][0].label(f) for f in fields)).where(*filters)
+    if after_id is not None:
+        query = query.where(model.id > after_id)
+    query = query.order_by(model.id)
+    if limit is not None:
+        query = query.limit(limit)
+    rows = db.execute(query).all()
+    columns = {}
+    for f in fields:
+        values = [getattr(row, f) for row in rows]
+        convert = spec[f][1]
+        if f == "coords":
+            columns[f] = _decode_lines(values)
+        else:
+            default = _NULL_DEFAULTS.get((collection, f))
+            columns[f] = [convert(v) if v is not None else default for v in values]
+    items = [{f: columns[f][i] for f in fields} for i in range(len(rows))]
+    for item, row in zip(items, rows):
+        item["_id"] = row._id
+    return items
+
+
+def _strip_cursor(items: list) -> int:
+    """去掉内部游标字段，返回本批最后一行ID"""
+    last = None
+    for item in items:
+        last = item.pop("_id")
+    return last
+
+
+def list_collection(db, collection: str, fields: list, after_id: int = None, limit: int = None,
+                    filters: tuple = ()) -> tuple:
+    """
+    JSON列表（一次返回）
+    :return: (数据列表, 下一页游标：本页已满时为最后一行ID，否则None)
+    """
+    items = fetch_page(db, collection, fields, after_id, limit, filters)
+    last = _strip_cursor(items)
+    return items, (last if limit is not None and len(items) == limit else None)
+
+
+def to_feature(collection: str, item: dict) -> dict:
+    """列表行 → GeoJSON要素（几何字段未选择时geometry为null）"""
+    properties = {k: v for k, v in item.items() if k not in ("lng", "lat", "coords")}
+    geometry = None
+    if collection == "edges" and item.get("coords") is not None:
+        geometry = {"type": "LineString", "coordinates": item["coords"]}
+    elif item.get("lng") is not None and item.get("lat") is not None:
+        geometry = {"type": "Point", "coordinates": [item["lng"], item["lat"]]}
+    return {"type": "Feature", "id": item.get("id"), "geometry": geometry, "properties": properties}
+
+
+def stream_collection(collection: str, fields: list, output: str, after_id: int = None, limit: int = None,
+                      filters: tuple = ()):
+    """
+    流式输出（生成器）：每批STREAM_BATCH_ROWS行键集查询，使用独立数据库会话（响应发送期间请求会话可能已关闭）
+    :param output: ndjson（每行一个对象）/ geojson（FeatureCollection）
+    """
+    db = database.SessionLocal()
+    try:
+        if output == "geojson":
+            yield '{"type": "FeatureCollection", "features": [\n'
+        remaining = limit
+        first = True
+        while remaining is None or remaining > 0:
+            batch = STREAM_BATCH_ROWS if remaining is None else min(STREAM_BATCH_ROWS, remaining)
+            items = fetch_page(db, collection, fields, after_id, batch, filters)
+            after_id = _strip_cursor(items)
+            lines = []
+            for item in items:
+                if output == "geojson":
+                    lines.append(("" if first else ",\n") + json.dumps(to_feature(collection, item), ensure_ascii=False))
+                    first = False
+                else:
+                    lines.append(json.dumps(item, ensure_ascii=False) + "\n")
+            if lines:
+                yield "".join(lines)
+            if remaining is not None:
+                remaining -= len(items)
+            if len(items) < batch:
+                break
+            db.rollback()  # 结束本批只读事务，避免长时间占用快照
+        if output == "geojson":
+            yield "\n]}\n"
+    finally:
+        db.close()
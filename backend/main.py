@@ -1,5 +1,5 @@
 # 基础依赖导入
-from fastapi import FastAPI, Depends, HTTPException, Body
+from fastapi import FastAPI, Depends, HTTPException, Body, Query
 from sqlalchemy.orm import Session
 from sqlalchemy import func
 from shapely.geometry import Point, LineString
@@ -16,10 +16,32 @@ from datetime import datetime
 # 项目模块导入
 import models
 import database
+from graph_service import GraphService
+from road_network import RoadNetwork
+from routing_engine import NoPathError
+from contraction import CHManager
+from pareto import DEFAULT_MAX_LABELS, optimal_alpha_range, pareto_routes, select_spread
+from matrix import MatrixCache, cost_matrix, matrix_to_json
+from tour_optimizer import is_reachable, optimize_tour
+from snapping import DEFAULT_MAX_SNAP_M, SnapPoint, SnappedRoute, snapped_route
+from alternatives import DEFAULT_MAX_SHARE, DEFAULT_MAX_STRETCH, alternative_routes
+from route_summary import summarize_route, summarize_snapped_route
+from path_sampling import adaptive_profile, path_20m_sampling, path_interpolate_elevation_slope, terrain_version
+from batch_planner import MAX_BATCH_JOBS, BatchPlanner
+from route_cache import RouteCache, route_key
+from terrain_sampler import get_terrain_sampler
+from terrain_store import ensure_terrain_tiles_schema, get_terrain_store
+from isochrone import bounded_search, frontier_points, naismith_minutes, reachability_polygon
+import time
+import json
+from edge_terrain import ensure_edge_terrain_columns, refresh_edge_terrain
+from topology_builder import build_topology
+from network_import import DEFAULT_EDGE_TYPE, VALID_EDGE_TYPES, import_network, resolve_network_file
+from listing import MAX_PAGE_ROWS, OUTPUT_FORMATS, list_collection, parse_fields, stream_collection
 
 # 路径规划核心依赖
-import networkx as nx
 import numpy as np
+import shapely
 # 原有依赖保留（FastAPI/SQLAlchemy/PostGIS等）
 from fastapi import FastAPI, Depends, HTTPException, Body
 from sqlalchemy.orm import Session
@@ -39,6 +61,8 @@ app = FastAPI(title="徒步路线系统API", version="1.0.0", description="包
 
 # 自动创建数据库表（开发阶段使用，生产环境建议用Alembic做数据迁移）
 models.Base.metadata.create_all(bind=database.engine)
+ensure_edge_terrain_columns(database.engine)
+ensure_terrain_tiles_schema(database.engine)
 
 # 数据库会话依赖（每次请求自动创建/关闭，避免连接泄漏）
 def get_db():
@@ -63,28 +87,16 @@ def health_check():
     return {"code": 200, "message": "徒步路线系统后端服务正常运行", "data": None}
 
 # -------------------------- POI 核心CRUD接口 --------------------------
-@app.get("/pois", summary="查询所有POI（支持筛选启用状态）")
+@app.get("/pois", summary="查询所有POI（支持筛选启用状态、字段选择、键集分页、流式输出）")
 def get_all_pois(
     db: Session = Depends(get_db),
-    is_active: bool = True  # 可选参数：默认查询启用的POI
+    is_active: bool = True,  # 可选参数：默认查询启用的POI
+    fields: str = None,
+    after_id: int = None,
+    limit: int = None,
+    output: str = Query("json", alias="format")
 ):
-    pois = db.query(models.Poi).filter(models.Poi.is_active == is_active).all()
-    # 解析空间坐标为前端可识别的经纬度
-    result = []
-    for poi in pois:
-        geom_wkt = db.execute(func.ST_AsText(poi.geom)).scalar()
-        lng, lat = _parse_wkt_to_lnglat(geom_wkt)
-        result.append({
-            "id": poi.id,
-            "name": poi.name,
-            "type": poi.type,
-            "description": poi.description or "",
-            "lat": lat,
-            "lng": lng,
-            "is_active": poi.is_active,
-            "create_time": poi.create_time.strftime("%Y-%m-%d %H:%M:%S")
-        })
-    return {"code": 200, "message": "查询成功", "data": result}
+    return _list_response(db, "pois", fields, after_id, limit, output, (models.Poi.is_active == is_active,))
 
 @app.get("/pois/{poi_id}", summary="根据ID查询单个POI")
 def get_poi_by_id(poi_id: int, db: Session = Depends(get_db)):
@@ -215,21 +227,15 @@ def delete_poi(poi_id: int, db: Session = Depends(get_db)):
 
 # -------------------------- 路网（节点+边）核心接口 --------------------------
 # 1. 路网点接口
-@app.get("/network/nodes", summary="查询所有路网点")
-def get_all_nodes(db: Session = Depends(get_db)):
-    nodes = db.query(models.NetworkNode).all()
-    result = []
-    for node in nodes:
-        geom_wkt = db.execute(func.ST_AsText(node.geom)).scalar()
-        lng, lat = _parse_wkt_to_lnglat(geom_wkt)
-        result.append({
-            "id": node.id,
-            "lat": lat,
-            "lng": lng,
-            "degree": node.degree,
-            "create_time": node.create_time.strftime("%Y-%m-%d %H:%M:%S")
-        })
-    return {"code": 200, "message": "查询成功", "data": result}
+@app.get("/network/nodes", summary="查询所有路网点（支持字段选择、键集分页、流式输出）")
+def get_all_nodes(
+    db: Session = Depends(get_db),
+    fields: str = None,
+    after_id: int = None,
+    limit: int = None,
+    output: str = Query("json", alias="format")
+):
+    return _list_response(db, "nodes", fields, after_id, limit, output)
 
 @app.post("/network/nodes", summary="新增路网点")
 def create_node(
@@ -276,24 +282,15 @@ def delete_node(node_id: int, db: Session = Depends(get_db)):
     return {"code": 200, "message": f"路网点删除成功，ID：{node_id}", "data": None}
 
 # 2. 路网边接口
-@app.get("/network/edges", summary="查询所有路网边")
-def get_all_edges(db: Session = Depends(get_db)):
-    edges = db.query(models.NetworkEdge).all()
-    result = []
-    for edge in edges:
-        # 解析线坐标为经纬度数组
-        geom_wkt = db.execute(func.ST_AsText(edge.geom)).scalar()
-        coords = _parse_linestring_wkt(geom_wkt)
-        result.append({
-            "id": edge.id,
-            "source": edge.source,  # 起点节点ID
-            "target": edge.target,  # 终点节点ID
-            "coords": coords,       # 路径经纬度数组：[[lng1,lat1], [lng2,lat2], ...]
-            "length_m": float(edge.length_m),
-            "type": edge.type,
-            "create_time": edge.create_time.strftime("%Y-%m-%d %H:%M:%S")
-        })
-    return {"code": 200, "message": "查询成功", "data": result}
+@app.get("/network/edges", summary="查询所有路网边（支持字段选择、键集分页、流式输出）")
+def get_all_edges(
+    db: Session = Depends(get_db),
+    fields: str = None,
+    after_id: int = None,
+    limit: int = None,
+    output: str = Query("json", alias="format")
+):
+    return _list_response(db, "edges", fields, after_id, limit, output)
 
 @app.post("/network/edges", summary="新增路网边（需先创建起点/终点节点）")
 def create_edge(
@@ -349,6 +346,10 @@ def create_edge(
     # 提交事务
     db.commit()
     db.refresh(db_edge)
+    # 计算新边的地形属性（只处理本条边）
+    refresh_edge_terrain(db, edge_ids=[db_edge.id])
+    # 登记路网编辑（仅重新装载该节点对之间的边），新快照由后台线程构建后发布
+    graph_service.update_node_pair(db, source, target)
     return {
         "code": 201,
         "message": "路网边创建成功",
@@ -376,70 +377,87 @@ def delete_edge(edge_id: int, db: Session = Depends(get_db)):
     db.query(models.NetworkNode).filter(models.NetworkNode.id == target).update({"degree": func.max(models.NetworkNode.degree - 1, 0)})
     # 提交事务
     db.commit()
+    # 登记路网编辑，新快照由后台线程构建后发布
+    graph_service.update_node_pair(db, source, target)
     return {"code": 200, "message": f"路网边删除成功，ID：{edge_id}", "data": None}
 
 
 # -------------------------- 路网拓扑构建核心接口 --------------------------
-@app.post("/network/build-topology", summary="自动构建路网拓扑：从network_edges生成network_nodes并计算度数")
-def build_network_topology(db: Session = Depends(get_db)):
+@app.post("/network/import", summary="批量导入路网：GeoJSON/GPX/Shapefile道路图层流式读取，测地线长度，COPY入库")
+def import_network_file(
+    file: str = Body(..., embed=True),  # network_data目录下的矢量文件名（Shapefile需附带.dbf/.shx/.prj）
+    type_field: str = Body("type", embed=True),  # 道路类型字段名
+    default_type: str = Body(DEFAULT_EDGE_TYPE, embed=True),  # 要素未提供道路类型时的默认类型
+    db: Session = Depends(get_db)
+):
+    """
+    核心逻辑：OGR流式读取 → 每批向量化计算测地线长度 → COPY入中转表 → 端点匹配/新增路网点 → 写入路网边 → 集合语句刷新度数（见network_import.py）
+    长度由几何计算，不接受客户端提供；无效要素跳过并在结果中列出原因
+    """
+    try:
+        if default_type not in VALID_EDGE_TYPES:
+            raise HTTPException(status_code=400, detail=f"道路类型无效，仅支持：{VALID_EDGE_TYPES}")
+        try:
+            path = resolve_network_file(file)
+        except (ValueError, FileNotFoundError) as e:
+            raise HTTPException(status_code=400, detail=str(e))
+
+        report = import_network(database.engine, path, type_field, default_type)
+        # 计算新增边的地形属性（仅处理几何未计算过的边）
+        terrain_updated_count = refresh_edge_terrain(db)
+        if report["edges_inserted"]:
+            graph_service.invalidate()
+        return {
+            "code": 200,
+            "message": f"路网导入成功：{report['edges_inserted']} 条边，无效要素 {report['rejected']} 个",
+            "data": {**report, "terrain_updated_count": terrain_updated_count}
+        }
+
+    except HTTPException as e:
+        raise e
+    except Exception as e:
+        db.rollback()
+        print(f"❌ 路网导入异常：{str(e)}")
+        raise HTTPException(status_code=500, detail=f"路网导入失败，异常信息：{str(e)[:200]}")
+
+@app.post("/network/build-topology", summary="自动构建路网拓扑：从network_edges生成network_nodes并计算度数（按分块增量构建）")
+def build_network_topology(
+    force: bool = Body(False, embed=True),  # True：忽略分块指纹，全部分块重新节点化
+    db: Session = Depends(get_db)
+):
     """
-    核心逻辑：ST_Union(合并边) → ST_Node(节点化) → ST_DumpPoints(拆解节点)
-    步骤：1. 清空现有network_nodes（避免重复） 2. 生成新节点 3. 计算并更新节点度数
+    核心逻辑：路网按网格分块 → 各块并行ST_Node节点化 → 按坐标归属拼接块边界节点（见topology_builder.py）
+    步骤：1. 比对各分块边指纹，找出变化的分块 2. 只重算变化分块的节点（坐标不变的节点保留原ID） 3. 重新关联边起终点并更新节点度数
     """
     try:
         # 步骤1：检查是否有路网边，无则直接返回
         edge_count = db.query(models.NetworkEdge).count()
         if edge_count == 0:
             raise HTTPException(status_code=400, detail="无路网边数据，请先导入/新增network_edges数据后再构建拓扑")
-        
-        # 步骤2：清空现有network_nodes表（保证拓扑一致性，避免旧数据干扰）
-        db.query(models.NetworkNode).delete()
-        db.commit()
-        print(f"ℹ️  已清空现有{edge_count}条路网点数据")
-
-        # 步骤3：核心SQL - 调用PostGIS函数生成节点，插入network_nodes
-        # ST_Union(geom)：合并所有边 → ST_Node：节点化 → ST_DumpPoints：拆解为单个点
-        create_nodes_sql = """
-        INSERT INTO network_nodes (geom, create_time)
-        SELECT 
-            (ST_DumpPoints(ST_Node(ST_Union(geom)))).geom AS node_geom,
-            NOW() AS create_time
-        FROM network_edges;
-        """
-        # 执行原生SQL（PostGIS空间函数需原生执行，SQLAlchemyORM暂不支持复杂空间函数嵌套）
-        db.execute(create_nodes_sql)
-        db.commit()
-
-        # 步骤4：查询生成的节点数量
+
+        # 步骤2：分块增量节点化，重新关联边起终点并更新度数
+        topology = build_topology(db, force=force)
+
+        # 步骤3：查询生成的节点数量
         node_count = db.query(models.NetworkNode).count()
         if node_count == 0:
             raise HTTPException(status_code=500, detail="拓扑构建失败，未生成任何路网点")
-        
-        # 步骤5：计算并更新节点度数（核心：统计每个节点作为起点/终点的边数量）
-        # 度数=该节点作为source的边数 + 作为target的边数
-        update_degree_sql = """
-        UPDATE network_nodes n
-        SET degree = COALESCE(s.source_count, 0) + COALESCE(t.target_count, 0)
-        FROM (
-            SELECT source, COUNT(*) AS source_count FROM network_edges GROUP BY source
-        ) s
-        FULL JOIN (
-            SELECT target, COUNT(*) AS target_count FROM network_edges GROUP BY target
-        ) t ON s.source = t.target
-        WHERE n.id = COALESCE(s.source, t.target);
-        """
-        db.execute(update_degree_sql)
-        db.commit()
-
-        # 步骤6：查询最终更新度数后的节点数量
-        final_node_count = db.query(models.NetworkNode).count()
+
+        # 步骤4：批量计算新增/几何变更边的地形属性（坡度、爬升、下降）
+        terrain_updated_count = refresh_edge_terrain(db)
+        # 节点/边关联或边地形属性有变化时路网图缓存整体失效（下次规划时重建）
+        if topology["dirty_tiles"] or terrain_updated_count:
+            graph_service.invalidate()
+
         return {
             "code": 200,
             "message": f"路网拓扑构建成功！",
             "data": {
                 "network_edges_count": edge_count,  # 参与构建的路网边数量
-                "network_nodes_count": final_node_count,  # 生成的路网点数量
-                "tip": "已自动计算所有节点度数（连接的边数量）"
+                "network_nodes_count": node_count,  # 路网点数量
+                "terrain_updated_count": terrain_updated_count,  # 重算地形属性的路网边数量
+                "topology": topology,  # 分块构建统计（分块数、重算分块数、保留/新增/删除节点数等）
+                "tip": "只重算边有变化的分块，未变化区域的节点ID保持不变；已自动计算受影响节点的度数"
             }
         }
 
@@ -452,6 +470,42 @@ def build_network_topology(db: Session = Depends(get_db)):
         print(f"❌ 拓扑构建异常：{str(e)}")
         raise HTTPException(status_code=500, detail=f"路网拓扑构建失败，异常信息：{str(e)[:200]}")
 
+@app.post("/network/refresh-terrain", summary="批量刷新路网边地形属性（平均坡度/最大坡度比/累计爬升/累计下降）")
+def refresh_network_terrain(
+    force: bool = Body(False, embed=True),  # True：地形数据重新导入后重算全部边
+    db: Session = Depends(get_db)
+):
+    try:
+        updated_count = refresh_edge_terrain(db, force=force)
+    except Exception as e:
+        db.rollback()
+        print(f"❌ 地形属性刷新异常：{str(e)}")
+        raise HTTPException(status_code=500, detail=f"地形属性刷新失败，异常信息：{str(e)[:200]}")
+    # 边属性变化，路网图缓存整体失效；
+    # 本次无待刷新的边时，检查数据库中的地形属性是否比当前快照新（如import_terrain.py命令行导入后已在库内刷新）
+    stale = False
+    if not updated_count:
+        snapshot = graph_service.peek()
+        latest = db.query(func.max(models.NetworkEdge.terrain_update_time)).scalar()
+        stale = (snapshot is not None and latest is not None and
+                 (snapshot.network.terrain_version is None or latest > snapshot.network.terrain_version))
+    if updated_count or stale:
+        graph_service.invalidate()
+    return {"code": 200, "message": "地形属性刷新成功", "data": {
+        "updated_count": updated_count, "force": force, "graph_invalidated": bool(updated_count or stale)
+    }}
+
+@app.get("/terrain/cache-status", summary="查询地形分块缓存状态（栅格文件/数据库分块地形：数据源、驻留内存、命中率）")
+def get_terrain_cache_status(db: Session = Depends(get_db)):
+    def describe(sampler):
+        # 不可用：GDAL/栅格文件缺失，或terrain_tiles未导入
+        return {"available": True, **sampler.status} if sampler is not None else {"available": False}
+
+    return {"code": 200, "message": "查询成功", "data": {
+        "files": describe(get_terrain_sampler()),
+        "database": describe(get_terrain_store(db.get_bind()))
+    }}
+
 # -------------------------- 系统配置（坡度权重α）接口 --------------------------
 @app.get("/system-config/{key}", summary="查询系统配置（如slope_weight_alpha：坡度权重α）")
 def get_system_config(key: str, db: Session = Depends(get_db)):
@@ -487,10 +541,20 @@ def update_system_config(
                 raise HTTPException(status_code=400, detail="坡度权重α必须为0~1之间的数字（0：不考虑坡度，1：优先坡度）")
         except ValueError:
             raise HTTPException(status_code=400, detail="坡度权重α必须为数字格式")
+    if key == "routing_ch_enabled" and new_value.strip().lower() not in ("true", "false"):
+        raise HTTPException(status_code=400, detail="CH预处理开关仅支持true/false")
     # 3. 更新配置值（自动触发update_time）
     config.value = new_value.strip()
     db.commit()
     db.refresh(config)
+    # 4. 路径规划相关配置变化：同步CH预处理（α变化时后台按新α重建）
+    if key == "slope_weight_alpha":
+        ch_manager.gentlest_alpha = alpha
+        snapshot = graph_service.peek()
+        if snapshot is not None:
+            ch_manager.schedule(snapshot, alpha)
+    elif key == "routing_ch_enabled":
+        ch_manager.enabled = config.value.lower() == "true"
     return {
         "code": 200,
         "message": "配置更新成功",
@@ -513,22 +577,34 @@ def _parse_wkt_to_lnglat(wkt: str) -> (float, float):
     except (IndexError, ValueError):
         return 0.0, 0.0
 
-def _parse_linestring_wkt(wkt: str) -> list:
-    """解析WKT格式LINESTRING为经纬度二维数组[[lng1,lat1], ...]，异常返回空数组"""
-    if not wkt or not wkt.startswith("LINESTRING"):
-        return []
+def _list_response(db: Session, collection: str, fields: str, after_id: int, limit: int, output: str,
+                   filters: tuple = ()):
+    """
+    列表接口公共处理：一条SQL取出属性与坐标（见listing.py）
+    :param fields: 逗号分隔的返回字段，默认全部
+    :param after_id: 键集分页游标（上一页返回的next_after_id），只返回ID大于该值的记录
+    :param limit: 每页条数（1~MAX_PAGE_ROWS），不传则返回全部；流式输出时为总条数上限
+    :param output: json（默认，统一响应格式）/ ndjson（每行一个对象）/ geojson（FeatureCollection），后两者流式返回
+    """
+    if output not in OUTPUT_FORMATS:
+        raise HTTPException(status_code=400, detail=f"format仅支持：{list(OUTPUT_FORMATS)}")
+    if limit is not None and not (1 <= limit <= MAX_PAGE_ROWS):
+        raise HTTPException(status_code=400, detail=f"limit需在1~{MAX_PAGE_ROWS}之间")
     try:
-        # 提取括号内的坐标串，按逗号分割
-        coord_str = re.findall(r"LINESTRING\s*\((.*)\)", wkt)[0]
-        coord_pairs = coord_str.split(",")
-        # 解析每个坐标对
-        coords = []
-        for pair in coord_pairs:
-            lng, lat = pair.strip().split()
-            coords.append([float(lng), float(lat)])
-        return coords
-    except (IndexError, ValueError):
-        return []
+        selected = parse_fields(collection, fields)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    if output != "json":
+        media_type = "application/geo+json" if output == "geojson" else "application/x-ndjson"
+        return StreamingResponse(stream_collection(collection, selected, output, after_id, limit, filters),
+                                 media_type=media_type)
+
+    items, next_after_id = list_collection(db, collection, selected, after_id, limit, filters)
+    result = {"code": 200, "message": "查询成功", "data": items}
+    if limit is not None:
+        result["page"] = {"limit": limit, "count": len(items), "next_after_id": next_after_id}
+    return result
 
         # -------------------------- 系统配置自动初始化（坡度权重α） --------------------------
 @app.on_event("startup")
@@ -551,6 +627,18 @@ def init_default_config(db: Session = Depends(get_db)):
             print("✅ 系统配置初始化成功：已插入默认坡度权重α=0.5")
         else:
             print(f"✅ 坡度权重α配置已存在，当前值：{alpha_config.value}")
+        # 检查CH预处理开关是否存在（默认开启）
+        ch_config = db.query(models.SystemConfig).filter(models.SystemConfig.key == "routing_ch_enabled").first()
+        if not ch_config:
+            ch_config = models.SystemConfig(
+                key="routing_ch_enabled",
+                value="true",
+                description="CH预处理开关：true=路径规划使用收缩层次加速（后台预处理），false=始终使用A*"
+            )
+            db.add(ch_config)
+            db.commit()
+        ch_manager.enabled = ch_config.value.lower() == "true"
+        print(f"✅ CH预处理开关：{ch_config.value}")
     except Exception as e:
         db.rollback()
         print(f"⚠️  系统配置初始化失败：{str(e)}")
@@ -559,68 +647,72 @@ def init_default_config(db: Session = Depends(get_db)):
 
 
 # -------------------------- 路径规划工具函数（内部调用） --------------------------
-def get_edge_slope_avg(edge_geom, db: Session) -> float:
+# 路网边表装载列（行格式见RoadNetwork.from_rows），几何取WKB二进制整批解码
+_NETWORK_EDGE_COLUMNS = (
+    models.NetworkEdge.id, models.NetworkEdge.source, models.NetworkEdge.target,
+    models.NetworkEdge.length_m, models.NetworkEdge.slope_avg, models.NetworkEdge.max_grade,
+    models.NetworkEdge.ascent_m, models.NetworkEdge.descent_m, models.NetworkEdge.type,
+    models.NetworkEdge.terrain_update_time, func.ST_AsBinary(models.NetworkEdge.geom)
+)
+
+def _query_network_edges(db: Session, *filters) -> tuple:
     """
-    计算单条路网边的平均坡度slope_avg
-    :param edge_geom: 路网边的PostGIS Geometry(LINESTRING)对象
-    :param db: 数据库会话
-    :return: 平均坡度（度），无坡度点时返回0
+    按条件查询路网边（按ID升序），不做空间关联查询
+    :return: (行列表, shapely折线数组, 地形属性版本：terrain_update_time最大值)
     """
-    try:
-        # 空间关联：查询与路网边相交的所有坡度点（ST_Intersects实现空间匹配）
-        slope_points = db.query(models.SlopePoint.slope_deg).filter(
-            func.ST_Intersects(models.SlopePoint.geom, edge_geom)
-        ).all()
-        if not slope_points:
-            return 0.0  # 无坡度点，默认坡度为0
-        # 提取坡度值并计算平均值（NumPy高效计算）
-        slope_vals = np.array([p[0] for p in slope_points], dtype=np.float64)
-        slope_avg = np.mean(slope_vals).round(2)  # 保留2位小数
-        return max(slope_avg, 0.0)  # 坡度非负，避免异常值
-    except Exception as e:
-        print(f"计算边平均坡度失败：{str(e)}")
-        return 0.0
+    rows = db.query(*_NETWORK_EDGE_COLUMNS).filter(*filters).order_by(models.NetworkEdge.id).all()
+    geoms = shapely.from_wkb([bytes(row[-1]) for row in rows]) if rows else []
+    times = [row[-2] for row in rows if row[-2] is not None]
+    return [tuple(row[:-2]) for row in rows], geoms, (max(times) if times else None)
 
-def build_networkx_graph(db: Session) -> nx.DiGraph:
+def build_road_network(db: Session) -> RoadNetwork:
     """
-    构建NetworkX有向内存图（支持单向路，无向路可添加双向边）
+    构建路径规划用路网边表（主路/支路在展开有向弧时自动添加反向边）
     :param db: 数据库会话
-    :return: 带边属性的NetworkX DiGraph对象
+    :return: RoadNetwork紧凑边表
     """
-    # 初始化有向图
-    G = nx.DiGraph()
-    # 1. 加载所有路网边
-    edges = db.query(models.NetworkEdge).all()
-    if not edges:
+    # 1. 加载所有路网边（按ID排序，保证同一节点对多条边时的覆盖顺序与路网编辑一致）
+    rows, geoms, terrain_version = _query_network_edges(db)
+    if not rows:
         raise HTTPException(status_code=400, detail="无路网边数据，无法构建路径规划图")
-    # 2. 遍历每条边，添加到图中并计算属性
-    for edge in edges:
-        # 计算当前边的平均坡度
-        slope_avg = get_edge_slope_avg(edge.geom, db)
-        # 向图中添加边：source→target，挂载基础属性
-        G.add_edge(
-            edge.source,  # 起点节点ID
-            edge.target,  # 终点节点ID
-            length_m=float(edge.length_m),
-            slope_avg=slope_avg,
-            edge_id=edge.id,
-            type=edge.type
-        )
-        # 若为无向路（主路/支路），添加反向边（target→source），属性与正向边一致
-        if edge.type in ["主路", "支路"]:
-            G.add_edge(
-                edge.target,
-                edge.source,
-                length_m=float(edge.length_m),
-                slope_avg=slope_avg,
-                edge_id=edge.id,
-                type=edge.type
-            )
-    # 3. 检查图是否有节点
-    if G.number_of_nodes() == 0:
-        raise HTTPException(status_code=400, detail="路径规划图无节点，路网数据异常")
-    print(f"✅ NetworkX图构建成功：节点数{G.number_of_nodes()}，边数{G.number_of_edges()}")
-    return G
+    # 2. 一次查询挂载节点经纬度（A*启发函数、路径坐标序列使用）
+    node_ids = sorted({row[1] for row in rows} | {row[2] for row in rows})
+    network = RoadNetwork.from_rows(rows, geoms, load_node_coords(db, node_ids), terrain_version=terrain_version)
+    print(f"✅ 路网边表构建成功：节点数{len(network.node_ids)}，边数{network.edge_count}")
+    return network
+
+def load_node_pair_edges(db: Session, u: int, v: int) -> tuple:
+    """
+    加载两个节点之间（任意方向）的全部路网边，供路网编辑（替换边表中该节点对的行）使用
+    :return: (行列表, shapely折线数组, 地形属性版本)，按边ID升序
+    """
+    return _query_network_edges(db,
+        ((models.NetworkEdge.source == u) & (models.NetworkEdge.target == v)) |
+        ((models.NetworkEdge.source == v) & (models.NetworkEdge.target == u))
+    )
+
+def load_node_coords(db: Session, node_ids: list) -> dict:
+    """
+    批量查询路网点经纬度（单条SQL，ST_X/ST_Y直接取坐标）
+    :return: {node_id: (lng, lat)}
+    """
+    if not node_ids:
+        return {}
+    rows = db.query(
+        models.NetworkNode.id,
+        func.ST_X(models.NetworkNode.geom),
+        func.ST_Y(models.NetworkNode.geom)
+    ).filter(models.NetworkNode.id.in_(node_ids)).all()
+    return {node_id: (float(lng), float(lat)) for node_id, lng, lat in rows}
+
+# 进程内路网图缓存服务（全局单例）：构建一次，路网边编辑时后台生成新快照，拓扑重建时整体失效
+graph_service = GraphService(build_road_network, load_node_pair_edges, load_node_coords)
+# CH预处理管理（全局单例）：快照更新或α变化时后台重建，未就绪时路径规划回退A*
+ch_manager = CHManager()
+graph_service.add_listener(ch_manager.on_snapshot)
+# 路径规划结果缓存（全局单例）：/path-planning、GPX导出、前端规划接口共用，快照更新时清除旧版本
+route_cache = RouteCache()
+graph_service.add_listener(route_cache.on_snapshot)
 
 def get_slope_weight_alpha(db: Session) -> float:
     """
@@ -643,176 +735,107 @@ def get_slope_weight_alpha(db: Session) -> float:
         raise HTTPException(status_code=400, detail="坡度权重α必须为数字格式（0~1）")
 
 
-# -------------------------- 路径高程/坡度插值工具函数 --------------------------
-import math
-from shapely.ops import substring
-from geoalchemy2.functions import ST_SetSRID, ST_MakePoint, ST_DWithin
-
-def haversine_distance(lng1: float, lat1: float, lng2: float, lat2: float) -> float:
+def search_route(snapshot, start_node_id: int, end_node_id: int, strategy: str, alpha: float):
     """
-    哈维正弦公式计算WGS84经纬度两点间的地理距离（米）
-    :param lng1/lat1: 点1经纬度
-    :param lng2/lat2: 点2经纬度
-    :return: 两点间距离（米）
+    单对起终点最小权重路径搜索：优先使用已就绪的CH，未就绪（后台预处理中）时回退A*
+    :return: (RouteResult, 搜索方式 "ch"/"astar")
     """
-    # 地球半径（米）
-    R = 6371000.0
-    # 角度转弧度
-    lat1_rad = math.radians(lat1)
-    lat2_rad = math.radians(lat2)
-    d_lat = math.radians(lat2 - lat1)
-    d_lng = math.radians(lng2 - lng1)
-    # 哈维正弦公式
-    a = math.sin(d_lat / 2) ** 2 + math.cos(lat1_rad) * math.cos(lat2_rad) * math.sin(d_lng / 2) ** 2
-    c = 2 * math.atan2(math.sqrt(a), math.sqrt(1 - a))
-    distance = R * c
-    return distance
-
-def path_20m_sampling(coord_path: list) -> list:
+    if strategy == "gentlest":
+        ch_manager.gentlest_alpha = alpha
+    ch = ch_manager.get(snapshot, alpha)
+    if ch is not None:
+        return ch.shortest_path(snapshot.engine, start_node_id, end_node_id), "ch"
+    return snapshot.engine.shortest_path(start_node_id, end_node_id, alpha), "astar"
+
+def resolve_strategy_alpha(db: Session, strategy: str) -> float:
+    """校验规划策略并返回对应的坡度权重α（shortest强制为0，gentlest取系统配置）"""
+    valid_strategies = ["shortest", "gentlest"]
+    if strategy not in valid_strategies:
+        raise HTTPException(status_code=400, detail=f"策略无效，仅支持{valid_strategies}")
+    if strategy == "shortest":
+        return 0.0
+    alpha = get_slope_weight_alpha(db)
+    ch_manager.gentlest_alpha = alpha
+    return alpha
+
+def resolve_poi_nodes(db: Session, snap_index, poi_ids: list) -> dict:
     """
-    对路径经纬度序列做20米等距采样，生成采样点序列
-    :param coord_path: 路径规划返回的coord_path（[{"node_id":x, "lng":x, "lat":x}, ...]）
-    :return: 20米等距采样点序列 [{"lng":x, "lat":x, "distance_m":x}, ...]，distance_m为距起点累计距离
+    POI → 最近路网节点（一次查询取全部POI坐标，快照空间索引就近匹配）
+    :return: {poi_id: {"node_id": 节点ID, "snap_distance_m": POI到节点距离}}
     """
-    try:
-        # 1. 提取路径经纬度，构建Shapely LineString（lng在前，lat在后）
-        line_coords = [(p["lng"], p["lat"]) for p in coord_path]
-        if len(line_coords) < 2:
-            return []
-        path_line = LineString(line_coords)
-        
-        # 2. 计算路径总长度（米），基于哈维正弦公式累加
-        total_length = 0.0
-        for i in range(len(line_coords)-1):
-            lng1, lat1 = line_coords[i]
-            lng2, lat2 = line_coords[i+1]
-            total_length += haversine_distance(lng1, lat1, lng2, lat2)
-        if total_length < 20:
-            # 路径短于20米，仅返回起点和终点
-            return [
-                {"lng": line_coords[0][0], "lat": line_coords[0][1], "distance_m": 0.0},
-                {"lng": line_coords[-1][0], "lat": line_coords[-1][1], "distance_m": round(total_length, 2)}
-            ]
-        
-        # 3. 20米等距采样，生成采样点
-        sampling_points = []
-        step = 20.0  # 采样步长（米）
-        current_distance = 0.0
-        
-        # 添加起点
-        sampling_points.append({
-            "lng": line_coords[0][0],
-            "lat": line_coords[0][1],
-            "distance_m": 0.0
-        })
-        
-        # 按步长采样
-        while current_distance + step < total_length:
-            current_distance += step
-            # Shapely substring按长度比例截取点（0-1为比例）
-            ratio = current_distance / total_length
-            sample_point = substring(path_line, ratio, ratio, normalized=True)
-            lng, lat = sample_point.x, sample_point.y
-            sampling_points.append({
-                "lng": round(lng, 6),
-                "lat": round(lat, 6),
-                "distance_m": round(current_distance, 2)
-            })
-        
-        # 添加终点
-        sampling_points.append({
-            "lng": line_coords[-1][0],
-            "lat": line_coords[-1][1],
-            "distance_m": round(total_length, 2)
-        })
-        
-        return sampling_points
-    except Exception as e:
-        print(f"路径20米采样失败：{str(e)}")
-        return []
+    unique_ids = list(dict.fromkeys(poi_ids))
+    rows = db.query(
+        models.Poi.id,
+        func.ST_X(models.Poi.geom),
+        func.ST_Y(models.Poi.geom)
+    ).filter(models.Poi.id.in_(unique_ids)).all()
+    found = {poi_id: (float(lng), float(lat)) for poi_id, lng, lat in rows}
+    missing = [poi_id for poi_id in unique_ids if poi_id not in found]
+    if missing:
+        raise HTTPException(status_code=404, detail=f"POI不存在，ID：{missing[:20]}")
+    ids = list(found)
+    nearest = snap_index.nearest_nodes([found[i][0] for i in ids], [found[i][1] for i in ids])
+    if nearest is None:
+        raise HTTPException(status_code=400, detail="路网节点缺少坐标，无法匹配POI")
+    node_ids, distances = nearest
+    return {
+        poi_id: {"node_id": int(node_id), "snap_distance_m": round(float(d), 2)}
+        for poi_id, node_id, d in zip(ids, node_ids, distances)
+    }
 
-def get_point_elevation(lng: float, lat: float, db: Session, distance_threshold: float = 5.0) -> float:
+def resolve_route_endpoint(snapshot, node_id: int, coord: list, max_snap_m: float, label: str) -> SnapPoint:
     """
-    空间插值获取单个采样点的高程（米），取最近N个高程点的平均值
-    :param lng/lat: 采样点经纬度
-    :param db: 数据库会话
-    :param distance_threshold: 空间匹配阈值（米），匹配范围内最近的点
-    :return: 插值高程（米），无匹配点返回0.0
+    路径规划起点/终点：节点ID直接使用，经纬度则用快照空间索引吸附到最近路网边
+    :param label: 错误提示中的名称（起点/终点）
+    :return: SnapPoint
     """
+    engine = snapshot.engine
+    if node_id is not None:
+        if not engine.has_node(node_id):
+            raise HTTPException(status_code=404, detail=f"{label}节点ID{node_id}不在路网中")
+        coord = engine.node_coord(node_id) or (None, None)
+        return SnapPoint(coord[0], coord[1], 0.0, node_id=node_id)
+    if coord is None:
+        raise HTTPException(status_code=400, detail=f"{label}需提供节点ID或经纬度")
     try:
-        # 构建PostGIS POINT对象（SRID=4326）
-        point_geom = ST_SetSRID(ST_MakePoint(lng, lat), 4326)
-        # 空间查询：匹配阈值范围内的所有高程点，按距离升序排列
-        elevation_records = db.query(models.ElevationPoint.elevation_m).filter(
-            ST_DWithin(models.ElevationPoint.geom, point_geom, distance_threshold)
-        ).order_by(
-            models.ElevationPoint.geom.distance(point_geom)
-        ).limit(3).all()  # 取最近3个点做插值
-        
-        if not elevation_records:
-            return 0.0
-        # 计算平均值（简单空间插值）
-        elevation_vals = [float(r[0]) for r in elevation_records]
-        avg_elevation = round(sum(elevation_vals) / len(elevation_vals), 2)
-        return avg_elevation
-    except Exception as e:
-        print(f"获取采样点高程失败：{str(e)}")
-        return 0.0
+        lng, lat = float(coord[0]), float(coord[1])
+    except (TypeError, ValueError, IndexError):
+        raise HTTPException(status_code=400, detail=f"{label}经纬度格式无效，应为[lng, lat]")
+    if not (-180 <= lng <= 180 and -90 <= lat <= 90):
+        raise HTTPException(status_code=400, detail=f"{label}经纬度超出范围")
+    snap = snapshot.snap_index.snap(lng, lat, max_snap_m)
+    if snap is None:
+        raise HTTPException(status_code=404, detail=f"{label}{max_snap_m}米范围内无路网边")
+    return snap
 
-def get_point_slope(lng: float, lat: float, db: Session, distance_threshold: float = 5.0) -> float:
+def search_snapped_route(snapshot, start: SnapPoint, end: SnapPoint, strategy: str, alpha: float):
     """
-    空间插值获取单个采样点的坡度（度），取最近N个坡度点的平均值
-    :param lng/lat: 采样点经纬度
-    :param db: 数据库会话
-    :param distance_threshold: 空间匹配阈值（米）
-    :return: 插值坡度（度），无匹配点返回0.0，坡度非负
+    吸附点之间的最小权重路线（吸附到节点时等价于search_route）
+    :return: (SnappedRoute, 搜索方式 "ch"/"astar")
     """
-    try:
-        # 构建PostGIS POINT对象（SRID=4326）
-        point_geom = ST_SetSRID(ST_MakePoint(lng, lat), 4326)
-        # 空间查询：匹配阈值范围内的所有坡度点，按距离升序排列
-        slope_records = db.query(models.SlopePoint.slope_deg).filter(
-            ST_DWithin(models.SlopePoint.geom, point_geom, distance_threshold)
-        ).order_by(
-            models.SlopePoint.geom.distance(point_geom)
-        ).limit(3).all()  # 取最近3个点做插值
-        
-        if not slope_records:
-            return 0.0
-        # 计算平均值，坡度非负
-        slope_vals = [max(float(r[0]), 0.0) for r in slope_records]
-        avg_slope = round(sum(slope_vals) / len(slope_vals), 2)
-        return avg_slope
-    except Exception as e:
-        print(f"获取采样点坡度失败：{str(e)}")
-        return 0.0
+    methods = []
+
+    def search(s, t):
+        route, method = search_route(snapshot, s, t, strategy, alpha)
+        methods.append(method)
+        return route
+
+    route = snapped_route(snapshot.engine, start, end, search, alpha)
+    return route, (methods[0] if methods else "direct")
 
-def path_interpolate_elevation_slope(sampling_points: list, db: Session) -> list:
+def plan_route_cached(db: Session, snapshot, start: SnapPoint, end: SnapPoint, strategy: str, alpha: float):
     """
-    对采样点序列批量插值高程和坡度，返回最终采样点结果
-    :param sampling_points: 20米等距采样点序列（path_20m_sampling返回结果）
-    :param db: 数据库会话
-    :return: 带高程/坡度的采样点序列
+    路径规划完整流水线（搜索 + 结果展开 + 20米采样高程/坡度插值），结果按（图版本, 起终点, 策略, α, 地形版本）缓存
+    :return: ({"route": SnappedRoute, "search_method", "summary", "sampling_result"}, 是否命中缓存)
     """
-    try:
-        result = []
-        for point in sampling_points:
-            lng = point["lng"]
-            lat = point["lat"]
-            # 插值高程和坡度
-            elevation = get_point_elevation(lng, lat, db)
-            slope = get_point_slope(lng, lat, db)
-            result.append({
-                "lng": lng,
-                "lat": lat,
-                "distance_m": point["distance_m"],  # 距起点累计距离（米）
-                "elevation_m": elevation,            # 高程（米）
-                "slope_deg": slope                   # 坡度（度）
-            })
-        return result
-    except Exception as e:
-        print(f"采样点高程坡度插值失败：{str(e)}")
-        return []
+    def compute():
+        route, search_method = search_snapped_route(snapshot, start, end, strategy, alpha)
+        summary = summarize_snapped_route(snapshot.engine, snapshot.snap_index, route, start, end, alpha)
+        sampling_result = path_interpolate_elevation_slope(path_20m_sampling(summary["coord_path"]), db)
+        return {"route": route, "search_method": search_method, "summary": summary, "sampling_result": sampling_result}
+
+    key = route_key(snapshot.version, start, end, strategy, alpha, terrain_version(db))
+    return route_cache.get_or_compute(key, compute)
 
 # -------------------------- GPX导出核心工具函数 --------------------------
 def create_gpx_from_path(sampling_result: list, strategy: str, statistics: dict) -> gpxpy.gpx.GPX:
@@ -903,18 +926,62 @@ def gpx_to_file_stream(gpx: gpxpy.gpx.GPX, strategy: str) -> StreamingResponse:
     return response
 
 # -------------------------- 路径规划核心接口 --------------------------
+@app.get("/path-planning/graph-status", summary="查询路网图缓存状态（版本号、构建时间、节点/边数量）")
+def get_graph_status():
+    return {"code": 200, "message": "查询成功", "data": graph_service.status}
+
+@app.get("/network/health", summary="路网健康检查：连通分量列表（节点数、边数、总长度、范围），定位孤立路段碎片")
+def get_network_health(limit: int = 50, db: Session = Depends(get_db)):
+    """
+    基于当前路网图快照预计算的连通分量（弱连通：忽略方向；强连通：考虑单向边）
+    :param limit: 最多列出的弱连通分量数（按节点数降序，第0个为主路网）
+    """
+    try:
+        if limit < 1:
+            raise HTTPException(status_code=400, detail="limit必须大于0")
+        snapshot = graph_service.get_snapshot(db)
+        health = snapshot.engine.components.summary(snapshot.engine, limit)
+        # 未连接任何路网边的路网点（不在路径规划图中）
+        health["isolated_node_count"] = max(db.query(models.NetworkNode).count() - snapshot.engine.node_count, 0)
+        health["graph_version"] = snapshot.version
+        return {"code": 200, "message": "查询成功", "data": health}
+    except HTTPException as e:
+        raise e
+    except Exception as e:
+        print(f"❌ 路网健康检查异常：{str(e)}")
+        raise HTTPException(status_code=500, detail=f"路网健康检查失败，异常信息：{str(e)[:200]}")
+
+@app.get("/path-planning/ch-status", summary="查询CH预处理状态（已就绪/排队中的图版本与α）")
+def get_ch_status():
+    return {"code": 200, "message": "查询成功", "data": ch_manager.status}
+
+@app.get("/path-planning/cache-status", summary="查询路线缓存状态（缓存项数、命中/未命中/合并等待次数）")
+def get_route_cache_status():
+    return {"code": 200, "message": "查询成功", "data": route_cache.status}
+
 @app.post("/path-planning", summary="路径规划：最短距离/坡度最平缓双策略")
 def path_planning(
-    start_node_id: int = Body(..., description="起点路网点ID"),
-    end_node_id: int = Body(..., description="终点路网点ID"),
+    start_node_id: int = Body(None, description="起点路网点ID（与start_coord二选一）"),
+    end_node_id: int = Body(None, description="终点路网点ID（与end_coord二选一）"),
     strategy: str = Body(..., description="规划策略：shortest=最短距离，gentlest=坡度最平缓"),
+    start_coord: list = Body(None, description="起点经纬度[lng, lat]，自动吸附到最近路网边"),
+    end_coord: list = Body(None, description="终点经纬度[lng, lat]，自动吸附到最近路网边"),
+    max_snap_m: float = Body(DEFAULT_MAX_SNAP_M, description="经纬度吸附的最大距离（米）"),
+    alternatives: int = Body(0, description="额外返回的备选路线数（0~4，0表示不计算）"),
+    max_share: float = Body(DEFAULT_MAX_SHARE, description="备选路线与已选路线的最大重合长度比例（0~1）"),
+    max_stretch: float = Body(DEFAULT_MAX_STRETCH, description="备选路线相对最优路线的最大代价伸长比（0~1）"),
+    profile_max_points: int = Body(None, description="高程剖面最多点数（≥2，不传则按20米等距采样）"),
+    profile_resolution_m: float = Body(None, description="高程剖面目标分辨率（米，不传则按20米等距采样）"),
     db: Session = Depends(get_db)
 ):
     """
-    基于NetworkX+Dijkstra算法的路径规划，权重公式：length_m × (1 + α × slope_avg)
+    基于CSR数组+A*算法的路径规划，权重公式：length_m × (1 + α × slope_avg)
     :param start_node_id: 起点节点ID（从/network/nodes接口获取）
     :param end_node_id: 终点节点ID（从/network/nodes接口获取）
     :param strategy: 规划策略，仅支持shortest/gentlest
+    :param start_coord/end_coord: 起终点经纬度，吸附点把所在边拆分为虚拟边后参与规划
+    :param alternatives: 备选路线数，基于一次正向+一次反向最短路径树生成（via-node法）
+    :param profile_max_points/profile_resolution_m: 自适应剖面，按长度放宽采样间隔并选用满足分辨率的最粗地形金字塔级别
     :return: 路径节点、经纬度、总长度、平均坡度等信息
     """
     try:
@@ -922,16 +989,22 @@ def path_planning(
         valid_strategies = ["shortest", "gentlest"]
         if strategy not in valid_strategies:
             raise HTTPException(status_code=400, detail=f"策略无效，仅支持{valid_strategies}")
+        if not (0 <= alternatives <= 4):
+            raise HTTPException(status_code=400, detail="alternatives必须为0~4之间的整数")
+        if not (0 <= max_share <= 1) or not (0 < max_stretch <= 1):
+            raise HTTPException(status_code=400, detail="max_share必须为0~1、max_stretch必须为0~1（不含0）之间的数字")
+        if (profile_max_points is not None and profile_max_points < 2) or \
+                (profile_resolution_m is not None and profile_resolution_m <= 0):
+            raise HTTPException(status_code=400, detail="profile_max_points必须≥2、profile_resolution_m必须大于0")
         
-        # 2. 构建NetworkX内存图
-        G = build_networkx_graph(db)
+        # 2. 获取路网图缓存快照（无需每次重建），路径搜索使用快照内的CSR引擎
+        snapshot = graph_service.get_snapshot(db)
+        engine = snapshot.engine
         
-        # 3. 校验起点/终点是否在图中
-        if start_node_id not in G.nodes:
-            raise HTTPException(status_code=404, detail=f"起点节点ID{start_node_id}不在路网中")
-        if end_node_id not in G.nodes:
-            raise HTTPException(status_code=404, detail=f"终点节点ID{end_node_id}不在路网中")
-        if start_node_id == end_node_id:
+        # 3. 起点/终点：节点ID校验，或经纬度吸附到最近路网边
+        start = resolve_route_endpoint(snapshot, start_node_id, start_coord, max_snap_m, "起点")
+        end = resolve_route_endpoint(snapshot, end_node_id, end_coord, max_snap_m, "终点")
+        if start.node_id is not None and start.node_id == end.node_id:
             raise HTTPException(status_code=400, detail="起点和终点节点ID不能相同")
         
         # 4. 获取坡度权重α，根据策略调整
@@ -940,60 +1013,37 @@ def path_planning(
             alpha = 0.0  # 最短距离策略：强制α=0，忽略坡度
         print(f"📌 路径规划参数：策略={strategy}，坡度权重α={alpha}")
         
-        # 5. 定义边权重计算函数（适配NetworkX的Dijkstra算法）
-        def edge_weight(u, v, d):
-            """
-            u: 起点节点ID，v: 终点节点ID，d: 边属性字典
-            返回：单条边的最终权重
-            """
-            return d["length_m"] * (1 + alpha * d["slope_avg"])
+        # 5~8. 搜索最小权重路径（CH已就绪时双向CH查询，否则A*；不可达时抛出NoPathError）、展开路径边详情与坐标、
+        #      20米等距采样 + 采样点高程/坡度插值；相同请求直接读取路线缓存
+        planned, cache_hit = plan_route_cached(db, snapshot, start, end, strategy, alpha)
+        route, search_method = planned["route"], planned["search_method"]
+        summary = planned["summary"]
+        node_path = summary["node_path"]
+        path_edges = summary["path_edges"]
+        coord_path = summary["coord_path"]
         
-        # 6. 执行Dijkstra算法，计算最短路径（基于自定义权重）
-        # 若路径不存在，nx会抛出NetworkXNoPath异常
-        node_path = nx.dijkstra_path(G, source=start_node_id, target=end_node_id, weight=edge_weight)
-        edge_path = nx.utils.pairwise(node_path)  # 路径边对：(n1,n2), (n2,n3), ...
-        
-        # 7. 统计路径整体信息（总长度、总坡度、平均坡度等）
-        total_length = 0.0  # 总长度（米）
-        total_slope = 0.0   # 总坡度和
-        edge_count = 0      # 路径边数
-        path_edges = []     # 路径边详情
-        for u, v in edge_path:
-            d = G[u][v]
-            total_length += d["length_m"]
-            total_slope += d["slope_avg"]
-            edge_count += 1
-            path_edges.append({
-                "edge_id": d["edge_id"],
-                "source": u,
-                "target": v,
-                "length_m": round(d["length_m"], 2),
-                "slope_avg": d["slope_avg"],
-                "type": d["type"],
-                "weight": round(edge_weight(u, v, d), 2)
-            })
-        # 计算平均坡度（避免除0）
-        avg_slope = round(total_slope / edge_count, 2) if edge_count > 0 else 0.0
-        total_length = round(total_length, 2)
-        
-        # 8. 路径节点ID转经纬度坐标（前端地图渲染核心）
-        coord_path = []
-        for node_id in node_path:
-            node = db.query(models.NetworkNode).filter(models.NetworkNode.id == node_id).first()
-            if node:
-                # 解析节点空间坐标为经纬度
-                geom_wkt = db.execute(func.ST_AsText(node.geom)).scalar()
-                lng, lat = _parse_wkt_to_lnglat(geom_wkt)  # 复用原有工具函数
-                coord_path.append({
-                    "node_id": node_id,
-                    "lng": lng,
-                    "lat": lat
+        # 步骤8.0：备选路线（仅替换图内路径部分，吸附点所在的部分边与主路线相同）
+        alternative_list = []
+        if alternatives > 0 and route.route is not None:
+            inner = route.route
+            alts, _ = alternative_routes(engine, inner.node_path[0], inner.node_path[-1], alpha, inner,
+                                         alternatives, max_share, max_stretch)
+            for alt, share, _ in alts:
+                alt_route = SnappedRoute(route.cost - inner.cost + alt.cost, route=alt, head=route.head, tail=route.tail)
+                alt_summary = summarize_snapped_route(snapshot.engine, snapshot.snap_index, alt_route, start, end, alpha)
+                alternative_list.append({
+                    "node_path": alt_summary["node_path"],
+                    "coord_path": alt_summary["coord_path"],
+                    "path_edges": alt_summary["path_edges"],
+                    "statistics": alt_summary["statistics"],
+                    "shared_ratio": round(share, 4),  # 与主路线及之前备选路线的重合长度比例
+                    "stretch": round(alt_route.cost / route.cost - 1, 4) if route.cost > 0 else 0.0  # 相对主路线的代价伸长比
                 })
-        
-        # 步骤8.1：20米等距采样
-        sampling_points = path_20m_sampling(coord_path)
-        # 步骤8.2：采样点高程、坡度空间插值
-        path_sampling_result = path_interpolate_elevation_slope(sampling_points, db)
+
+        path_sampling_result = planned["sampling_result"]
+        profile_info = None
+        if profile_max_points is not None or profile_resolution_m is not None:
+            path_sampling_result, profile_info = adaptive_profile(coord_path, db, profile_max_points, profile_resolution_m)
         # ==========================================================================
         
 
@@ -1004,57 +1054,560 @@ def path_planning(
             "data": {
                 "strategy": strategy,
                 "slope_weight_alpha": alpha,
+                "graph_version": snapshot.version,  # 本次规划使用的路网图版本号
+                "start_snap": start.to_dict(),  # 起点吸附结果（节点ID输入时即该节点）
+                "end_snap": end.to_dict(),  # 终点吸附结果
                 "node_path": node_path,  # 路径节点ID序列 [n1, n2, n3, ...]
-                "coord_path": coord_path,  # 路径经纬度序列 [{"node_id":n1, "lng":x, "lat":y}, ...]
-                "path_edges": path_edges,  # 路径边详情
+                "coord_path": coord_path,  # 路径经纬度序列 [{"node_id":n1, "lng":x, "lat":y}, ...]，吸附点node_id为None
+                "path_edges": path_edges,  # 路径边详情（吸附点所在边为部分边，portion为通行比例）
                 "statistics": {  # 路径统计信息
-                    "total_length_m": total_length,
-                    "avg_slope_deg": avg_slope,
-                    "node_count": len(node_path),
-                    "edge_count": edge_count,
+                    **summary["statistics"],
+                    "settled_nodes": route.settled,  # 本次搜索确定（出堆）的节点数
+                    "search_method": search_method,  # 搜索方式：ch=收缩层次，astar=A*
+                    "cache_hit": cache_hit,  # 是否命中路线缓存（命中时settled_nodes为首次计算的值）
                     "sampling_count": len(path_sampling_result),  # 新增：采样点数量
+                    "profile": profile_info,  # 自适应剖面：采样间隔、地形金字塔级别及其像元边长（未启用时为None）
                     "tip": f"α={alpha}：值越大，坡度对路径选择的影响越大"
                 },
-                "sampling_result": path_sampling_result  # 核心新增：20米采样点（含高程/坡度）
+                "sampling_result": path_sampling_result,  # 核心新增：20米采样点（含高程/坡度）
+                "alternatives": alternative_list  # 备选路线（结构同主路线，不含采样结果）
             }
         }
 
-    except nx.NetworkXNoPath:
-        raise HTTPException(status_code=404, detail=f"起点{start_node_id}到终点{end_node_id}无可达路径")
+    except NoPathError:
+        raise HTTPException(status_code=404, detail="起点到终点无可达路径")
     except HTTPException as e:
         raise e
     except Exception as e:
         print(f"❌ 路径规划失败：{str(e)}")
         raise HTTPException(status_code=500, detail=f"路径规划异常：{str(e)[:200]}")
 
+# -------------------------- 批量路径规划接口 --------------------------
+# 批量规划执行器（全局单例）：进程池随路网图版本/CH就绪情况复用或重建
+batch_planner = BatchPlanner()
+
+@app.post("/path-planning/batch", summary="批量路径规划：多进程并行，按完成顺序流式返回（NDJSON）")
+def path_planning_batch(
+    jobs: list = Body(..., description="任务列表：[{start_node_id|start_coord, end_node_id|end_coord, strategy}, ...]"),
+    include_sampling: bool = Body(True, description="是否对每条路线做20米采样高程/坡度插值"),
+    max_snap_m: float = Body(DEFAULT_MAX_SNAP_M, description="经纬度吸附的最大距离（米）"),
+    db: Session = Depends(get_db)
+):
+    """
+    所有任务共享同一个路网图快照，搜索与采样在工作进程中并行执行
+    响应为NDJSON：每完成一个任务输出一行 {"index", "status", "elapsed_ms", "data"/"error"}，
+    最后一行为汇总 {"summary": {...}}；单个任务失败不影响其他任务
+    """
+    try:
+        if not jobs:
+            raise HTTPException(status_code=400, detail="jobs不能为空")
+        if len(jobs) > MAX_BATCH_JOBS:
+            raise HTTPException(status_code=400, detail=f"单次最多{MAX_BATCH_JOBS}个任务")
+        started = time.perf_counter()
+        snapshot = graph_service.get_snapshot(db)
+        # 1. 策略对应的α只解析一次，已就绪的CH随进程池下发
+        alphas = {}
+        for strategy in {job.get("strategy", "shortest") for job in jobs if isinstance(job, dict)}:
+            if strategy in ("shortest", "gentlest"):
+                alphas[strategy] = resolve_strategy_alpha(db, strategy)
+        chs = {}
+        for alpha in set(alphas.values()):
+            ch = ch_manager.get(snapshot, alpha)
+            if ch is not None:
+                chs[alpha] = ch
+        # 2. 参数校验与坐标吸附在主进程完成（微秒级），失败的任务直接记为错误
+        tasks, failed = [], []
+        for index, job in enumerate(jobs):
+            try:
+                if not isinstance(job, dict):
+                    raise HTTPException(status_code=400, detail="任务格式无效，应为对象")
+                strategy = job.get("strategy", "shortest")
+                if strategy not in alphas:
+                    raise HTTPException(status_code=400, detail="策略无效，仅支持['shortest', 'gentlest']")
+                start = resolve_route_endpoint(snapshot, job.get("start_node_id"), job.get("start_coord"), max_snap_m, "起点")
+                end = resolve_route_endpoint(snapshot, job.get("end_node_id"), job.get("end_coord"), max_snap_m, "终点")
+                if start.node_id is not None and start.node_id == end.node_id:
+                    raise HTTPException(status_code=400, detail="起点和终点节点ID不能相同")
+                tasks.append({"index": index, "start": start, "end": end, "strategy": strategy,
+                              "alpha": alphas[strategy], "sampling": include_sampling})
+            except HTTPException as e:
+                failed.append({"index": index, "status": "error", "error": e.detail, "elapsed_ms": 0.0})
+
+        def stream():
+            succeeded = 0
+            for item in failed:
+                yield json.dumps(item, ensure_ascii=False) + "\n"
+            for item in batch_planner.run(snapshot, chs, tasks) if tasks else ():
+                succeeded += item["status"] == "ok"
+                yield json.dumps(item, ensure_ascii=False) + "\n"
+            yield json.dumps({"summary": {
+                "graph_version": snapshot.version,
+                "total": len(jobs),
+                "succeeded": succeeded,
+                "failed": len(jobs) - succeeded,
+                "workers": batch_planner.max_workers,
+                "elapsed_ms": round((time.perf_counter() - started) * 1000, 2)
+            }}, ensure_ascii=False) + "\n"
+
+        return StreamingResponse(stream(), media_type="application/x-ndjson")
+    except HTTPException as e:
+        raise e
+    except Exception as e:
+        print(f"❌ 批量路径规划失败：{str(e)}")
+        raise HTTPException(status_code=500, detail=f"批量路径规划异常：{str(e)[:200]}")
+
+# -------------------------- 前端路径规划接口（经纬度起终点） --------------------------
+# 前端策略 → 后端规划策略（徒步用时主要由距离决定，leastTime按最短距离规划，用时按Naismith规则估算）
+FRONTEND_STRATEGY_MAP = {"leastDistance": "shortest", "leastTime": "shortest", "leastSlope": "gentlest"}
+
+@app.post("/api/route/plan", summary="前端路径规划：经纬度起终点吸附到路网后规划，返回RouteInfo结构")
+def api_route_plan(
+    start: list = Body(..., description="起点经纬度[lng, lat]"),
+    end: list = Body(..., description="终点经纬度[lng, lat]"),
+    strategy: str = Body("leastTime", description="前端策略：leastTime/leastDistance/leastSlope"),
+    maxProfilePoints: int = Body(None, description="高程剖面最多点数（≥2，通常取图表宽度像素数；不传则按20米采样）"),
+    db: Session = Depends(get_db)
+):
+    """RoutePlanning.vue使用的路径规划接口，响应结构与前端RouteInfo类型一致"""
+    try:
+        if strategy not in FRONTEND_STRATEGY_MAP:
+            raise HTTPException(status_code=400, detail=f"策略无效，仅支持{list(FRONTEND_STRATEGY_MAP)}")
+        if maxProfilePoints is not None and maxProfilePoints < 2:
+            raise HTTPException(status_code=400, detail="maxProfilePoints必须≥2")
+        plan_strategy = FRONTEND_STRATEGY_MAP[strategy]
+        alpha = resolve_strategy_alpha(db, plan_strategy)
+        snapshot = graph_service.get_snapshot(db)
+        start_point = resolve_route_endpoint(snapshot, None, start, DEFAULT_MAX_SNAP_M, "起点")
+        end_point = resolve_route_endpoint(snapshot, None, end, DEFAULT_MAX_SNAP_M, "终点")
+        planned, _ = plan_route_cached(db, snapshot, start_point, end_point, plan_strategy, alpha)
+        sampling_result = planned["sampling_result"]
+        statistics = planned["summary"]["statistics"]
+        # 高程剖面：按图表点数自适应采样（路线点位仍为20米采样）
+        profile = sampling_result
+        if maxProfilePoints is not None:
+            profile, _ = adaptive_profile(planned["summary"]["coord_path"], db, max_points=maxProfilePoints)
+        # Naismith规则：平路5km/h，每爬升600米另加1小时
+        total_seconds = statistics["total_length_m"] / (5000 / 3600) + statistics["total_ascent_m"] / (600 / 3600)
+        return {
+            "id": f"{snapshot.version}-{start_point.lng:.6f},{start_point.lat:.6f}-{end_point.lng:.6f},{end_point.lat:.6f}",
+            "name": f"路线-{strategy}",
+            "desc": f"{strategy}策略路线（{'坡度最平缓' if plan_strategy == 'gentlest' else '最短距离'}）",
+            "points": [{
+                "lnglat": [p["lng"], p["lat"]],
+                "slope": p["slope_deg"],
+                "elevation": p["elevation_m"],
+                "distance": p["distance_m"]
+            } for p in sampling_result],
+            "totalDistance": statistics["total_length_m"],
+            "totalDuration": int(total_seconds),
+            "elevationProfile": [{"x": p["distance_m"], "y": p["elevation_m"]} for p in profile]
+        }
+    except NoPathError:
+        raise HTTPException(status_code=404, detail="起点到终点无可达路径")
+    except HTTPException as e:
+        raise e
+    except Exception as e:
+        print(f"❌ 前端路径规划失败：{str(e)}")
+        raise HTTPException(status_code=500, detail=f"路径规划异常：{str(e)[:200]}")
+
+# -------------------------- 多目标（帕累托）路线接口 --------------------------
+@app.post("/path-planning/pareto", summary="帕累托路线：一次搜索返回距离/坡度努力值的全部非支配路线")
+def path_planning_pareto(
+    start_node_id: int = Body(..., description="起点路网点ID"),
+    end_node_id: int = Body(..., description="终点路网点ID"),
+    max_routes: int = Body(5, description="最多返回的路线数（沿帕累托前沿均匀抽取）"),
+    max_labels: int = Body(DEFAULT_MAX_LABELS, description="搜索标签数上限（控制延迟）"),
+    epsilon: float = Body(0.01, description="ε支配容差（0~0.5），越大路线越少越分散"),
+    db: Session = Depends(get_db)
+):
+    """
+    双目标搜索：目标1=总长度，目标2=坡度努力值Σ(length_m × slope_avg)
+    任意α的gentlest权重均为 目标1 + α × 目标2，返回结果附带每条路线成为最优解的α区间，
+    前端可直接展示“距离换平缓度”的取舍，无需反复修改slope_weight_alpha
+    """
+    try:
+        if not (1 <= max_routes <= 20):
+            raise HTTPException(status_code=400, detail="max_routes必须为1~20之间的整数")
+        if not (100 <= max_labels <= 500000):
+            raise HTTPException(status_code=400, detail="max_labels必须为100~500000之间的整数")
+        if not (0 <= epsilon <= 0.5):
+            raise HTTPException(status_code=400, detail="epsilon必须为0~0.5之间的数字")
+        snapshot = graph_service.get_snapshot(db)
+        engine = snapshot.engine
+        if not engine.has_node(start_node_id):
+            raise HTTPException(status_code=404, detail=f"起点节点ID{start_node_id}不在路网中")
+        if not engine.has_node(end_node_id):
+            raise HTTPException(status_code=404, detail=f"终点节点ID{end_node_id}不在路网中")
+        if start_node_id == end_node_id:
+            raise HTTPException(status_code=400, detail="起点和终点节点ID不能相同")
+        alpha = get_slope_weight_alpha(db)
+
+        # 1. 单次双目标搜索，得到非支配路线集合（按距离升序）
+        routes, truncated, settled = pareto_routes(engine, start_node_id, end_node_id, max_labels, epsilon)
+        costs = [(c1, c2) for _, c1, c2 in routes]
+        # 2. 计算每条路线成为最优解的α区间，再沿前沿均匀抽取
+        indexed = select_spread(list(range(len(routes))), max_routes)
+        result = []
+        for i in indexed:
+            route, c1, c2 = routes[i]
+            summary = summarize_route(engine, route, alpha)
+            alpha_range = optimal_alpha_range(costs, i)
+            result.append({
+                "total_length_m": round(c1, 2),
+                "effort": round(c2, 2),  # 坡度努力值（米·度）
+                "optimal_alpha_range": list(alpha_range) if alpha_range else None,  # None：非支撑解，任何α下都不是唯一最优
+                "node_path": route.node_path,
+                "coord_path": summary["coord_path"],
+                "path_edges": summary["path_edges"],
+                "statistics": summary["statistics"]
+            })
+        return {
+            "code": 200,
+            "message": f"帕累托路线搜索成功，共{len(routes)}条非支配路线，返回{len(result)}条",
+            "data": {
+                "graph_version": snapshot.version,
+                "slope_weight_alpha": alpha,  # path_edges中weight字段使用的α
+                "pareto_count": len(routes),
+                "settled_labels": settled,
+                "truncated": truncated,  # True：达到标签上限提前结束，前沿可能不完整
+                "routes": result
+            }
+        }
+    except NoPathError:
+        raise HTTPException(status_code=404, detail=f"起点{start_node_id}到终点{end_node_id}无可达路径")
+    except HTTPException as e:
+        raise e
+    except Exception as e:
+        print(f"❌ 帕累托路线搜索失败：{str(e)}")
+        raise HTTPException(status_code=500, detail=f"帕累托路线搜索异常：{str(e)[:200]}")
+
+# -------------------------- 多对多距离矩阵接口 --------------------------
+# 矩阵单边最多点数（起点数、终点数分别限制）
+MAX_MATRIX_SIZE = 500
+
+@app.post("/path-planning/matrix", summary="多对多距离矩阵：N个起点×M个终点的长度/坡度努力值矩阵")
+def path_planning_matrix(
+    sources: list[int] = Body(..., description="起点ID列表（路网点ID或POI ID，由id_type决定）"),
+    targets: list[int] = Body(..., description="终点ID列表"),
+    id_type: str = Body("node", description="ID类型：node=路网点，poi=POI（自动匹配最近路网点）"),
+    strategy: str = Body("shortest", description="规划策略：shortest=最短距离，gentlest=坡度最平缓"),
+    cutoff: float = Body(None, description="权重上限（shortest时即米），超出的单元格返回null，远距离点对可快速跳过"),
+    db: Session = Depends(get_db)
+):
+    """
+    每个单元格为按策略权重最优的路线，返回该路线的 权重/长度/坡度努力值Σ(length_m × slope_avg)
+    CH已就绪时使用桶算法共享各行搜索工作（200×200在秒级内完成），否则每个起点一次单源Dijkstra
+    """
+    try:
+        start = time.perf_counter()
+        if not sources or not targets:
+            raise HTTPException(status_code=400, detail="起点和终点列表不能为空")
+        if len(sources) > MAX_MATRIX_SIZE or len(targets) > MAX_MATRIX_SIZE:
+            raise HTTPException(status_code=400, detail=f"起点/终点数量均不能超过{MAX_MATRIX_SIZE}")
+        if id_type not in ("node", "poi"):
+            raise HTTPException(status_code=400, detail="id_type仅支持node/poi")
+        if cutoff is not None and cutoff <= 0:
+            raise HTTPException(status_code=400, detail="cutoff必须大于0")
+        alpha = resolve_strategy_alpha(db, strategy)
+        snapshot = graph_service.get_snapshot(db)
+        engine = snapshot.engine
+
+        # 1. ID统一转换为路网节点ID
+        snapped = None
+        if id_type == "poi":
+            snapped = resolve_poi_nodes(db, snapshot.snap_index, sources + targets)
+            source_nodes = [snapped[poi_id]["node_id"] for poi_id in sources]
+            target_nodes = [snapped[poi_id]["node_id"] for poi_id in targets]
+        else:
+            source_nodes, target_nodes = sources, targets
+        missing = [node_id for node_id in set(source_nodes + target_nodes) if not engine.has_node(node_id)]
+        if missing:
+            raise HTTPException(status_code=404, detail=f"节点不在路网中：{sorted(missing)[:20]}")
+
+        # 2. 计算矩阵（CH就绪时桶算法，否则单源Dijkstra）
+        ch = ch_manager.get(snapshot, alpha)
+        result = cost_matrix(engine, ch, source_nodes, target_nodes, alpha, cutoff)
+        return {
+            "code": 200,
+            "message": "距离矩阵计算成功",
+            "data": {
+                "strategy": strategy,
+                "slope_weight_alpha": alpha,
+                "graph_version": snapshot.version,
+                "id_type": id_type,
+                "sources": sources,
+                "targets": targets,
+                "source_nodes": source_nodes,
+                "target_nodes": target_nodes,
+                "snapped_pois": {str(k): v for k, v in snapped.items()} if snapped else None,
+                "cost": matrix_to_json(result["cost"]),      # 策略权重 length_m × (1 + α × slope_avg) 之和
+                "length_m": matrix_to_json(result["length"]),  # 路线总长度（米）
+                "effort": matrix_to_json(result["effort"]),    # 坡度努力值（米·度）
+                "method": result["method"],
+                "settled_nodes": result["settled"],
+                "elapsed_ms": round((time.perf_counter() - start) * 1000, 2)
+            }
+        }
+    except HTTPException as e:
+        raise e
+    except Exception as e:
+        print(f"❌ 距离矩阵计算失败：{str(e)}")
+        raise HTTPException(status_code=500, detail=f"距离矩阵计算异常：{str(e)[:200]}")
+
+# -------------------------- 游览顺序优化接口 --------------------------
+# 单次优化最多POI数
+MAX_TOUR_POIS = 60
+# 游览优化使用的距离方阵缓存（同一组POI反复调整参数时直接复用）
+tour_matrix_cache = MatrixCache()
+
+@app.post("/tour-routes/optimize", summary="游览顺序优化：在真实路网上求POI最短/最平缓访问顺序")
+def optimize_tour_route(
+    poi_ids: list[int] = Body(None, description="待游览POI ID列表（与tour_route_id二选一）"),
+    tour_route_id: int = Body(None, description="特色路线ID（使用其poi_sequence作为待游览POI）"),
+    start_poi_id: int = Body(None, description="固定起点POI ID（可选）"),
+    end_poi_id: int = Body(None, description="固定终点POI ID（可选，round_trip时忽略）"),
+    round_trip: bool = Body(False, description="是否回到起点"),
+    strategy: str = Body("shortest", description="规划策略：shortest=最短距离，gentlest=坡度最平缓"),
+    time_budget_ms: int = Body(1000, description="优化时间预算（毫秒，50~10000）"),
+    db: Session = Depends(get_db)
+):
+    """
+    启发式TSP：最近邻构造 + 2-opt/Or-opt局部改进 + 时间预算内迭代扰动
+    代价矩阵为POI对应路网节点间按策略权重最优路线的代价（非对称，适配单向POI连接线）
+    """
+    try:
+        start = time.perf_counter()
+        # 1. 参数校验，确定待游览POI
+        if tour_route_id is not None:
+            tour_route = db.query(models.TourRoute).filter(models.TourRoute.id == tour_route_id).first()
+            if not tour_route:
+                raise HTTPException(status_code=404, detail=f"特色路线不存在，ID：{tour_route_id}")
+            poi_ids = [int(poi_id) for poi_id in tour_route.poi_sequence]
+        if not poi_ids:
+            raise HTTPException(status_code=400, detail="poi_ids与tour_route_id至少提供一个")
+        poi_ids = list(dict.fromkeys(poi_ids + [p for p in (start_poi_id, end_poi_id) if p is not None]))
+        # 起终点为同一POI：按往返处理（回到起点），否则固定终点会被忽略
+        if start_poi_id is not None and start_poi_id == end_poi_id:
+            round_trip = True
+        if len(poi_ids) < 2 or len(poi_ids) > MAX_TOUR_POIS:
+            raise HTTPException(status_code=400, detail=f"POI数量必须为2~{MAX_TOUR_POIS}个")
+        if not (50 <= time_budget_ms <= 10000):
+            raise HTTPException(status_code=400, detail="time_budget_ms必须为50~10000之间的整数")
+        alpha = resolve_strategy_alpha(db, strategy)
+        snapshot = graph_service.get_snapshot(db)
+        engine = snapshot.engine
+
+        # 2. POI匹配路网节点，取（缓存的）节点间代价方阵
+        snapped = resolve_poi_nodes(db, snapshot.snap_index, poi_ids)
+        node_ids = sorted({snapped[poi_id]["node_id"] for poi_id in poi_ids})
+        ch = ch_manager.get(snapshot, alpha)
+        matrix = tour_matrix_cache.get_or_compute(snapshot.version, engine, ch, node_ids, alpha)
+        position = {node_id: i for i, node_id in enumerate(node_ids)}
+        idx = [position[snapped[poi_id]["node_id"]] for poi_id in poi_ids]
+        poi_cost = matrix["cost"][np.ix_(idx, idx)]
+
+        # 3. 求解访问顺序
+        tour = optimize_tour(
+            poi_cost,
+            start=poi_ids.index(start_poi_id) if start_poi_id is not None else None,
+            end=poi_ids.index(end_poi_id) if end_poi_id is not None else None,
+            round_trip=round_trip,
+            time_budget_s=time_budget_ms / 1000
+        )
+        ordered = [poi_ids[i] for i in tour.order]
+        stops = ordered + [ordered[0]] if round_trip else ordered
+
+        # 4. 逐段展开真实路线（CH就绪时每段亚毫秒级）
+        legs = []
+        total_length = total_effort = 0.0
+        reachable = True
+        for from_poi, to_poi in zip(stops, stops[1:]):
+            u, v = snapped[from_poi]["node_id"], snapped[to_poi]["node_id"]
+            i, j = position[u], position[v]
+            leg = {"from_poi_id": from_poi, "to_poi_id": to_poi, "reachable": True}
+            if not is_reachable(matrix["cost"][i, j]):
+                leg["reachable"] = reachable = False
+            elif u == v:
+                leg.update({"length_m": 0.0, "effort": 0.0, "node_path": [u], "coord_path": []})
+            else:
+                route, _ = search_route(snapshot, u, v, strategy, alpha)
+                summary = summarize_route(engine, route, alpha)
+                leg.update({
+                    "length_m": round(float(matrix["length"][i, j]), 2),
+                    "effort": round(float(matrix["effort"][i, j]), 2),
+                    "node_path": route.node_path,
+                    "coord_path": summary["coord_path"]
+                })
+                total_length += float(matrix["length"][i, j])
+                total_effort += float(matrix["effort"][i, j])
+            legs.append(leg)
+        return {
+            "code": 200,
+            "message": "游览顺序优化成功" if reachable else "游览顺序优化完成，但部分POI之间无可达路径",
+            "data": {
+                "strategy": strategy,
+                "slope_weight_alpha": alpha,
+                "graph_version": snapshot.version,
+                "poi_sequence": ordered,  # 优化后的访问顺序，可直接写入TourRoute.poi_sequence
+                "round_trip": round_trip,
+                "reachable": reachable,
+                "total_length_m": round(total_length, 2),
+                "total_effort": round(total_effort, 2),
+                "initial_cost": round(tour.initial_cost, 2) if reachable else None,  # 最近邻初始解代价
+                "optimized_cost": round(tour.cost, 2) if reachable else None,
+                "iterations": tour.iterations,
+                "time_budget_exhausted": tour.timed_out,
+                "snapped_pois": {str(k): v for k, v in snapped.items()},
+                "legs": legs,
+                "elapsed_ms": round((time.perf_counter() - start) * 1000, 2)
+            }
+        }
+    except HTTPException as e:
+        raise e
+    except Exception as e:
+        print(f"❌ 游览顺序优化失败：{str(e)}")
+        raise HTTPException(status_code=500, detail=f"游览顺序优化异常：{str(e)[:200]}")
+
+# -------------------------- 可达范围（等时圈）接口 --------------------------
+@app.post("/path-planning/isochrone", summary="可达范围：从起点出发在距离/用时预算内可到达的路网点与POI")
+def path_planning_isochrone(
+    start_node_id: int = Body(None, description="起点路网点ID（与start_poi_id二选一）"),
+    start_poi_id: int = Body(None, description="起点POI ID（自动匹配最近路网点）"),
+    strategy: str = Body("shortest", description="规划策略：shortest=最短距离，gentlest=坡度最平缓（budget_type=distance时生效）"),
+    budget_type: str = Body("distance", description="预算类型：distance=策略权重（shortest即米），time=Naismith徒步用时（分钟）"),
+    budget: float = Body(..., description="预算值（米或分钟）"),
+    include_nodes: bool = Body(True, description="是否返回全部可达路网点"),
+    include_polygon: bool = Body(True, description="是否返回可达范围凹包多边形（GeoJSON）"),
+    hull_ratio: float = Body(0.3, description="凹包收紧程度（0~1，越小越贴合）"),
+    db: Session = Depends(get_db)
+):
+    """一次受限单源Dijkstra得到全部可达节点，替代逐个候选点调用/path-planning"""
+    try:
+        start = time.perf_counter()
+        if budget_type not in ("distance", "time"):
+            raise HTTPException(status_code=400, detail="budget_type仅支持distance/time")
+        max_budget = 100000 if budget_type == "distance" else 1440
+        if not (0 < budget <= max_budget):
+            raise HTTPException(status_code=400, detail=f"budget必须大于0且不超过{max_budget}")
+        if not (0 <= hull_ratio <= 1):
+            raise HTTPException(status_code=400, detail="hull_ratio必须为0~1之间的数字")
+        alpha = resolve_strategy_alpha(db, strategy)
+        snapshot = graph_service.get_snapshot(db)
+        engine = snapshot.engine
+
+        # 1. 确定起点节点
+        snapped = None
+        if start_poi_id is not None:
+            snapped = resolve_poi_nodes(db, snapshot.snap_index, [start_poi_id])[start_poi_id]
+            start_node_id = snapped["node_id"]
+        if start_node_id is None:
+            raise HTTPException(status_code=400, detail="start_node_id与start_poi_id至少提供一个")
+        if not engine.has_node(start_node_id):
+            raise HTTPException(status_code=404, detail=f"起点节点ID{start_node_id}不在路网中")
+
+        # 2. 受限单源搜索
+        if budget_type == "time":
+            weights = naismith_minutes(engine).tolist()
+        else:
+            weights, _ = engine.weights_for(alpha)
+        reached, settled = bounded_search(engine, start_node_id, weights, budget)
+
+        # 3. 可达POI：POI所匹配的路网点可达即视为可达（先按可达节点外包矩形粗筛）
+        reached_idx = np.fromiter(reached.keys(), dtype=np.int64, count=len(reached))
+        lngs, lats = engine.lng[reached_idx], engine.lat[reached_idx]
+        reachable_pois = []
+        if np.isfinite(lngs).any():
+            rows = db.query(models.Poi.id, models.Poi.name, models.Poi.type,
+                            func.ST_X(models.Poi.geom), func.ST_Y(models.Poi.geom)).filter(
+                models.Poi.is_active == True,
+                func.ST_Intersects(models.Poi.geom, func.ST_MakeEnvelope(
+                    float(np.nanmin(lngs)), float(np.nanmin(lats)),
+                    float(np.nanmax(lngs)), float(np.nanmax(lats)), 4326))
+            ).all()
+            nearest = snapshot.snap_index.nearest_nodes([float(r[3]) for r in rows], [float(r[4]) for r in rows]) if rows else None
+            if nearest is not None:
+                for (poi_id, name, poi_type, lng, lat), node_id, d in zip(rows, *nearest):
+                    i = engine.index_of[int(node_id)]
+                    if i in reached:
+                        reachable_pois.append({
+                            "id": poi_id, "name": name, "type": poi_type,
+                            "lng": float(lng), "lat": float(lat),
+                            "node_id": int(node_id), "cost": round(reached[i], 2),
+                            "snap_distance_m": round(float(d), 2)
+                        })
+            reachable_pois.sort(key=lambda p: p["cost"])
+
+        # 4. 可达范围多边形（可达节点 + 预算边界插值点）
+        polygon = None
+        if include_polygon:
+            points = [(float(engine.lng[i]), float(engine.lat[i])) for i in reached if np.isfinite(engine.lng[i])]
+            points += frontier_points(snapshot.network, engine, reached, weights, budget)
+            polygon = reachability_polygon(points, hull_ratio)
+
+        nodes = None
+        if include_nodes:
+            nodes = [{
+                "node_id": int(engine.node_ids[i]),
+                "lng": float(engine.lng[i]) if np.isfinite(engine.lng[i]) else None,
+                "lat": float(engine.lat[i]) if np.isfinite(engine.lat[i]) else None,
+                "cost": round(d, 2)
+            } for i, d in sorted(reached.items(), key=lambda item: item[1])]
+        return {
+            "code": 200,
+            "message": f"可达范围计算成功，共{len(reached)}个可达路网点、{len(reachable_pois)}个可达POI",
+            "data": {
+                "start_node_id": start_node_id,
+                "start_poi": snapped,
+                "strategy": strategy,
+                "slope_weight_alpha": alpha,
+                "budget_type": budget_type,
+                "budget": budget,
+                "cost_unit": "分钟" if budget_type == "time" else ("米" if strategy == "shortest" else "权重"),
+                "graph_version": snapshot.version,
+                "reachable_node_count": len(reached),
+                "settled_nodes": settled,
+                "nodes": nodes,
+                "pois": reachable_pois,
+                "polygon": polygon,
+                "elapsed_ms": round((time.perf_counter() - start) * 1000, 2)
+            }
+        }
+    except HTTPException as e:
+        raise e
+    except Exception as e:
+        print(f"❌ 可达范围计算失败：{str(e)}")
+        raise HTTPException(status_code=500, detail=f"可达范围计算异常：{str(e)[:200]}")
+
 # -------------------------- GPX导出核心接口 --------------------------
 @app.post("/path-planning/export-gpx", summary="路径规划GPX导出：生成标准GPX文件流（直接下载）")
 def export_path_to_gpx(
-    start_node_id: int = Body(..., description="起点路网点ID"),
-    end_node_id: int = Body(..., description="终点路网点ID"),
+    start_node_id: int = Body(None, description="起点路网点ID（与start_coord二选一）"),
+    end_node_id: int = Body(None, description="终点路网点ID（与end_coord二选一）"),
     strategy: str = Body(..., description="规划策略：shortest=最短距离，gentlest=坡度最平缓"),
+    start_coord: list = Body(None, description="起点经纬度[lng, lat]，自动吸附到最近路网边"),
+    end_coord: list = Body(None, description="终点经纬度[lng, lat]，自动吸附到最近路网边"),
+    max_snap_m: float = Body(DEFAULT_MAX_SNAP_M, description="经纬度吸附的最大距离（米）"),
     db: Session = Depends(get_db)
 ):
     """
     基于路径规划结果生成标准GPX 1.1文件，直接返回文件流供前端下载
     适配户外导航设备/软件（Garmin、奥维互动地图、两步路等），包含高程/坡度/距起点距离信息
+    与/path-planning共用路线缓存：先查看路线再下载GPX时不重复搜索与采样
     """
     try:
-        # ====================== 复用原有路径规划核心逻辑 ======================
+        # ====================== 复用路径规划流水线（含路线缓存） ======================
         # 1. 校验策略参数
         valid_strategies = ["shortest", "gentlest"]
         if strategy not in valid_strategies:
             raise HTTPException(status_code=400, detail=f"策略无效，仅支持{valid_strategies}")
         
-        # 2. 构建NetworkX内存图
-        G = build_networkx_graph(db)
+        # 2. 获取路网图缓存快照
+        snapshot = graph_service.get_snapshot(db)
         
-        # 3. 校验起点/终点
-        if start_node_id not in G.nodes:
-            raise HTTPException(status_code=404, detail=f"起点节点ID{start_node_id}不在路网中")
-        if end_node_id not in G.nodes:
-            raise HTTPException(status_code=404, detail=f"终点节点ID{end_node_id}不在路网中")
-        if start_node_id == end_node_id:
+        # 3. 校验起点/终点（或经纬度吸附）
+        start = resolve_route_endpoint(snapshot, start_node_id, start_coord, max_snap_m, "起点")
+        end = resolve_route_endpoint(snapshot, end_node_id, end_coord, max_snap_m, "终点")
+        if start.node_id is not None and start.node_id == end.node_id:
             raise HTTPException(status_code=400, detail="起点和终点节点ID不能相同")
         
         # 4. 获取坡度权重α并调整
@@ -1062,62 +1615,25 @@ def export_path_to_gpx(
         if strategy == "shortest":
             alpha = 0.0
         
-        # 5. 定义边权重函数
-        def edge_weight(u, v, d):
-            return d["length_m"] * (1 + alpha * d["slope_avg"])
-        
-        # 6. 执行Dijkstra算法
-        node_path = nx.dijkstra_path(G, source=start_node_id, target=end_node_id, weight=edge_weight)
-        edge_path = nx.utils.pairwise(node_path)
-        
-        # 7. 统计路径信息
-        total_length = 0.0
-        total_slope = 0.0
-        edge_count = 0
-        for u, v in edge_path:
-            d = G[u][v]
-            total_length += d["length_m"]
-            total_slope += d["slope_avg"]
-            edge_count += 1
-        avg_slope = round(total_slope / edge_count, 2) if edge_count > 0 else 0.0
-        total_length = round(total_length, 2)
-        
-        # 8. 节点转经纬度坐标
-        coord_path = []
-        for node_id in node_path:
-            node = db.query(models.NetworkNode).filter(models.NetworkNode.id == node_id).first()
-            if node:
-                geom_wkt = db.execute(func.ST_AsText(node.geom)).scalar()
-                lng, lat = _parse_wkt_to_lnglat(geom_wkt)
-                coord_path.append({
-                    "node_id": node_id,
-                    "lng": lng,
-                    "lat": lat
-                })
-        
-        # 9. 路径20米采样+高程坡度插值
-        sampling_points = path_20m_sampling(coord_path)
-        path_sampling_result = path_interpolate_elevation_slope(sampling_points, db)
-        sampling_count = len(path_sampling_result)
+        # 5~9. 搜索、统计、20米采样+高程坡度插值（命中缓存时直接复用）
+        planned, _ = plan_route_cached(db, snapshot, start, end, strategy, alpha)
+        path_sampling_result = planned["sampling_result"]
         # ======================================================================
 
         # 10. 构造路径统计信息（与路径规划接口一致）
         statistics = {
-            "total_length_m": total_length,
-            "avg_slope_deg": avg_slope,
-            "node_count": len(node_path),
-            "edge_count": edge_count,
-            "sampling_count": sampling_count
+            **planned["summary"]["statistics"],
+            "sampling_count": len(path_sampling_result)
         }
 
         # 11. 生成GPX对象并转为文件流响应
         gpx_obj = create_gpx_from_path(path_sampling_result, strategy, statistics)
         return gpx_to_file_stream(gpx_obj, strategy)
 
-    except nx.NetworkXNoPath:
-        raise HTTPException(status_code=404, detail=f"起点{start_node_id}到终点{end_node_id}无可达路径")
+    except NoPathError:
+        raise HTTPException(status_code=404, detail="起点到终点无可达路径")
     except HTTPException as e:
         raise e
     except Exception as e:
         print(f"❌ GPX导出失败：{str(e)}")
-        raise HTTPException(status_code=500, detail=f"GPX导出异常：{str(e)[:200]}")
\ No newline at end of file
+        raise HTTPException(status_code=500, detail=f"GPX导出异常：{str(e)[:200]}")
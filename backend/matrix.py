@@ -0,0 +1,164 @@
+# backend/matrix.py
+"""
+多对多距离/努力值矩阵
+- CH已就绪：桶算法（bucket many-to-many）——每个终点做一次向后向上搜索，把距离写入途经节点的桶；
+  每个起点做一次向前向上搜索，扫描途经节点的桶即可得到整行结果，各行/列之间共享搜索工作
+- CH未就绪：每个起点一次单源Dijkstra，全部终点确定后或超出cutoff即停止
+- 每个单元格同时给出所选路线（按策略权重最优）的长度与坡度努力值Σ(length_m × slope_avg)
+"""
+import heapq
+import math
+import threading
+from collections import OrderedDict, defaultdict
+
+import numpy as np
+
+
+def cost_matrix(engine, ch, source_ids: list, target_ids: list, alpha: float, cutoff: float = None) -> dict:
+    """
+    计算起点×终点的权重/长度/努力值矩阵
+    :param engine: RoutingEngine
+    :param ch: 与alpha对应的ContractionHierarchy（None时回退单源Dijkstra）
+    :param source_ids: 起点节点ID列表（N个）
+    :param target_ids: 终点节点ID列表（M个）
+    :param alpha: 坡度权重α（shortest策略传0）
+    :param cutoff: 权重上限，超出的单元格视为不可达（None表示不限）
+    :return: {"cost"/"length"/"effort": N×M数组（不可达为inf）, "method": "ch"/"dijkstra", "settled": 确定节点总数}
+    """
+    limit = math.inf if cutoff is None else float(cutoff)
+    sources = [engine.index_of[s] for s in source_ids]
+    targets = [engine.index_of[t] for t in target_ids]
+    shape = (len(sources), len(targets))
+    cost = np.full(shape, np.inf)
+    length = np.full(shape, np.inf)
+    effort = np.full(shape, np.inf)
+    effort_values = engine.length_m * engine.slope_avg
+    if ch is not None:
+        settled = _bucket_matrix(ch, engine, effort_values, sources, targets, limit, cost, length, effort)
+        method = "ch"
+    else:
+        settled = _dijkstra_matrix(engine, effort_values, sources, targets, alpha, limit, cost, length, effort)
+        method = "dijkstra"
+    return {"cost": cost, "length": length, "effort": effort, "method": method, "settled": settled}
+
+
+def _bucket_matrix(ch, engine, effort_values, sources, targets, limit, cost, length, effort) -> int:
+    w = ch.weights
+    lengths = ch.edge_values("length_m", engine.length_m)
+    efforts = ch.edge_values("effort", effort_values)
+    settled = 0
+    # 1. 终点侧：向下图（反向）向上搜索，结果写入桶 节点 → [(列号, 权重, 长度, 努力值)]
+    buckets = defaultdict(list)
+    for j, t in enumerate(targets):
+        space = _upward_search(ch.down_graph, w, lengths, efforts, t, limit)
+        settled += len(space)
+        for v, label in space.items():
+            buckets[v].append((j,) + label)
+    # 2. 起点侧：向上图搜索，扫描途经节点的桶
+    for i, s in enumerate(sources):
+        space = _upward_search(ch.up_graph, w, lengths, efforts, s, limit)
+        settled += len(space)
+        row_cost, row_len, row_eff = cost[i], length[i], effort[i]
+        for u, (d, l, e) in space.items():
+            for j, d2, l2, e2 in buckets.get(u, ()):
+                total = d + d2
+                if total < row_cost[j] and total <= limit:
+                    row_cost[j] = total
+                    row_len[j] = l + l2
+                    row_eff[j] = e + e2
+    return settled
+
+
+def _upward_search(graph, w, lengths, efforts, start: int, limit: float) -> dict:
+    """CH单向向上搜索（穷尽，搜索空间很小），返回 节点 → (权重, 长度, 努力值)"""
+    indptr, head, edge = graph
+    best = {start: (0.0, 0.0, 0.0)}
+    done = {}
+    heap = [(0.0, start)]
+    while heap:
+        d, u = heapq.heappop(heap)
+        if u in done or d > limit:
+            continue
+        label = best[u]
+        done[u] = label
+        _, l, e = label
+        for k in range(indptr[u], indptr[u + 1]):
+            v = head[k]
+            ce = edge[k]
+            nd = d + w[ce]
+            if v not in done and nd < best.get(v, (math.inf,))[0]:
+                best[v] = (nd, l + lengths[ce], e + efforts[ce])
+                heapq.heappush(heap, (nd, v))
+    return done
+
+
+def _dijkstra_matrix(engine, effort_values, sources, targets, alpha, limit, cost, length, effort) -> int:
+    weights, _ = engine.weights_for(alpha)
+    lengths = engine.length_m.tolist()
+    efforts = effort_values.tolist()
+    indptr, indices = engine.adjacency
+    columns = defaultdict(list)  # 节点下标 → 终点列号（终点可能重复）
+    for j, t in enumerate(targets):
+        columns[t].append(j)
+    settled = 0
+    for i, s in enumerate(sources):
+        best = {s: (0.0, 0.0, 0.0)}
+        done = set()
+        remaining = len(columns)
+        heap = [(0.0, s)]
+        while heap and remaining:
+            d, u = heapq.heappop(heap)
+            if u in done:
+                continue
+            if d > limit:
+                break
+            done.add(u)
+            settled += 1
+            _, l, e = best[u]
+            if u in columns:
+                remaining -= 1
+                for j in columns[u]:
+                    cost[i, j], length[i, j], effort[i, j] = d, l, e
+            for pos in range(indptr[u], indptr[u + 1]):
+                v = indices[pos]
+                nd = d + weights[pos]
+                if v not in done and nd < best.get(v, (math.inf,))[0]:
+                    best[v] = (nd, l + lengths[pos], e + efforts[pos])
+                    heapq.heappush(heap, (nd, v))
+    return settled
+
+
+def matrix_to_json(arr: np.ndarray, digits: int = 2) -> list:
+    """矩阵转JSON二维数组，不可达单元格为None"""
+    return [[round(float(x), digits) if np.isfinite(x) else None for x in row] for row in arr]
+
+
+class MatrixCache:
+    """
+    方阵缓存（LRU）：键为（图版本, α, 节点ID元组），供游览顺序优化等重复使用同一组点的场景复用
+    图版本变化后旧键自然不再命中，按LRU淘汰
+    """
+
+    def __init__(self, max_entries: int = 32):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get_or_compute(self, graph_version: int, engine, ch, node_ids: list, alpha: float) -> dict:
+        """返回node_ids×node_ids的方阵结果（结构同cost_matrix），未命中时计算并缓存"""
+        key = (graph_version, alpha, tuple(node_ids))
+        with self._lock:
+            cached = self._entries.get(key)
+            if cached is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return cached
+            self.misses += 1
+        result = cost_matrix(engine, ch, node_ids, node_ids, alpha)
+        with self._lock:
+            self._entries[key] = result
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return result
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Text, Numeric, Boolean, DateTime
+from sqlalchemy import Column, Integer, String, Text, Numeric, Boolean, DateTime, Float, LargeBinary
 from sqlalchemy.dialects.postgresql import JSONB  # PostgreSQL专属JSONB类型
 from sqlalchemy.sql import func
 from geoalchemy2 import Geometry  # 空间类型依赖，适配PostGIS
@@ -33,6 +33,13 @@ class NetworkEdge(Base):
     geom = Column(Geometry("LINESTRING", srid=4326), nullable=False, comment="路径线坐标（WGS84）")
     length_m = Column(Numeric(10,2), nullable=False, comment="路径长度（米）")
     type = Column(String(20), nullable=False, comment="道路类型：主路/支路/POI连接线")
+    # 地形属性（拓扑构建/地形导入时批量计算，见edge_terrain.py）
+    slope_avg = Column(Numeric(5,2), default=0, comment="平均坡度（度）")
+    max_grade = Column(Numeric(6,2), default=0, comment="最大坡度比（%，相邻采样点高差/水平距离）")
+    ascent_m = Column(Numeric(10,2), default=0, comment="累计爬升（米，source→target方向）")
+    descent_m = Column(Numeric(10,2), default=0, comment="累计下降（米，source→target方向）")
+    terrain_geom_md5 = Column(String(32), nullable=True, comment="计算地形属性时的几何MD5，与当前几何不一致表示需重算")
+    terrain_update_time = Column(DateTime, nullable=True, comment="地形属性计算时间")
     create_time = Column(DateTime, default=func.now(), comment="创建时间")
 
 # 4. 高程点模型（地形数据-海拔，由DEM文件导入）
@@ -68,4 +75,26 @@ class SystemConfig(Base):
     key = Column(String(50), primary_key=True, comment="配置键（如slope_weight_alpha）")
     value = Column(Text, nullable=False, comment="配置值（字符串格式，可解析为数字/JSON）")
     description = Column(Text, nullable=True, comment="配置说明")
-    update_time = Column(DateTime, default=func.now(), onupdate=func.now(), comment="更新时间（自动触发）")
\ No newline at end of file
+    update_time = Column(DateTime, default=func.now(), onupdate=func.now(), comment="更新时间（自动触发）")
+
+# 8. 地形分块模型（DEM高程/坡度栅格按固定大小分块存储，每个栅格块一行，像元值为压缩后的紧凑数组；含多级降采样金字塔）
+class TerrainTile(Base):
+    __tablename__ = "terrain_tiles"
+    layer = Column(String(20), primary_key=True, comment="图层：elevation=高程（米），slope=坡度（度）")
+    level = Column(Integer, primary_key=True, default=0, comment="金字塔级别：0=原始分辨率，k=2^k倍降采样（2×2有效像元均值）")
+    tile_row = Column(Integer, primary_key=True, comment="块行号（块左上角像元行号 = tile_row × tile_size）")
+    tile_col = Column(Integer, primary_key=True, comment="块列号（块左上角像元列号 = tile_col × tile_size）")
+    tile_size = Column(Integer, nullable=False, comment="分块边长（像元）")
+    origin_lon = Column(Float, nullable=False, comment="整幅栅格左上角经度（各级相同）")
+    origin_lat = Column(Float, nullable=False, comment="整幅栅格左上角纬度")
+    res_lon = Column(Float, nullable=False, comment="本级像元宽（经度差）")
+    res_lat = Column(Float, nullable=False, comment="本级像元高（纬度差，通常为负数）")
+    raster_width = Column(Integer, nullable=False, comment="本级整幅栅格列数")
+    raster_height = Column(Integer, nullable=False, comment="本级整幅栅格行数")
+    width = Column(Integer, nullable=False, comment="本块列数（右/下边缘块可能小于tile_size）")
+    height = Column(Integer, nullable=False, comment="本块行数")
+    dtype = Column(String(8), nullable=False, comment="像元数据类型（NumPy dtype字符串，如<i2、<f4）")
+    nodata = Column(Float, nullable=True, comment="无效值（降采样级别以NaN表示无效）")
+    data = Column(LargeBinary, nullable=False, comment="zlib压缩的像元数组（行优先）")
+    block_md5 = Column(String(32), nullable=False, comment="块内容指纹，重新导入时只替换指纹变化的块")
+    update_time = Column(DateTime, default=func.now(), onupdate=func.now(), comment="更新时间")
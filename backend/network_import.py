@@ -0,0 +1,298 @@
+# backend/network_import.py
+"""
+路网批量导入：GeoJSON / GPX / Shapefile道路图层流式读取 + 向量化测地线长度 + COPY入库
+- OGR逐要素读取（多线拆为多条边，非WGS84坐标系自动转换），按批累积后统一处理，不在内存中保留整个图层
+- 每批全部折线一次向量化计算WGS84椭球测地线长度（pyproj.Geod），几何以shapely向量化构造为EWKB
+- 每批COPY进临时中转表；全部读取完成后按端点吸附坐标匹配/新增路网点，一条INSERT ... SELECT写入路网边（跳过与已有边几何相同的边），最后一条集合语句刷新节点度数
+- 整个导入在同一事务内提交；无效要素（空几何、非线要素、顶点不足、坐标越界、道路类型无效等）记录原因后跳过
+"""
+import io
+import os
+import time
+
+import numpy as np
+import shapely
+from pyproj import Geod
+
+from topology_builder import NODE_SNAP_DEG
+
+try:
+    from osgeo import ogr, osr
+except ImportError:  # 未安装GDAL时无法读取矢量文件
+    ogr = osr = None
+
+# 接口导入时矢量文件所在目录（只允许导入该目录下的文件）
+NETWORK_DATA_DIR = "./network_data"
+# 允许的道路类型（与新增路网边接口一致）
+VALID_EDGE_TYPES = ["主路", "支路", "POI连接线"]
+# 要素未提供道路类型时使用的默认类型
+DEFAULT_EDGE_TYPE = "支路"
+# 每批处理的折线数
+IMPORT_BATCH_LINES = 20000
+# 导入报告中最多列出的无效要素数
+MAX_REPORTED_REJECTS = 100
+# 路网边长度字段上限（Numeric(10,2)）
+MAX_EDGE_LENGTH_M = 1e8
+
+_GEOD = Geod(ellps="WGS84")
+
+_STAGE_DDL = """
+CREATE TEMP TABLE network_import_stage (
+    feature_no BIGINT NOT NULL,
+    geom geometry(LineString, 4326) NOT NULL,
+    length_m NUMERIC(10, 2) NOT NULL,
+    type VARCHAR(20) NOT NULL
+) ON COMMIT DROP
+"""
+
+# 中转表边端点（吸附网格）中尚无对应路网点的，新增路网点
+_INSERT_NODES_SQL = """
+WITH ends AS (
+    SELECT DISTINCT ST_X(p) AS x, ST_Y(p) AS y FROM (
+        SELECT ST_SnapToGrid(ST_StartPoint(geom), %(grid)s) AS p FROM network_import_stage
+        UNION ALL
+        SELECT ST_SnapToGrid(ST_EndPoint(geom), %(grid)s) FROM network_import_stage
+    ) q
+)
+INSERT INTO network_nodes (geom, degree, create_time)
+SELECT ST_SetSRID(ST_MakePoint(x, y), 4326), 0, NOW() FROM ends
+WHERE NOT EXISTS (
+    SELECT 1 FROM network_nodes n
+    WHERE n.geom && ST_Expand(ST_SetSRID(ST_MakePoint(x, y), 4326), %(grid)s)
+      AND ST_Equals(ST_SnapToGrid(n.geom, %(grid)s), ST_SetSRID(ST_MakePoint(x, y), 4326))
+)
+"""
+
+# 中转表 → 路网边：起终点关联吸附坐标相同的路网点，跳过与已有边几何相同的边
+_INSERT_EDGES_SQL = """
+INSERT INTO network_edges (source, target, geom, length_m, type, create_time)
+SELECT
+    (SELECT n.id FROM network_nodes n
+     WHERE n.geom && ST_Expand(ST_SnapToGrid(ST_StartPoint(s.geom), %(grid)s), %(grid)s)
+       AND ST_Equals(ST_SnapToGrid(n.geom, %(grid)s), ST_SnapToGrid(ST_StartPoint(s.geom), %(grid)s))
+     ORDER BY n.id LIMIT 1),
+    (SELECT n.id FROM network_nodes n
+     WHERE n.geom && ST_Expand(ST_SnapToGrid(ST_EndPoint(s.geom), %(grid)s), %(grid)s)
+       AND ST_Equals(ST_SnapToGrid(n.geom, %(grid)s), ST_SnapToGrid(ST_EndPoint(s.geom), %(grid)s))
+     ORDER BY n.id LIMIT 1),
+    s.geom, s.length_m, s.type, NOW()
+FROM network_import_stage s
+WHERE NOT EXISTS (
+    SELECT 1 FROM network_edges e WHERE e.geom && s.geom AND ST_Equals(e.geom, s.geom)
+)
+"""
+
+# 按全部路网边重新统计节点度数，只写入有变化的节点
+_REFRESH_DEGREE_SQL = """
+UPDATE network_nodes n SET degree = d.edge_count
+FROM (
+    SELECT node_id, COUNT(*) AS edge_count FROM (
+        SELECT source AS node_id FROM network_edges
+        UNION ALL
+        SELECT target FROM network_edges
+    ) ends GROUP BY node_id
+) d
+WHERE n.id = d.node_id AND n.degree IS DISTINCT FROM d.edge_count
+"""
+
+
+def resolve_network_file(filename: str) -> str:
+    """接口传入的文件名 → NETWORK_DATA_DIR下的绝对路径（不允许指向目录之外）"""
+    base = os.path.realpath(NETWORK_DATA_DIR)
+    path = os.path.realpath(os.path.join(base, filename))
+    if os.path.commonpath([base, path]) != base:
+        raise ValueError(f"文件须位于{NETWORK_DATA_DIR}目录下")
+    if not os.path.isfile(path):
+        raise FileNotFoundError(f"文件不存在：{filename}")
+    return path
+
+
+def geodesic_lengths(lines: list) -> np.ndarray:
+    """
+    批量计算折线的WGS84椭球测地线长度（米），全部折线的线段一次向量化计算
+    :param lines: 折线顶点数组列表，每条为 (n, 2) 的 [lng, lat]，n ≥ 2
+    :return: 各折线长度数组
+    """
+    if not lines:
+        return np.zeros(0)
+    xy = np.concatenate(lines)
+    starts = np.cumsum([0] + [len(line) for line in lines[:-1]])
+    _, _, seg = _GEOD.inv(xy[:-1, 0], xy[:-1, 1], xy[1:, 0], xy[1:, 1])
+    seg = np.asarray(seg, dtype=np.float64)
+    # 相邻两条折线首尾之间的“线段”不计入长度
+    seg[starts[1:] - 1] = 0.0
+    return np.add.reduceat(seg, starts)
+
+
+class _ImportStats:
+    """读取统计：要素数，无效要素按原因计数并保留前若干条明细"""
+
+    def __init__(self):
+        self.features = 0
+        self.rejected = 0
+        self.reasons = {}
+        self.samples = []
+
+    def reject(self, feature_no: int, layer: str, reason: str) -> None:
+        self.rejected += 1
+        self.reasons[reason] = self.reasons.get(reason, 0) + 1
+        if len(self.samples) < MAX_REPORTED_REJECTS:
+            self.samples.append({"feature": feature_no, "layer": layer, "reason": reason})
+
+
+def iter_network_lines(path: str, stats: _ImportStats, type_field: str = "type", default_type: str = DEFAULT_EDGE_TYPE):
+    """
+    流式读取矢量文件中的道路折线（GeoJSON / GPX / Shapefile等OGR支持的格式）
+    - 点图层（如GPX航点）整体跳过；多线要素拆为多条折线；连续重复顶点去除
+    :param stats: 读取统计（读取过程中写入）
+    :param type_field: 道路类型字段名（字段不存在或为空时取default_type）
+    :return: 生成器，产出 (要素序号, 顶点数组 (n, 2), 道路类型)
+    """
+    if ogr is None:
+        raise RuntimeError("未安装GDAL（osgeo），无法读取矢量文件")
+    ds = ogr.Open(path)
+    if ds is None:
+        raise ValueError(f"无法打开矢量文件：{path}")
+    wgs84 = osr.SpatialReference()
+    wgs84.ImportFromEPSG(4326)
+    wgs84.SetAxisMappingStrategy(osr.OAMS_TRADITIONAL_GIS_ORDER)
+    for layer_index in range(ds.GetLayerCount()):
+        layer = ds.GetLayer(layer_index)
+        if ogr.GT_Flatten(layer.GetGeomType()) in (ogr.wkbPoint, ogr.wkbMultiPoint):
+            continue
+        layer_name = layer.GetName()
+        srs = layer.GetSpatialRef()
+        transform = None
+        if srs is not None and not srs.IsSame(wgs84):
+            srs.SetAxisMappingStrategy(osr.OAMS_TRADITIONAL_GIS_ORDER)
+            transform = osr.CoordinateTransformation(srs, wgs84)
+        field_index = layer.GetLayerDefn().GetFieldIndex(type_field)
+        for feature in layer:
+            stats.features += 1
+            feature_no = stats.features
+            geom = feature.GetGeometryRef()
+            if geom is None or geom.IsEmpty():
+                stats.reject(feature_no, layer_name, "空几何")
+                continue
+            edge_type = (feature.GetFieldAsString(field_index).strip() if field_index >= 0 else "") or default_type
+            if edge_type not in VALID_EDGE_TYPES:
+                stats.reject(feature_no, layer_name, "道路类型无效")
+                continue
+            geom_type = ogr.GT_Flatten(geom.GetGeometryType())
+            if geom_type == ogr.wkbLineString:
+                parts = [geom]
+            elif geom_type == ogr.wkbMultiLineString:
+                parts = [geom.GetGeometryRef(i) for i in range(geom.GetGeometryCount())]
+            else:
+                stats.reject(feature_no, layer_name, "非线要素")
+                continue
+            for part in parts:
+                if transform is not None:
+                    part = part.Clone()
+                    part.Transform(transform)
+                points = part.GetPoints() or []
+                xy = np.asarray(points, dtype=np.float64)[:, :2] if points else np.zeros((0, 2))
+                if len(xy) and not np.isfinite(xy).all():
+                    stats.reject(feature_no, layer_name, "坐标含无效值")
+                    continue
+                if len(xy) > 1:
+                    xy = xy[np.r_[True, (np.diff(xy, axis=0) != 0).any(axis=1)]]
+                if len(xy) < 2:
+                    stats.reject(feature_no, layer_name, "有效顶点少于2个")
+                    continue
+                if (np.abs(xy[:, 0]) > 180).any() or (np.abs(xy[:, 1]) > 90).any():
+                    stats.reject(feature_no, layer_name, "坐标超出经纬度范围")
+                    continue
+                yield feature_no, xy, edge_type
+
+
+def _copy_batch(cur, batch: list, stats: _ImportStats) -> tuple:
+    """
+    一批折线：向量化计算长度、构造EWKB，COPY进中转表
+    :return: (写入中转表的边数, 总长度（米）)
+    """
+    lines = [xy for _, xy, _ in batch]
+    lengths = geodesic_lengths(lines)
+    keep = (lengths > 0) & (lengths < MAX_EDGE_LENGTH_M)
+    for (feature_no, _, _), ok in zip(batch, keep):
+        if not ok:
+            stats.reject(feature_no, None, "长度为0或超出范围")
+    kept = np.flatnonzero(keep)
+    if not len(kept):
+        return 0, 0.0
+    counts = np.array([len(lines[i]) for i in kept])
+    geoms = shapely.linestrings(np.concatenate([lines[i] for i in kept]),
+                                indices=np.repeat(np.arange(len(kept)), counts))
+    ewkb = shapely.to_wkb(shapely.set_srid(geoms, 4326), hex=True, include_srid=True)
+    buf = io.StringIO()
+    for i, geom_hex in zip(kept.tolist(), ewkb.tolist()):
+        buf.write(f"{batch[i][0]}\t{geom_hex}\t{lengths[i]:.2f}\t{batch[i][2]}\n")
+    buf.seek(0)
+    cur.copy_expert("COPY network_import_stage (feature_no, geom, length_m, type) FROM STDIN", buf)
+    return len(kept), float(lengths[kept].sum())
+
+
+def import_network(engine, path: str, type_field: str = "type", default_type: str = DEFAULT_EDGE_TYPE,
+                   batch_lines: int = IMPORT_BATCH_LINES) -> dict:
+    """
+    从矢量文件批量导入路网边（同一事务内提交）
+    :param engine: SQLAlchemy引擎
+    :param path: 矢量文件路径（.geojson / .gpx / .shp 等）
+    :param type_field: 道路类型字段名
+    :param default_type: 未提供道路类型时的默认类型
+    :param batch_lines: 每批COPY的折线数
+    :return: 导入报告（读取要素数、写入边数、重复边数、新增节点数、无效要素统计、吞吐量等）
+    """
+    if default_type not in VALID_EDGE_TYPES:
+        raise ValueError(f"默认道路类型无效，仅支持：{VALID_EDGE_TYPES}")
+    started = time.perf_counter()
+    stats = _ImportStats()
+    staged, total_length = 0, 0.0
+    conn = engine.raw_connection()
+    try:
+        cur = conn.cursor()
+        cur.execute(_STAGE_DDL)
+        batch = []
+        for item in iter_network_lines(path, stats, type_field, default_type):
+            batch.append(item)
+            if len(batch) >= batch_lines:
+                n, length = _copy_batch(cur, batch, stats)
+                staged, total_length, batch = staged + n, total_length + length, []
+                elapsed = max(time.perf_counter() - started, 1e-9)
+                print(f"  已读取 {stats.features} 个要素，写入中转表 {staged} 条边，{staged / elapsed:.0f} 条/秒")
+        if batch:
+            n, length = _copy_batch(cur, batch, stats)
+            staged, total_length = staged + n, total_length + length
+
+        cur.execute("ANALYZE network_import_stage")
+        cur.execute(_INSERT_NODES_SQL, {"grid": NODE_SNAP_DEG})
+        nodes_inserted = cur.rowcount
+        cur.execute(_INSERT_EDGES_SQL, {"grid": NODE_SNAP_DEG})
+        edges_inserted = cur.rowcount
+        cur.execute(_REFRESH_DEGREE_SQL)
+        degree_updated = cur.rowcount
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        conn.close()
+
+    elapsed = max(time.perf_counter() - started, 1e-9)
+    report = {
+        "features": stats.features,
+        "edges_staged": staged,
+        "edges_inserted": edges_inserted,
+        "duplicates": staged - edges_inserted,
+        "nodes_inserted": nodes_inserted,
+        "degree_updated": degree_updated,
+        "total_length_km": round(total_length / 1000, 3),
+        "rejected": stats.rejected,
+        "reject_reasons": stats.reasons,
+        "rejected_samples": stats.samples,
+        "elapsed_s": round(elapsed, 2),
+        "edges_per_s": round(staged / elapsed, 1)
+    }
+    print(f"✅ 路网导入完成：{edges_inserted} 条边（重复跳过 {staged - edges_inserted} 条），新增 {nodes_inserted} 个节点，"
+          f"无效要素 {stats.rejected} 个，耗时 {elapsed:.2f} 秒（{staged / elapsed:.0f} 条/秒）")
+    return report
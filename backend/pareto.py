@@ -0,0 +1,115 @@
+# backend/pareto.py
+"""
+双目标（距离, 坡度努力值）帕累托路径搜索
+- 目标1：length_m；目标2：effort = Σ length_m × slope_avg
+- 任意α的gentlest权重 length_m × (1 + α × slope_avg) = 目标1 + α × 目标2，
+  因此一次搜索得到的非支配路径集合覆盖了所有α下的最优路线，无需反复修改系统配置
+- 标签设定算法（按(距离, 努力值)字典序出堆），标签数上限保证延迟可控
+"""
+import heapq
+import math
+
+from routing_engine import NoPathError, RouteResult
+
+# 默认最多确定的标签数（超出后提前结束，结果标记为truncated）
+DEFAULT_MAX_LABELS = 20000
+# 默认ε支配容差：努力值改善不足ε比例的标签视为被支配，压缩近似重复路线
+DEFAULT_EPSILON = 0.01
+
+
+def pareto_routes(engine, source_id: int, target_id: int,
+                  max_labels: int = DEFAULT_MAX_LABELS, epsilon: float = DEFAULT_EPSILON):
+    """
+    单次双目标搜索，返回起点到终点的非支配路线集合
+    :param engine: RoutingEngine
+    :param source_id: 起点节点ID
+    :param target_id: 终点节点ID
+    :param max_labels: 最多确定的标签数
+    :param epsilon: ε支配容差（0表示严格帕累托）
+    :return: (路线列表[(RouteResult, 距离, 努力值)]，按距离升序；是否因标签上限提前结束；已确定标签数)
+    """
+    engine.check_reachable(source_id, target_id)
+    source = engine.index_of[source_id]
+    target = engine.index_of[target_id]
+    length = engine.length_m.tolist()
+    effort = (engine.length_m * engine.slope_avg).tolist()
+    indptr, indices = engine.adjacency
+
+    # 标签表：(节点, 前驱标签下标, 到达边CSR下标)
+    label_node, label_pred, label_edge = [source], [-1], [-1]
+    best_effort = {}  # 节点 → 已确定标签中的最小努力值（字典序出堆，后出堆标签距离不更小）
+    heap = [(0.0, 0.0, 0)]
+    settled = 0
+    targets = []  # [(距离, 努力值, 标签下标)]
+    truncated = False
+    while heap:
+        c1, c2, label = heapq.heappop(heap)
+        v = label_node[label]
+        # 被该节点已确定的标签支配，或被终点已有路线支配
+        if c2 >= best_effort.get(v, math.inf) * (1 - epsilon):
+            continue
+        if c2 >= best_effort.get(target, math.inf) * (1 - epsilon):
+            continue
+        if settled >= max_labels:
+            truncated = True
+            break
+        settled += 1
+        best_effort[v] = c2
+        if v == target:
+            targets.append((c1, c2, label))
+            continue
+        for pos in range(indptr[v], indptr[v + 1]):
+            w = indices[pos]
+            n2 = c2 + effort[pos]
+            if n2 >= best_effort.get(w, math.inf) * (1 - epsilon):
+                continue
+            label_node.append(w)
+            label_pred.append(label)
+            label_edge.append(pos)
+            heapq.heappush(heap, (c1 + length[pos], n2, len(label_node) - 1))
+    if not targets:
+        raise NoPathError(f"起点{source_id}到终点{target_id}无可达路径")
+
+    routes = []
+    for c1, c2, label in targets:
+        edge_positions = []
+        while label_pred[label] >= 0:
+            edge_positions.append(label_edge[label])
+            label = label_pred[label]
+        edge_positions.reverse()
+        node_path = [source_id] + [int(engine.node_ids[engine.indices[pos]]) for pos in edge_positions]
+        routes.append((RouteResult(node_path, edge_positions, c1, settled), c1, c2))
+    return routes, truncated, settled
+
+
+def optimal_alpha_range(costs: list, i: int):
+    """
+    计算第i条路线在α∈[0,1]内作为最优路线（权重 距离 + α×努力值 最小）的区间
+    :param costs: [(距离, 努力值), ...] 全部非支配路线
+    :return: (α下界, α上界)；不存在使其最优的α（非支撑解）时返回None
+    """
+    lo, hi = 0.0, 1.0
+    c1_i, c2_i = costs[i]
+    for j, (c1_j, c2_j) in enumerate(costs):
+        if j == i:
+            continue
+        # c1_i + α·c2_i ≤ c1_j + α·c2_j  ⇔  α·(c2_i − c2_j) ≤ c1_j − c1_i
+        diff = c2_i - c2_j
+        bound = c1_j - c1_i
+        if diff > 0:
+            hi = min(hi, bound / diff)
+        elif diff < 0:
+            lo = max(lo, bound / diff)
+        elif bound < 0:
+            return None
+    return (round(lo, 4), round(hi, 4)) if lo <= hi else None
+
+
+def select_spread(routes: list, max_routes: int) -> list:
+    """非支配路线过多时沿帕累托前沿均匀抽取（保留距离最短、努力值最小两端）"""
+    if len(routes) <= max_routes:
+        return routes
+    if max_routes <= 1:
+        return routes[:1]
+    step = (len(routes) - 1) / (max_routes - 1)
+    return [routes[round(k * step)] for k in range(max_routes)]
@@ -0,0 +1,234 @@
+# backend/path_sampling.py
+"""
+路径高程/坡度插值工具函数：20米等距采样 + 采样点空间插值
+- 等距采样按累计地理距离向量化插值，可一次处理多条路径
+- 与FastAPI应用解耦，供路径规划接口、GPX导出与批量规划工作进程共用
+- 优先使用栅格文件（terrain_sampler）或数据库分块地形（terrain_store）一次向量化插值全部采样点，均不可用时回退为逐点查询高程/坡度点表
+- 剖面可按最大点数/目标分辨率自适应采样，并选用满足分辨率的最粗地形金字塔级别
+"""
+import math
+
+import numpy as np
+from geoalchemy2.functions import ST_SetSRID, ST_MakePoint, ST_DWithin
+from sqlalchemy.orm import Session
+
+import models
+from terrain_sampler import get_terrain_sampler, haversine_m, resample_line, resample_lines, terrain_files_version
+from terrain_store import get_terrain_store, terrain_store_version
+
+# 每度纬度对应的地面距离（米），SRID 4326下把米制匹配阈值换算为度
+METERS_PER_DEGREE = 111320.0
+# 自适应剖面的最小采样间隔（米），与20米等距采样一致
+PROFILE_MIN_INTERVAL_M = 20.0
+
+
+def haversine_distance(lng1: float, lat1: float, lng2: float, lat2: float) -> float:
+    """
+    哈维正弦公式计算WGS84经纬度两点间的地理距离（米）
+    :param lng1/lat1: 点1经纬度
+    :param lng2/lat2: 点2经纬度
+    :return: 两点间距离（米）
+    """
+    # 地球半径（米）
+    R = 6371000.0
+    # 角度转弧度
+    lat1_rad = math.radians(lat1)
+    lat2_rad = math.radians(lat2)
+    d_lat = math.radians(lat2 - lat1)
+    d_lng = math.radians(lng2 - lng1)
+    # 哈维正弦公式
+    a = math.sin(d_lat / 2) ** 2 + math.cos(lat1_rad) * math.cos(lat2_rad) * math.sin(d_lng / 2) ** 2
+    c = 2 * math.atan2(math.sqrt(a), math.sqrt(1 - a))
+    distance = R * c
+    return distance
+
+
+def path_resampling(coord_paths: list, step_m: float = 20.0) -> list:
+    """
+    对多条路径经纬度序列按步长等距采样（全部路径一次向量化计算，见terrain_sampler.resample_lines）
+    :param coord_paths: 多条路径的coord_path（每条为[{"node_id":x, "lng":x, "lat":x}, ...]）
+    :param step_m: 采样步长（米）
+    :return: 每条路径的等距采样点序列 [{"lng":x, "lat":x, "distance_m":x}, ...]，少于2个点的路径返回[]
+    """
+    try:
+        # 1. 提取路径经纬度（lng在前，lat在后），少于2个点的路径不采样
+        lines = [[(p["lng"], p["lat"]) for p in coord_path] for coord_path in coord_paths]
+        valid = [k for k, line in enumerate(lines) if len(line) >= 2]
+        results = [[] for _ in lines]
+
+        # 2. 按累计地理距离等距采样，中间采样点经纬度保留6位小数
+        for k, (distances, lngs, lats) in zip(valid, resample_lines([lines[k] for k in valid], step_m)):
+            points = [{"lng": round(lng, 6), "lat": round(lat, 6), "distance_m": round(d, 2)}
+                      for d, lng, lat in zip(distances.tolist(), lngs.tolist(), lats.tolist())]
+            if len(points) == 1:
+                # 路径总长为0，仍返回起点和终点
+                points.append(dict(points[0]))
+
+            # 3. 起点、终点使用原始坐标
+            line = lines[k]
+            points[0].update(lng=line[0][0], lat=line[0][1])
+            points[-1].update(lng=line[-1][0], lat=line[-1][1])
+            results[k] = points
+        return results
+    except Exception as e:
+        print(f"路径等距采样失败：{str(e)}")
+        return [[] for _ in coord_paths]
+
+
+def path_20m_sampling(coord_path: list) -> list:
+    """
+    对路径经纬度序列做20米等距采样，生成采样点序列
+    :param coord_path: 路径规划返回的coord_path（[{"node_id":x, "lng":x, "lat":x}, ...]）
+    :return: 20米等距采样点序列 [{"lng":x, "lat":x, "distance_m":x}, ...]，distance_m为距起点累计距离
+    """
+    return path_resampling([coord_path], 20.0)[0]
+
+
+def get_point_elevation(lng: float, lat: float, db: Session, distance_threshold: float = 5.0) -> float:
+    """
+    空间插值获取单个采样点的高程（米），取最近N个高程点的平均值
+    :param lng/lat: 采样点经纬度
+    :param db: 数据库会话
+    :param distance_threshold: 空间匹配阈值（米），匹配范围内最近的点
+    :return: 插值高程（米），无匹配点返回0.0
+    """
+    try:
+        # 构建PostGIS POINT对象（SRID=4326）
+        point_geom = ST_SetSRID(ST_MakePoint(lng, lat), 4326)
+        # 空间查询：匹配阈值范围内的所有高程点，按距离升序排列（SRID 4326单位为度，阈值由米换算）
+        elevation_records = db.query(models.ElevationPoint.elevation_m).filter(
+            ST_DWithin(models.ElevationPoint.geom, point_geom, distance_threshold / METERS_PER_DEGREE)
+        ).order_by(
+            models.ElevationPoint.geom.distance(point_geom)
+        ).limit(3).all()  # 取最近3个点做插值
+        
+        if not elevation_records:
+            return 0.0
+        # 计算平均值（简单空间插值）
+        elevation_vals = [float(r[0]) for r in elevation_records]
+        avg_elevation = round(sum(elevation_vals) / len(elevation_vals), 2)
+        return avg_elevation
+    except Exception as e:
+        print(f"获取采样点高程失败：{str(e)}")
+        return 0.0
+
+
+def get_point_slope(lng: float, lat: float, db: Session, distance_threshold: float = 5.0) -> float:
+    """
+    空间插值获取单个采样点的坡度（度），取最近N个坡度点的平均值
+    :param lng/lat: 采样点经纬度
+    :param db: 数据库会话
+    :param distance_threshold: 空间匹配阈值（米）
+    :return: 插值坡度（度），无匹配点返回0.0，坡度非负
+    """
+    try:
+        # 构建PostGIS POINT对象（SRID=4326）
+        point_geom = ST_SetSRID(ST_MakePoint(lng, lat), 4326)
+        # 空间查询：匹配阈值范围内的所有坡度点，按距离升序排列（SRID 4326单位为度，阈值由米换算）
+        slope_records = db.query(models.SlopePoint.slope_deg).filter(
+            ST_DWithin(models.SlopePoint.geom, point_geom, distance_threshold / METERS_PER_DEGREE)
+        ).order_by(
+            models.SlopePoint.geom.distance(point_geom)
+        ).limit(3).all()  # 取最近3个点做插值
+        
+        if not slope_records:
+            return 0.0
+        # 计算平均值，坡度非负
+        slope_vals = [max(float(r[0]), 0.0) for r in slope_records]
+        avg_slope = round(sum(slope_vals) / len(slope_vals), 2)
+        return avg_slope
+    except Exception as e:
+        print(f"获取采样点坡度失败：{str(e)}")
+        return 0.0
+
+
+def _interpolate_with_sampler(sampler, sampling_points: list) -> list:
+    """分块栅格：全部采样点一次双线性插值（栅格范围外/无效像元按0处理，与数据库无匹配点一致）"""
+    elevations, slopes = sampler.sample([p["lng"] for p in sampling_points], [p["lat"] for p in sampling_points])
+    elevations = np.round(np.nan_to_num(elevations, nan=0.0), 2).tolist()
+    slopes = np.round(np.maximum(np.nan_to_num(slopes, nan=0.0), 0.0), 2).tolist()
+    return [{
+        "lng": point["lng"],
+        "lat": point["lat"],
+        "distance_m": point["distance_m"],
+        "elevation_m": elevation,
+        "slope_deg": slope
+    } for point, elevation, slope in zip(sampling_points, elevations, slopes)]
+
+
+def terrain_version(db: Session) -> tuple:
+    """采样结果所依赖的地形数据版本（栅格文件修改时间, 分块地形表版本），作为路径结果缓存键的一部分"""
+    return terrain_files_version(), terrain_store_version(db.get_bind())
+
+
+def path_interpolate_elevation_slope(sampling_points: list, db: Session) -> list:
+    """
+    对采样点序列批量插值高程和坡度，返回最终采样点结果
+    :param sampling_points: 20米等距采样点序列（path_20m_sampling返回结果）
+    :param db: 数据库会话（读取分块地形表或逐点查询时使用）
+    :return: 带高程/坡度的采样点序列
+    """
+    try:
+        sampler = get_terrain_sampler() or get_terrain_store(db.get_bind())
+        if sampler is not None and sampling_points:
+            return _interpolate_with_sampler(sampler, sampling_points)
+
+        result = []
+        for point in sampling_points:
+            lng = point["lng"]
+            lat = point["lat"]
+            # 插值高程和坡度
+            elevation = get_point_elevation(lng, lat, db)
+            slope = get_point_slope(lng, lat, db)
+            result.append({
+                "lng": lng,
+                "lat": lat,
+                "distance_m": point["distance_m"],  # 距起点累计距离（米）
+                "elevation_m": elevation,            # 高程（米）
+                "slope_deg": slope                   # 坡度（度）
+            })
+        return result
+    except Exception as e:
+        print(f"采样点高程坡度插值失败：{str(e)}")
+        return []
+
+
+def _profile_sampler(db: Session, interval: float):
+    """
+    剖面采样器：采样间隔比原始像元粗、且数据库分块地形有满足该间隔的降采样级别时使用金字塔（只读粗级别分块），
+    否则优先本地GeoTIFF（仅原始分辨率），最后回退数据库分块
+    """
+    files = get_terrain_sampler()
+    if files is not None and interval <= files.pixel_size_m:
+        return files
+    store = get_terrain_store(db.get_bind())
+    if store is not None and (files is None or store.for_resolution(interval)[1] > 0):
+        return store
+    return files
+
+
+def adaptive_profile(coord_path: list, db: Session, max_points: int = None, resolution_m: float = None):
+    """
+    按最大点数/目标分辨率自适应采样路径剖面：采样间隔取 max(20米, 目标分辨率, 总长/(最大点数-1))，
+    并选用像元边长不超过采样间隔的最粗地形金字塔级别（长路线只读取少量粗级别分块）
+    :param coord_path: 路径经纬度序列（[{"lng":x, "lat":x, ...}, ...]）
+    :param max_points: 剖面最多点数（≥2）
+    :param resolution_m: 目标分辨率（米）
+    :return: (带高程/坡度的采样点序列, {"interval_m", "level", "pixel_size_m", "point_count"})
+    """
+    line_coords = [(p["lng"], p["lat"]) for p in coord_path]
+    if len(line_coords) < 2:
+        return [], {"interval_m": None, "level": None, "pixel_size_m": None, "point_count": 0}
+    total_length = float(haversine_m(*np.asarray(line_coords[:-1]).T, *np.asarray(line_coords[1:]).T).sum())
+    interval = max(PROFILE_MIN_INTERVAL_M, resolution_m or 0.0,
+                   total_length / (max_points - 1) if max_points else 0.0)
+    distances, lngs, lats = resample_line(line_coords, interval)
+    sampling_points = [{"lng": round(lng, 6), "lat": round(lat, 6), "distance_m": round(d, 2)}
+                       for d, lng, lat in zip(distances.tolist(), lngs.tolist(), lats.tolist())]
+    info = {"interval_m": round(interval, 2), "level": None, "pixel_size_m": None, "point_count": len(sampling_points)}
+    sampler = _profile_sampler(db, interval)
+    if sampler is None:
+        return path_interpolate_elevation_slope(sampling_points, db), info
+    level_sampler, level, pixel_size = sampler.for_resolution(interval)
+    info.update(level=level, pixel_size_m=round(pixel_size, 2))
+    return _interpolate_with_sampler(level_sampler, sampling_points), info
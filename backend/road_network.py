@@ -0,0 +1,169 @@
+# backend/road_network.py
+"""
+路网紧凑边表：路网图快照的数据源（替代常驻内存的NetworkX图）
+- 每条路网边一行，属性按列存为NumPy数组；全部折线坐标拼接为一个(V,2)数组，按边的区间下标访问
+- 节点只保存被路网边引用的节点ID（升序）与经纬度，坐标缺失为NaN
+- 按通行方向展开为有向弧：主路/支路增加反向弧（累计爬升/下降互换）；同一有序节点对只保留最后出现的弧，
+  与原NetworkX DiGraph按边ID顺序添加时的覆盖结果一致
+- 路网边增删时按节点对替换行，生成新的边表（旧表不修改，正在读取旧快照的请求不受影响）
+"""
+import numpy as np
+import shapely
+
+# 双向通行的道路类型（其余类型如POI连接线按单向边处理）
+BIDIRECTIONAL_EDGE_TYPES = ("主路", "支路")
+# 数值属性列（顺序与装载行一致）
+ATTR_COLUMNS = ("length_m", "slope_avg", "max_grade", "ascent_m", "descent_m")
+
+
+def _gather(ptr: np.ndarray, coords: np.ndarray, rows: np.ndarray):
+    """按行号抽取折线坐标区间 → (新区间下标, 新坐标数组)"""
+    counts = ptr[rows + 1] - ptr[rows]
+    new_ptr = np.zeros(len(rows) + 1, dtype=np.int64)
+    np.cumsum(counts, out=new_ptr[1:])
+    flat = np.repeat(ptr[rows] - new_ptr[:-1], counts) + np.arange(new_ptr[-1])
+    return new_ptr, coords[flat]
+
+
+class RoadNetwork:
+    """
+    路网边表（只读，构建后不再修改）
+    :param columns: 列名 → 数组（edge_id/source/target/ATTR_COLUMNS/type_code），行按edge_id升序
+    :param type_names: 道路类型名称表（type_code为其下标）
+    :param coord_ptr/coords: 第i条边的折线坐标为 coords[coord_ptr[i]:coord_ptr[i+1]]（[lng, lat]，数据库几何方向）
+    :param node_ids/lng/lat: 被引用节点ID（升序）与经纬度
+    :param terrain_version: 边表所含路网边的最近地形属性计算时间（terrain_update_time最大值），用于发现外部刷新的地形属性
+    """
+
+    def __init__(self, columns: dict, type_names: list, coord_ptr, coords, node_ids, lng, lat, terrain_version=None):
+        self.edge_id = columns["edge_id"]
+        self.source = columns["source"]
+        self.target = columns["target"]
+        self.length_m = columns["length_m"]
+        self.slope_avg = columns["slope_avg"]
+        self.max_grade = columns["max_grade"]
+        self.ascent_m = columns["ascent_m"]
+        self.descent_m = columns["descent_m"]
+        self.type_code = columns["type_code"]
+        self.type_names = type_names
+        self.coord_ptr = coord_ptr
+        self.coords = coords
+        self.node_ids = node_ids
+        self.lng = lng
+        self.lat = lat
+        self.terrain_version = terrain_version
+
+    # -------------------------- 构建 --------------------------
+    @classmethod
+    def from_rows(cls, rows: list, geoms, node_coords: dict, type_names: list = None,
+                  terrain_version=None) -> "RoadNetwork":
+        """
+        由数据库行构建边表
+        :param rows: [(edge_id, source, target, length_m, slope_avg, max_grade, ascent_m, descent_m, type), ...]
+        :param geoms: 与rows等长的shapely折线数组
+        :param node_coords: {node_id: (lng, lat)}，至少覆盖rows引用的节点（缺失的节点坐标为NaN）
+        :param type_names: 已有道路类型名称表（在其后追加新类型，保证已有type_code不变）
+        :param terrain_version: rows中terrain_update_time的最大值
+        """
+        names = list(type_names or [])
+        code_of = {name: i for i, name in enumerate(names)}
+        columns = {"edge_id": [], "source": [], "target": [], "type_code": [], **{key: [] for key in ATTR_COLUMNS}}
+        for edge_id, source, target, *values, edge_type in rows:
+            columns["edge_id"].append(edge_id)
+            columns["source"].append(source)
+            columns["target"].append(target)
+            for key, value in zip(ATTR_COLUMNS, values):
+                columns[key].append(float(value or 0))
+            edge_type = edge_type or ""
+            if edge_type not in code_of:
+                code_of[edge_type] = len(names)
+                names.append(edge_type)
+            columns["type_code"].append(code_of[edge_type])
+        columns = {key: np.array(values, dtype=np.int16 if key == "type_code" else
+                                 np.int64 if key in ("edge_id", "source", "target") else np.float64)
+                   for key, values in columns.items()}
+        coords, owner = shapely.get_coordinates(np.asarray(geoms, dtype=object), return_index=True)
+        coord_ptr = np.zeros(len(rows) + 1, dtype=np.int64)
+        np.cumsum(np.bincount(owner, minlength=len(rows)), out=coord_ptr[1:])
+        node_ids = np.unique(np.concatenate((columns["source"], columns["target"])))
+        lng, lat = (np.array([node_coords.get(int(v), (np.nan, np.nan))[k] for v in node_ids], dtype=np.float64)
+                    for k in (0, 1))
+        return cls._sorted(columns, names, coord_ptr, coords, node_ids, lng, lat, terrain_version)
+
+    @classmethod
+    def _sorted(cls, columns, type_names, coord_ptr, coords, node_ids, lng, lat, terrain_version) -> "RoadNetwork":
+        """行按edge_id升序排列（同一节点对多条边时按边ID顺序覆盖）"""
+        order = np.argsort(columns["edge_id"], kind="stable")
+        if not np.array_equal(order, np.arange(len(order))):
+            columns = {key: values[order] for key, values in columns.items()}
+            coord_ptr, coords = _gather(coord_ptr, coords, order)
+        return cls(columns, type_names, coord_ptr, coords, node_ids, lng, lat, terrain_version)
+
+    def replace_pair(self, u: int, v: int, rows: list, geoms, node_coords: dict,
+                     terrain_version=None) -> "RoadNetwork":
+        """
+        生成新边表：删除u、v之间（任意方向）的全部边，加入rows（该节点对在数据库中的现状）
+        :param node_coords: rows引用的、当前边表中没有的节点坐标（见missing_nodes）
+        :param terrain_version: rows中terrain_update_time的最大值
+        :return: 新的RoadNetwork（当前对象不变）
+        """
+        keep = np.flatnonzero(~(((self.source == u) & (self.target == v)) | ((self.source == v) & (self.target == u))))
+        kept_ptr, kept_coords = _gather(self.coord_ptr, self.coords, keep)
+        added = RoadNetwork.from_rows(rows, geoms, node_coords, self.type_names)
+        columns = {key: np.concatenate((getattr(self, key)[keep], getattr(added, key)))
+                   for key in ("edge_id", "source", "target", "type_code", *ATTR_COLUMNS)}
+        coord_ptr = np.concatenate((kept_ptr, kept_ptr[-1] + added.coord_ptr[1:]))
+        coords = np.concatenate((kept_coords, added.coords))
+        # 节点表：保留仍被引用的节点（删除边后遗留的孤立节点同步移除）
+        node_ids = np.unique(np.concatenate((columns["source"], columns["target"])))
+        lng = np.full(len(node_ids), np.nan)
+        lat = np.full(len(node_ids), np.nan)
+        # 当前边表已有的节点沿用原坐标，新节点取node_coords
+        for table in (added, self):
+            hit = np.isin(node_ids, table.node_ids)
+            at = np.searchsorted(table.node_ids, node_ids[hit])
+            lng[hit], lat[hit] = table.lng[at], table.lat[at]
+        versions = [t for t in (self.terrain_version, terrain_version) if t is not None]
+        return RoadNetwork._sorted(columns, added.type_names, coord_ptr, coords, node_ids, lng, lat,
+                                   max(versions) if versions else None)
+
+    def missing_nodes(self, node_ids: list) -> list:
+        """给定节点中不在当前边表节点集合内的节点（需要另行加载坐标）"""
+        return [node_id for node_id in node_ids if not np.isin(node_id, self.node_ids)]
+
+    # -------------------------- 读取 --------------------------
+    @property
+    def edge_count(self) -> int:
+        return len(self.edge_id)
+
+    @property
+    def nbytes(self) -> int:
+        """边表全部数组占用的字节数"""
+        arrays = (self.edge_id, self.source, self.target, self.type_code, self.coord_ptr, self.coords,
+                  self.node_ids, self.lng, self.lat, *(getattr(self, key) for key in ATTR_COLUMNS))
+        return sum(a.nbytes for a in arrays)
+
+    def arcs(self):
+        """
+        按通行方向展开的有向弧：(起点ID数组, 终点ID数组, 边表行号数组, 是否逆几何方向数组)
+        顺序为逐行“正向弧、反向弧”，同一有序节点对只保留最后出现的弧
+        """
+        bidirectional = np.isin(self.type_code, [i for i, name in enumerate(self.type_names)
+                                                 if name in BIDIRECTIONAL_EDGE_TYPES])
+        rows = np.arange(self.edge_count)
+        back = rows[bidirectional]
+        # 排序键：正向弧2i，反向弧2i+1
+        key = np.concatenate((2 * rows, 2 * back + 1))
+        tails = np.concatenate((self.source, self.target[back]))
+        heads = np.concatenate((self.target, self.source[back]))
+        order = np.argsort(key, kind="stable")
+        tails, heads, key = tails[order], heads[order], key[order]
+        # 逆序后取每个节点对首次出现的位置，即原顺序中最后出现的弧
+        _, last = np.unique(np.stack((tails, heads), axis=1)[::-1], axis=0, return_index=True)
+        keep = np.sort(len(key) - 1 - last)
+        return tails[keep], heads[keep], key[keep] // 2, (key[keep] % 2).astype(bool)
+
+    def line_coords(self, row: int, reverse: bool = False) -> np.ndarray:
+        """第row条边的折线坐标（reverse=True时按反方向）"""
+        coords = self.coords[self.coord_ptr[row]:self.coord_ptr[row + 1]]
+        return coords[::-1] if reverse else coords
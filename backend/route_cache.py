@@ -0,0 +1,123 @@
+# backend/route_cache.py
+"""
+路径规划结果缓存（LRU + 过期时间）
+- 键：（图版本, 起点, 终点, 策略, α, 地形版本），起终点为节点ID或吸附点（边ID + 沿边比例）
+- 地形版本随栅格文件修改时间/分块地形表更新而变化，地形重新导入后不再返回旧的高程/坡度采样结果
+- 值：搜索结果、路径边详情/统计信息、20米采样结果，供/path-planning与GPX导出等接口共用
+- 同一键的并发请求只计算一次（single-flight），其余请求等待同一次计算的结果
+- 路网图快照更新后，旧版本的缓存项整体清除
+"""
+import threading
+import time
+from collections import OrderedDict
+
+# 默认最多缓存的路线数
+DEFAULT_MAX_ENTRIES = 256
+# 默认缓存项存活时间（秒）
+DEFAULT_TTL_SECONDS = 600
+
+
+def route_key(graph_version: int, start, end, strategy: str, alpha: float, terrain_version=None) -> tuple:
+    """由图版本、起终点吸附结果（SnapPoint）、策略、α与地形数据版本（path_sampling.terrain_version）构造缓存键"""
+    def endpoint(snap):
+        if snap.node_id is not None:
+            return ("node", snap.node_id)
+        return ("edge", snap.edge_id, round(snap.fraction, 6))
+
+    return graph_version, endpoint(start), endpoint(end), strategy, alpha, terrain_version
+
+
+class _Flight:
+    """进行中的一次计算（其他等待者在event上阻塞）"""
+
+    def __init__(self):
+        self.event = threading.Event()
+        self.value = None
+        self.error = None
+
+
+class RouteCache:
+    """
+    路径规划结果缓存
+    :param max_entries: 最多缓存项数（超出按最久未使用淘汰）
+    :param ttl_seconds: 缓存项存活时间（秒）
+    """
+
+    def __init__(self, max_entries: int = DEFAULT_MAX_ENTRIES, ttl_seconds: float = DEFAULT_TTL_SECONDS):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._entries = OrderedDict()  # 键 → (写入时间, 值)
+        self._inflight = {}            # 键 → _Flight
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0  # 等待其他请求进行中计算的次数
+        self.evictions = 0
+
+    def get_or_compute(self, key: tuple, compute):
+        """
+        命中则直接返回，否则调用compute()计算并缓存；compute抛出的异常不缓存，并传递给同键的等待者
+        :return: (值, 是否命中缓存)
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                if time.monotonic() - entry[0] <= self.ttl_seconds:
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return entry[1], True
+                del self._entries[key]
+                self.evictions += 1
+            flight = self._inflight.get(key)
+            owner = flight is None
+            if owner:
+                flight = self._inflight[key] = _Flight()
+                self.misses += 1
+            else:
+                self.coalesced += 1
+        if not owner:
+            flight.event.wait()
+            if flight.error is not None:
+                raise flight.error
+            return flight.value, True
+
+        try:
+            flight.value = compute()
+        except BaseException as e:
+            flight.error = e
+            raise
+        else:
+            with self._lock:
+                self._entries[key] = (time.monotonic(), flight.value)
+                while len(self._entries) > self.max_entries:
+                    self._entries.popitem(last=False)
+                    self.evictions += 1
+        finally:
+            with self._lock:
+                self._inflight.pop(key, None)
+            flight.event.set()
+        return flight.value, False
+
+    def on_snapshot(self, snapshot) -> None:
+        """路网图快照发布回调：清除其他图版本的缓存项（键的第一项为图版本）"""
+        with self._lock:
+            stale = [key for key in self._entries if key[0] != snapshot.version]
+            for key in stale:
+                del self._entries[key]
+            self.evictions += len(stale)
+
+    @property
+    def status(self) -> dict:
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "ttl_seconds": self.ttl_seconds,
+                "in_flight": len(self._inflight),
+                "hits": self.hits,
+                "misses": self.misses,
+                "coalesced": self.coalesced,
+                "evictions": self.evictions,
+                "hit_rate": round(self.hits / total, 4) if total else 0.0
+            }
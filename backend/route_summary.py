@@ -0,0 +1,87 @@
+# backend/route_summary.py
+"""
+路径搜索结果 → 接口返回结构（路径边详情、坐标序列、统计信息）
+- 只读取路网图快照中的RoutingEngine/SnapIndex，不访问数据库，可在批量规划的工作进程中直接调用
+"""
+from snapping import SnapPoint
+
+
+def summarize_route(engine, route, alpha: float) -> dict:
+    """
+    将引擎搜索结果展开为接口返回结构
+    :param engine: 路网图快照中的RoutingEngine
+    :param route: engine.shortest_path返回的RouteResult
+    :param alpha: 本次搜索使用的坡度权重α
+    :return: {"path_edges": [...], "coord_path": [...], "statistics": {...}}
+    """
+    path_edges = [engine.edge_detail(pos, alpha) for pos in route.edge_positions]
+    coord_path = []
+    for node_id in route.node_path:
+        coord = engine.node_coord(node_id)
+        if coord:
+            coord_path.append({"node_id": node_id, "lng": coord[0], "lat": coord[1]})
+    return {
+        "path_edges": path_edges,
+        "coord_path": coord_path,
+        "statistics": _path_statistics(path_edges, len(route.node_path))
+    }
+
+
+def summarize_snapped_route(engine, snap_index, route, start: SnapPoint, end: SnapPoint, alpha: float) -> dict:
+    """
+    吸附路线展开为接口返回结构：起点部分边 + 图内路径 + 终点部分边，吸附点在coord_path中node_id为None
+    :return: {"node_path", "path_edges", "coord_path", "statistics"}（字段含义同summarize_route）
+    """
+    def partial(part):
+        pos, portion, f0, f1 = part
+        detail = engine.edge_detail(pos, alpha)
+        for key in ("length_m", "ascent_m", "descent_m", "weight"):
+            detail[key] = round(detail[key] * portion, 2)
+        detail["portion"] = round(portion, 4)
+        coords = snap_index.partial_coords(int(engine.edge_id[pos]), f0, f1)
+        return detail, [{"node_id": None, "lng": lng, "lat": lat} for lng, lat in coords]
+
+    if route.direct is not None:
+        detail, coords = partial(route.direct)
+        return {"node_path": [], "path_edges": [detail], "coord_path": coords,
+                "statistics": _path_statistics([detail], 0)}
+
+    path_edges, coord_path = [], []
+    head_coords = tail_coords = []
+    if route.head is not None:
+        detail, head_coords = partial(route.head)
+        path_edges.append(detail)
+    if route.route is not None:
+        node_path = route.route.node_path
+        path_edges += [engine.edge_detail(pos, alpha) for pos in route.route.edge_positions]
+    else:
+        meeting = start.node_id if start.node_id is not None else end.node_id
+        if meeting is None:
+            meeting = int(engine.node_ids[engine.indices[route.head[0]]])
+        node_path = [meeting]
+    if route.tail is not None:
+        detail, tail_coords = partial(route.tail)
+        path_edges.append(detail)
+    # 部分边几何的端点即相邻真实节点，去掉重复点
+    coord_path += head_coords[:-1]
+    for node_id in node_path:
+        coord = engine.node_coord(node_id)
+        if coord:
+            coord_path.append({"node_id": node_id, "lng": coord[0], "lat": coord[1]})
+    coord_path += tail_coords[1:]
+    virtual_count = (route.head is not None) + (route.tail is not None)
+    return {"node_path": node_path, "path_edges": path_edges, "coord_path": coord_path,
+            "statistics": _path_statistics(path_edges, len(node_path) + virtual_count)}
+
+
+def _path_statistics(path_edges: list, node_count: int) -> dict:
+    """路径边详情 → 统计信息（总长度、平均坡度、累计爬升/下降、节点/边数）"""
+    edge_count = len(path_edges)
+    return {
+        "total_length_m": round(sum(e["length_m"] for e in path_edges), 2),
+        "avg_slope_deg": round(sum(e["slope_avg"] for e in path_edges) / edge_count, 2) if edge_count > 0 else 0.0,  # 避免除0
+        "total_ascent_m": round(sum(e["ascent_m"] for e in path_edges), 2),
+        "total_descent_m": round(sum(e["descent_m"] for e in path_edges), 2),
+        "node_count": node_count,
+        "edge_count": edge_count
+    }
@@ -0,0 +1,281 @@
+# backend/routing_engine.py
+"""
+数组化路径规划内核：节点ID重映射 + CSR邻接数组（NumPy）+ A*搜索
+- 直接由路网边表（road_network.RoadNetwork）生成，边属性按列存为NumPy数组，不再为每条边保存属性字典
+- 各策略的边权重数组按α预计算一次并缓存，搜索时不再回调Python权重函数
+- A*启发函数为哈维正弦直线距离 × 全图最小“权重/直线距离”比，保证可采纳
+- A*在度为2链节点收缩后的核心图上搜索（chain_contraction.ChainIndex），结果展开回原始CSR边下标
+- 预计算弱/强连通分量（connectivity.ComponentIndex），必然不可达的起终点不搜索直接拒绝
+"""
+import heapq
+import math
+
+import numpy as np
+
+from chain_contraction import ChainIndex
+from connectivity import ComponentIndex
+from road_network import RoadNetwork
+
+# 地球半径（米），与main.haversine_distance保持一致
+EARTH_RADIUS_M = 6371000.0
+# 每个引擎最多缓存的α权重数组个数（shortest固定α=0，gentlest随系统配置变化）
+MAX_CACHED_WEIGHTS = 4
+
+
+class NoPathError(Exception):
+    """起点到终点无可达路径"""
+
+
+def haversine_array(lng1, lat1, lng2, lat2) -> np.ndarray:
+    """哈维正弦公式（向量化版本），输入为经纬度数组或标量，返回距离（米）"""
+    lng1, lat1, lng2, lat2 = map(np.radians, (lng1, lat1, lng2, lat2))
+    a = np.sin((lat2 - lat1) / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin((lng2 - lng1) / 2) ** 2
+    return 2 * EARTH_RADIUS_M * np.arcsin(np.sqrt(np.clip(a, 0.0, 1.0)))
+
+
+class RouteResult:
+    """单次搜索结果：节点ID序列、CSR边下标序列、代价、已确定（出堆）节点数"""
+
+    def __init__(self, node_path: list, edge_positions: list, cost: float, settled: int):
+        self.node_path = node_path
+        self.edge_positions = edge_positions
+        self.cost = cost
+        self.settled = settled
+
+
+class RoutingEngine:
+    """
+    CSR路径规划引擎（只读，随路网图快照一起构建）
+    :param network: 路网边表（road_network.RoadNetwork），按通行方向展开为有向弧后生成CSR，
+                    节点坐标缺失时该节点启发值为0
+    """
+
+    def __init__(self, network: RoadNetwork):
+        # 1. 节点ID重映射：原始节点ID ↔ 连续下标 0..n-1（边表引用的节点，按ID升序）
+        self.node_ids = network.node_ids
+        self.index_of = {node_id: i for i, node_id in enumerate(self.node_ids.tolist())}
+        n = len(self.node_ids)
+        self.lng = network.lng
+        self.lat = network.lat
+
+        # 2. 有向弧按起点下标排序后生成CSR：indptr[u]..indptr[u+1] 为u的出边区间
+        tails, heads, rows, reverse = network.arcs()
+        src = np.searchsorted(self.node_ids, tails)
+        dst = np.searchsorted(self.node_ids, heads)
+        order = np.argsort(src, kind="stable")
+        self.src = src[order]
+        self.indices = dst[order]
+        self.indptr = np.zeros(n + 1, dtype=np.int64)
+        np.cumsum(np.bincount(self.src, minlength=n), out=self.indptr[1:])
+        self.edge_row = rows[order]          # CSR边 → 边表行号（折线坐标等）
+        self.edge_reversed = reverse[order]  # CSR边方向是否与边表几何方向相反
+
+        # 3. 边属性列存（反向通行时累计爬升/下降互换）
+        self.length_m = network.length_m[self.edge_row]
+        self.slope_avg = network.slope_avg[self.edge_row]
+        self.max_grade = network.max_grade[self.edge_row]
+        self.ascent_m = np.where(self.edge_reversed, network.descent_m[self.edge_row], network.ascent_m[self.edge_row])
+        self.descent_m = np.where(self.edge_reversed, network.ascent_m[self.edge_row], network.descent_m[self.edge_row])
+        self.edge_id = network.edge_id[self.edge_row]
+        self.type_names = network.type_names
+        self.type_code = network.type_code[self.edge_row]
+
+        # 搜索内循环使用的Python列表视图（比逐个读取NumPy标量快一个数量级）
+        self._indptr_list = self.indptr.tolist()
+        self._indices_list = self.indices.tolist()
+        self._weights = {}  # α → (权重列表, 启发函数缩放系数)
+        self._reverse = None  # 反向CSR邻接（按需构建）
+        self._chain_weights = {}  # α → (超级边权重列表, 链上权重前缀和列表)
+        # 4. 链收缩核心图（A*搜索使用）
+        rev_indptr, rev_tails, rev_positions = self.reverse_adjacency
+        self.chains = ChainIndex(self._indptr_list, self._indices_list, self.src.tolist(), rev_indptr, rev_positions)
+        self._core_indices = self.chains.se_dst
+        self._core_lng = self.lng[self.chains.core_nodes]
+        self._core_lat = self.lat[self.chains.core_nodes]
+        # 5. 连通分量标签（不可达判定、路网健康检查）
+        self.components = ComponentIndex(self._indptr_list, self._indices_list, rev_indptr, rev_tails)
+
+    @property
+    def node_count(self) -> int:
+        return len(self.node_ids)
+
+    @property
+    def edge_count(self) -> int:
+        return len(self.indices)
+
+    def has_node(self, node_id: int) -> bool:
+        return node_id in self.index_of
+
+    def check_reachable(self, source_id: int, target_id: int) -> None:
+        """按连通分量标签O(1)排除必然不可达的起终点（抛出NoPathError），其余情况仍需搜索确认"""
+        if self.components.unreachable(self.index_of[source_id], self.index_of[target_id]):
+            raise NoPathError(f"起点{source_id}到终点{target_id}不在同一连通范围内，无可达路径")
+
+    @property
+    def adjacency(self):
+        """搜索用CSR邻接（Python列表视图）：(indptr, indices)"""
+        return self._indptr_list, self._indices_list
+
+    @property
+    def reverse_adjacency(self):
+        """
+        反向搜索用CSR邻接（Python列表视图，首次访问时构建）：(indptr, tails, positions)
+        rev_indptr[v]..rev_indptr[v+1] 为v的入边区间，tails为入边起点下标，positions为对应的正向CSR边下标
+        """
+        if self._reverse is None:
+            order = np.argsort(self.indices, kind="stable")
+            indptr = np.zeros(self.node_count + 1, dtype=np.int64)
+            np.cumsum(np.bincount(self.indices, minlength=self.node_count), out=indptr[1:])
+            self._reverse = (indptr.tolist(), self.src[order].tolist(), order.tolist())
+        return self._reverse
+
+    # -------------------------- 权重 --------------------------
+    def edge_weights(self, alpha: float) -> np.ndarray:
+        """边权重数组：length_m × (1 + α × slope_avg)"""
+        return self.length_m * (1.0 + alpha * self.slope_avg)
+
+    def weights_for(self, alpha: float):
+        """按α获取（并缓存）搜索用权重列表与启发函数缩放系数：(weights, h_scale)"""
+        cached = self._weights.get(alpha)
+        if cached is not None:
+            return cached
+        weights = self.edge_weights(alpha)
+        # 启发函数缩放系数：min(边权重 / 边两端直线距离)，保证 h(v) ≤ 任意路径真实代价
+        straight = haversine_array(self.lng[self.src], self.lat[self.src],
+                                   self.lng[self.indices], self.lat[self.indices])
+        valid = np.isfinite(straight) & (straight > 0)
+        h_scale = float(np.min(weights[valid] / straight[valid])) if valid.any() else 0.0
+        if len(self._weights) >= MAX_CACHED_WEIGHTS:
+            self._weights.pop(next(iter(self._weights)))
+        cached = (weights.tolist(), max(h_scale, 0.0))
+        self._weights[alpha] = cached
+        return cached
+
+    def chain_weights_for(self, alpha: float):
+        """按α获取（并缓存）核心图超级边权重列表与链上权重前缀和列表"""
+        cached = self._chain_weights.get(alpha)
+        if cached is None:
+            if len(self._chain_weights) >= MAX_CACHED_WEIGHTS:
+                self._chain_weights.pop(next(iter(self._chain_weights)))
+            cached = self._chain_weights[alpha] = self.chains.weights(self.edge_weights(alpha))
+        return cached
+
+    def heuristic(self, target: int, h_scale: float) -> list:
+        """各节点到目标节点的启发值（米×缩放系数），坐标缺失的节点取0"""
+        if h_scale <= 0 or not np.isfinite(self.lng[target]):
+            return [0.0] * self.node_count
+        h = haversine_array(self.lng, self.lat, self.lng[target], self.lat[target]) * h_scale
+        return np.nan_to_num(h, nan=0.0).tolist()
+
+    # -------------------------- 搜索 --------------------------
+    def shortest_path(self, source_id: int, target_id: int, alpha: float) -> RouteResult:
+        """
+        A*搜索 source_id → target_id 的最小权重路径（在链收缩核心图上搜索，起终点可为链内部节点）
+        :param source_id: 起点节点ID（原始ID）
+        :param target_id: 终点节点ID（原始ID）
+        :param alpha: 坡度权重α（shortest策略传0）
+        :return: RouteResult（边下标为原始CSR边下标，settled为核心图已确定节点数）；不可达时抛出NoPathError
+        """
+        source = self.index_of[source_id]
+        target = self.index_of[target_id]
+        if source == target:
+            return RouteResult([source_id], [], 0.0, 1)
+        self.check_reachable(source_id, target_id)
+        chains = self.chains
+        _, h_scale = self.weights_for(alpha)
+        weights, cum = self.chain_weights_for(alpha)
+        h = self._core_heuristic(target, h_scale)
+        indptr, indices = chains.core_indptr, self._core_indices
+
+        # 虚拟终点goal：由可到达终点的核心节点（或沿链直达）接入
+        goal = chains.core_node_count
+        entries = chains.entries(target, cum)
+        dist = [math.inf] * (goal + 1)
+        pred_edge = {}   # 核心节点下标 → 到达该节点的超级边下标
+        start_path = {}  # 由起点直接到达的核心节点 → 起点至该节点的原始CSR边下标序列
+        goal_path = None  # (接入核心节点或None, 接入段原始CSR边下标序列)
+        heap = []
+        for u, cost, positions in chains.exits(source, cum):
+            if cost < dist[u]:
+                dist[u] = cost
+                start_path[u] = positions
+                heapq.heappush(heap, (cost + h[u], cost, u))
+        direct = chains.direct(source, target, cum)
+        if direct is not None:
+            dist[goal] = direct[0]
+            goal_path = (None, direct[1])
+            heapq.heappush(heap, (direct[0], direct[0], goal))
+        settled = 0
+        while heap:
+            _, g, u = heapq.heappop(heap)
+            if g > dist[u]:
+                continue  # 过期堆元素（懒删除）
+            if u == goal:
+                return self._expand_core_result(source_id, goal_path, pred_edge, start_path, g, settled)
+            settled += 1
+            entry = entries.get(u)
+            if entry is not None and g + entry[0] < dist[goal]:
+                dist[goal] = g + entry[0]
+                goal_path = (u, entry[1])
+                heapq.heappush(heap, (dist[goal], dist[goal], goal))
+            for e in range(indptr[u], indptr[u + 1]):
+                v = indices[e]
+                nd = g + weights[e]
+                if nd < dist[v]:
+                    dist[v] = nd
+                    pred_edge[v] = e
+                    start_path.pop(v, None)
+                    heapq.heappush(heap, (nd + h[v], nd, v))
+        raise NoPathError(f"起点{source_id}到终点{target_id}无可达路径")
+
+    def _core_heuristic(self, target: int, h_scale: float) -> list:
+        """核心图各节点到目标节点（原始下标）的启发值，虚拟终点为0"""
+        n = self.chains.core_node_count
+        if h_scale <= 0 or not np.isfinite(self.lng[target]):
+            return [0.0] * (n + 1)
+        h = haversine_array(self._core_lng, self._core_lat, self.lng[target], self.lat[target]) * h_scale
+        return np.nan_to_num(h, nan=0.0).tolist() + [0.0]
+
+    def _expand_core_result(self, source_id: int, goal_path, pred_edge: dict, start_path: dict,
+                            cost: float, settled: int) -> RouteResult:
+        """核心图搜索结果 → 原始CSR边下标序列与节点ID序列"""
+        u, tail = goal_path
+        if u is None:
+            edge_positions = tail
+        else:
+            super_edges = []
+            while u in pred_edge:
+                e = pred_edge[u]
+                super_edges.append(e)
+                u = self.chains.se_src[e]
+            edge_positions = list(start_path[u])
+            for e in reversed(super_edges):
+                edge_positions += self.chains.positions(e)
+            edge_positions += tail
+        node_path = [source_id] + [int(self.node_ids[self.indices[pos]]) for pos in edge_positions]
+        return RouteResult(node_path, edge_positions, cost, settled)
+
+    # -------------------------- 结果展开 --------------------------
+    def edge_detail(self, pos: int, alpha: float) -> dict:
+        """CSR边下标 → 路径边详情（与原path_edges字段一致）"""
+        length_m = float(self.length_m[pos])
+        slope_avg = float(self.slope_avg[pos])
+        return {
+            "edge_id": int(self.edge_id[pos]),
+            "source": int(self.node_ids[self.src[pos]]),
+            "target": int(self.node_ids[self.indices[pos]]),
+            "length_m": round(length_m, 2),
+            "slope_avg": slope_avg,
+            "max_grade": float(self.max_grade[pos]),
+            "ascent_m": float(self.ascent_m[pos]),
+            "descent_m": float(self.descent_m[pos]),
+            "type": self.type_names[self.type_code[pos]],
+            "weight": round(length_m * (1 + alpha * slope_avg), 2)
+        }
+
+    def node_coord(self, node_id: int):
+        """节点ID → (lng, lat)，坐标缺失时返回None"""
+        i = self.index_of.get(node_id)
+        if i is None or not np.isfinite(self.lng[i]):
+            return None
+        return float(self.lng[i]), float(self.lat[i])
@@ -0,0 +1,282 @@
+# backend/snapping.py
+"""
+坐标吸附：任意经纬度 → 最近路网边上的投影点（虚拟节点），路径规划可直接接受[lng, lat]
+- 随路网图快照一起构建：路网点、路网边折线线段各建一棵STR树（shapely.STRtree），单次查询为微秒级，无需访问PostGIS
+- 坐标先按快照中心纬度做等距圆柱投影（米），在投影平面内求最近线段与垂足
+- 吸附点把所在边分成两段，按沿边几何距离的比例分摊长度/权重/爬升，与图中真实节点之间的代价由虚拟边补齐
+"""
+import math
+
+import numpy as np
+import shapely
+
+from routing_engine import EARTH_RADIUS_M, NoPathError, haversine_array
+
+# 默认最大吸附距离（米），超出视为不在路网附近
+DEFAULT_MAX_SNAP_M = 500.0
+# 吸附点距边端点不足该距离（米）时直接吸附到端点节点，避免生成极短的虚拟边
+NODE_SNAP_TOLERANCE_M = 0.5
+
+
+class SnapPoint:
+    """
+    吸附结果
+    - 吸附到节点：node_id为节点ID，edge_id为None
+    - 吸附到边内部：edge_id为路网边ID，fraction为沿边几何（正向）从起点算起的比例，
+      forward/backward为该边正向/反向通行对应的CSR边下标（不可通行为-1）
+    """
+
+    def __init__(self, lng: float, lat: float, distance_m: float, node_id: int = None,
+                 edge_id: int = None, fraction: float = 0.0, forward: int = -1, backward: int = -1):
+        self.lng = lng
+        self.lat = lat
+        self.distance_m = distance_m
+        self.node_id = node_id
+        self.edge_id = edge_id
+        self.fraction = fraction
+        self.forward = forward
+        self.backward = backward
+
+    def to_dict(self) -> dict:
+        return {
+            "lng": round(self.lng, 7),
+            "lat": round(self.lat, 7),
+            "snap_distance_m": round(self.distance_m, 2),
+            "node_id": self.node_id,
+            "edge_id": self.edge_id,
+            "fraction": round(self.fraction, 4) if self.edge_id is not None else None
+        }
+
+
+class SnappedRoute:
+    """
+    吸附点之间的路线：head（起点所在边的部分）+ route（图内路径，可为None）+ tail（终点所在边的部分）
+    head/tail/direct为 (CSR边下标, 通行比例, 几何起始比例, 几何结束比例)，不存在时为None
+    """
+
+    def __init__(self, cost: float, route=None, head=None, tail=None, direct=None, settled: int = 0):
+        self.cost = cost
+        self.route = route
+        self.head = head
+        self.tail = tail
+        self.direct = direct
+        self.settled = settled
+
+
+class SnapIndex:
+    """
+    路网空间索引（只读，随快照构建）
+    :param network: 路网边表（road_network.RoadNetwork），提供折线坐标（缺失时按两端点直线处理）
+    :param engine: 同一快照的RoutingEngine
+    """
+
+    def __init__(self, network, engine):
+        self._engine = engine
+        valid = np.isfinite(engine.lng) & np.isfinite(engine.lat)
+        self._lat0 = float(np.mean(engine.lat[valid])) if valid.any() else 0.0
+        self._kx = math.radians(1.0) * EARTH_RADIUS_M * math.cos(math.radians(self._lat0))
+        self._ky = math.radians(1.0) * EARTH_RADIUS_M
+
+        # 1. 节点索引
+        self._node_index = np.flatnonzero(valid)
+        x, y = self._project(engine.lng[valid], engine.lat[valid])
+        self._node_tree = shapely.STRtree(shapely.points(x, y))
+
+        # 2. 边线段索引：同一路网边的正反向只索引一次（以先出现的方向为几何正向）
+        self._edge_span = {}        # 边ID → (首个折点在全局折点数组中的下标, 折点数)
+        self._edge_positions = {}   # 边ID → [正向CSR下标, 反向CSR下标]
+        parts = []
+        first = 0
+        for pos in range(engine.edge_count):
+            edge_id = int(engine.edge_id[pos])
+            u, v = int(engine.src[pos]), int(engine.indices[pos])
+            if edge_id in self._edge_positions:
+                self._edge_positions[edge_id][1] = pos
+                continue
+            coords = network.line_coords(int(engine.edge_row[pos]), bool(engine.edge_reversed[pos]))
+            if len(coords) < 2:
+                coords = ((engine.lng[u], engine.lat[u]), (engine.lng[v], engine.lat[v]))
+            coords = np.asarray(coords, dtype=np.float64)
+            if not np.isfinite(coords).all():
+                continue
+            self._edge_positions[edge_id] = [pos, -1]
+            self._edge_span[edge_id] = (first, len(coords))
+            parts.append(coords)
+            first += len(coords)
+        # 全局折点数组与边内累计距离（一次向量化计算，跨边的相邻折点不计距离）
+        self._vertices = np.concatenate(parts) if parts else np.empty((0, 2))
+        starts = np.array([span[0] for span in self._edge_span.values()], dtype=np.int64)
+        counts = np.array([span[1] for span in self._edge_span.values()], dtype=np.int64)
+        step = haversine_array(self._vertices[:-1, 0], self._vertices[:-1, 1],
+                               self._vertices[1:, 0], self._vertices[1:, 1])
+        step[starts[1:] - 1] = 0.0
+        cum = np.concatenate(([0.0], np.cumsum(step)))
+        self._vertex_cum = cum - np.repeat(cum[starts], counts) if len(starts) else cum
+        # 线段 = 同一条边内相邻折点对
+        is_seg_start = np.ones(len(self._vertices), dtype=bool)
+        is_seg_start[starts + counts - 1] = False
+        seg_first = np.flatnonzero(is_seg_start)
+        self._seg_first = seg_first
+        self._seg_edge = np.repeat(np.fromiter(self._edge_span.keys(), dtype=np.int64, count=len(starts)), counts - 1)
+        x, y = self._project(self._vertices[:, 0], self._vertices[:, 1])
+        self._seg_xy = np.column_stack((x[seg_first], y[seg_first], x[seg_first + 1], y[seg_first + 1]))
+        self._seg_tree = shapely.STRtree(shapely.linestrings(self._seg_xy.reshape(-1, 2, 2)))
+
+    @property
+    def segment_count(self) -> int:
+        return len(self._seg_edge)
+
+    def _project(self, lng, lat):
+        """经纬度 → 以快照中心纬度为基准的等距圆柱投影平面坐标（米）"""
+        return np.asarray(lng) * self._kx, np.asarray(lat) * self._ky
+
+    # -------------------------- 节点吸附 --------------------------
+    def nearest_nodes(self, lngs, lats):
+        """
+        批量查询最近路网节点
+        :return: (节点ID数组, 距离米数组)；图中无带坐标节点时返回None
+        """
+        if len(self._node_index) == 0:
+            return None
+        x, y = self._project(np.asarray(lngs, dtype=np.float64), np.asarray(lats, dtype=np.float64))
+        query, hit = self._node_tree.query_nearest(shapely.points(x, y), all_matches=False)
+        # query_nearest结果按查询点顺序排列，每个查询点一条
+        idx = np.empty(len(x), dtype=np.int64)
+        idx[query] = self._node_index[hit]
+        engine = self._engine
+        dist = haversine_array(engine.lng[idx], engine.lat[idx], lngs, lats)
+        return engine.node_ids[idx], np.atleast_1d(dist)
+
+    def nearest_node(self, lng: float, lat: float):
+        """最近路网节点：(节点ID, 距离米)；图中无带坐标节点时返回None"""
+        result = self.nearest_nodes([lng], [lat])
+        if result is None:
+            return None
+        return int(result[0][0]), float(result[1][0])
+
+    # -------------------------- 边吸附 --------------------------
+    def snap(self, lng: float, lat: float, max_distance_m: float = DEFAULT_MAX_SNAP_M):
+        """
+        吸附到最近路网边上的投影点
+        :return: SnapPoint；max_distance_m范围内无路网边时返回None
+        """
+        if self.segment_count == 0:
+            return None
+        px, py = self._project(lng, lat)
+        hits = self._seg_tree.query_nearest(shapely.Point(px, py), max_distance=max_distance_m, all_matches=False)
+        if len(hits) == 0:
+            return None
+        seg = int(hits[0])
+        x0, y0, x1, y1 = self._seg_xy[seg]
+        dx, dy = x1 - x0, y1 - y0
+        denom = dx * dx + dy * dy
+        r = min(max(((px - x0) * dx + (py - y0) * dy) / denom, 0.0), 1.0) if denom > 0 else 0.0
+
+        edge_id = int(self._seg_edge[seg])
+        coords, cum = self._edge_geometry(edge_id)
+        k = int(self._seg_first[seg]) - self._edge_span[edge_id][0]
+        snap_lng = coords[k, 0] + (coords[k + 1, 0] - coords[k, 0]) * r
+        snap_lat = coords[k, 1] + (coords[k + 1, 1] - coords[k, 1]) * r
+        distance_m = float(haversine_array(snap_lng, snap_lat, lng, lat))
+        offset = cum[k] + (cum[k + 1] - cum[k]) * r
+        total = cum[-1]
+        forward, backward = self._edge_positions[edge_id]
+        engine = self._engine
+
+        # 距端点足够近：直接吸附到端点节点
+        if total <= 0 or offset <= NODE_SNAP_TOLERANCE_M:
+            node = int(engine.node_ids[engine.src[forward]])
+        elif total - offset <= NODE_SNAP_TOLERANCE_M:
+            node = int(engine.node_ids[engine.indices[forward]])
+        else:
+            return SnapPoint(float(snap_lng), float(snap_lat), distance_m, edge_id=edge_id,
+                             fraction=float(offset / total), forward=forward, backward=backward)
+        node_lng, node_lat = engine.node_coord(node)
+        return SnapPoint(node_lng, node_lat, float(haversine_array(node_lng, node_lat, lng, lat)), node_id=node)
+
+    def partial_coords(self, edge_id: int, start: float, end: float) -> list:
+        """路网边正向几何上比例start → end之间的折线坐标（start > end时为反向），用于绘制虚拟边"""
+        coords, cum = self._edge_geometry(edge_id)
+        total = cum[-1]
+        lo, hi = sorted((start, end))
+        inner = [tuple(c) for c, d in zip(coords, cum) if lo * total < d < hi * total]
+        points = [self._point_at(edge_id, lo)] + [(float(x), float(y)) for x, y in inner] + [self._point_at(edge_id, hi)]
+        return points if start <= end else points[::-1]
+
+    def _edge_geometry(self, edge_id: int):
+        """路网边正向折线坐标 (k, 2) 与各折点累计距离（米）"""
+        first, count = self._edge_span[edge_id]
+        return self._vertices[first:first + count], self._vertex_cum[first:first + count]
+
+    def _point_at(self, edge_id: int, fraction: float):
+        coords, cum = self._edge_geometry(edge_id)
+        d = fraction * cum[-1]
+        return float(np.interp(d, cum, coords[:, 0])), float(np.interp(d, cum, coords[:, 1]))
+
+
+def _exits(engine, snap: SnapPoint, weights):
+    """起点吸附点 → 可离开的真实节点：[(节点下标, 代价, 部分边)]"""
+    if snap.node_id is not None:
+        return [(engine.index_of[snap.node_id], 0.0, None)]
+    t = snap.fraction
+    exits = []
+    if snap.forward >= 0:
+        exits.append((int(engine.indices[snap.forward]), (1 - t) * weights[snap.forward], (snap.forward, 1 - t, t, 1.0)))
+    if snap.backward >= 0:
+        exits.append((int(engine.indices[snap.backward]), t * weights[snap.backward], (snap.backward, t, t, 0.0)))
+    return exits
+
+
+def _entries(engine, snap: SnapPoint, weights):
+    """真实节点 → 终点吸附点：[(节点下标, 代价, 部分边)]"""
+    if snap.node_id is not None:
+        return [(engine.index_of[snap.node_id], 0.0, None)]
+    t = snap.fraction
+    entries = []
+    if snap.forward >= 0:
+        entries.append((int(engine.src[snap.forward]), t * weights[snap.forward], (snap.forward, t, 0.0, t)))
+    if snap.backward >= 0:
+        entries.append((int(engine.src[snap.backward]), (1 - t) * weights[snap.backward], (snap.backward, 1 - t, 1.0, t)))
+    return entries
+
+
+def snapped_route(engine, start: SnapPoint, end: SnapPoint, search, alpha: float) -> SnappedRoute:
+    """
+    吸附点之间的最小权重路线：枚举起点所在边的可离开端点 × 终点所在边的可进入端点（各至多2个），
+    端点之间调用search（CH或A*）求图内路径，加上虚拟边代价后取最小；同一条边上且方向可通行时直接沿边行走
+    :param search: search(起点节点ID, 终点节点ID) -> RouteResult，不可达抛出NoPathError
+    :return: SnappedRoute；不可达时抛出NoPathError
+    """
+    weights, _ = engine.weights_for(alpha)
+    best = None
+    settled = 0
+    # 同一条边：沿边直接到达
+    if start.edge_id is not None and start.edge_id == end.edge_id:
+        t0, t1 = start.fraction, end.fraction
+        pos = start.forward if t1 >= t0 else start.backward
+        if pos >= 0:
+            best = SnappedRoute(abs(t1 - t0) * weights[pos], direct=(pos, abs(t1 - t0), t0, t1))
+    inner_cache = {}
+    for s, c1, head in _exits(engine, start, weights):
+        for t, c2, tail in _entries(engine, end, weights):
+            if s == t:
+                route, inner = None, 0.0
+            else:
+                if (s, t) not in inner_cache:
+                    try:
+                        found = search(int(engine.node_ids[s]), int(engine.node_ids[t]))
+                        settled += found.settled
+                        inner_cache[(s, t)] = found
+                    except NoPathError:
+                        inner_cache[(s, t)] = None
+                route = inner_cache[(s, t)]
+                if route is None:
+                    continue
+                inner = route.cost
+            total = c1 + inner + c2
+            if best is None or total < best.cost:
+                best = SnappedRoute(total, route=route, head=head, tail=tail)
+    if best is None:
+        raise NoPathError("吸附点之间无可达路径")
+    best.settled = settled
+    return best
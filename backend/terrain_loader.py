@@ -0,0 +1,505 @@
+# backend/terrain_loader.py
+"""
+地形点（高程点/坡度点）CSV批量入库：PostgreSQL COPY + 分区并行 + 断点续传
+- CSV按字节范围切分为若干分区（边界对齐到行尾），多个连接并行把各分区COPY进临时中转表，再一条INSERT ... SELECT ST_MakePoint写入目标表
+- 每个分区的数据写入与检查点记录在同一事务内提交：导入中断后重新执行，只加载尚未提交的分区
+- 检查点以CSV内容MD5标识数据来源，CSV内容变化（重新生成了不同的地形数据）时清空目标表重新导入
+- 加载期间删除空间索引，全部分区完成后再重建索引并ANALYZE
+增量重新导入：栅格按固定大小分块计算内容指纹并记录，再次导入时只替换内容变化（及新增/消失）的分块范围内的点
+分块地形表（terrain_tiles）：每个栅格块一行压缩数组，同样按块指纹只写入变化的块；导入时同时构建2倍、4倍、8倍……降采样金字塔
+"""
+import hashlib
+import io
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+import numpy as np
+from sqlalchemy import text
+from sqlalchemy.dialects.postgresql import insert
+
+from models import TerrainTile
+from terrain_store import ensure_terrain_tiles_schema, pack_tile
+
+# 单个分区的目标字节数
+PARTITION_BYTES = 32 * 1024 * 1024
+# 默认并行连接数
+DEFAULT_LOAD_WORKERS = 4
+# 检查点表
+CHECKPOINT_TABLE = "terrain_load_checkpoints"
+# 分块指纹表
+FINGERPRINT_TABLE = "terrain_block_fingerprints"
+# 指纹分块边长（像元）
+FINGERPRINT_BLOCK_SIZE = 256
+# 分块地形金字塔最高降采样级别（第k级像元为原始像元的2^k倍）
+MAX_OVERVIEW_LEVEL = 8
+
+_CHECKPOINT_DDL = f"""
+CREATE TABLE IF NOT EXISTS {CHECKPOINT_TABLE} (
+    target_table VARCHAR(64) NOT NULL,
+    partition_no INTEGER NOT NULL,
+    source_md5 VARCHAR(32) NOT NULL,
+    row_count INTEGER NOT NULL,
+    done_time TIMESTAMP NOT NULL DEFAULT now(),
+    PRIMARY KEY (target_table, partition_no)
+)
+"""
+
+_FINGERPRINT_DDL = f"""
+CREATE TABLE IF NOT EXISTS {FINGERPRINT_TABLE} (
+    target_table VARCHAR(64) NOT NULL,
+    block_row INTEGER NOT NULL,
+    block_col INTEGER NOT NULL,
+    block_md5 VARCHAR(32) NOT NULL,
+    min_lon DOUBLE PRECISION NOT NULL,
+    min_lat DOUBLE PRECISION NOT NULL,
+    max_lon DOUBLE PRECISION NOT NULL,
+    max_lat DOUBLE PRECISION NOT NULL,
+    row_count INTEGER NOT NULL,
+    update_time TIMESTAMP NOT NULL DEFAULT now(),
+    PRIMARY KEY (target_table, block_row, block_col)
+)
+"""
+
+_UPSERT_FINGERPRINT_SQL = f"""
+INSERT INTO {FINGERPRINT_TABLE}
+    (target_table, block_row, block_col, block_md5, min_lon, min_lat, max_lon, max_lat, row_count, update_time)
+VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, now())
+ON CONFLICT (target_table, block_row, block_col) DO UPDATE SET
+    block_md5 = EXCLUDED.block_md5, min_lon = EXCLUDED.min_lon, min_lat = EXCLUDED.min_lat,
+    max_lon = EXCLUDED.max_lon, max_lat = EXCLUDED.max_lat, row_count = EXCLUDED.row_count,
+    update_time = now()
+"""
+
+
+def raster_block_points(arr, row0: int, col0: int, geotransform, nodata=None):
+    """
+    栅格块 → 有效像元的点（经纬度取像元左上角，与tif_to_csv导出的CSV一致）
+    :param arr: 块数组
+    :param row0/col0: 块左上角在整幅栅格中的行列号
+    :return: (经度数组, 纬度数组, 值数组)
+    """
+    # 过滤无效值（DEM常见无效值为-9999、NaN或文件声明的nodata）
+    valid = np.isfinite(arr) & (arr >= 0)
+    if nodata is not None:
+        valid &= arr != nodata
+    rows, cols = np.nonzero(valid)
+    return (geotransform[0] + (col0 + cols) * geotransform[1],
+            geotransform[3] + (row0 + rows) * geotransform[5],
+            arr[rows, cols])
+
+
+class _RangeReader:
+    """只读取文件[start, end)字节范围的文件对象（供COPY FROM STDIN逐块读取）"""
+
+    def __init__(self, path: str, start: int, end: int):
+        self._file = open(path, "rb")
+        self._file.seek(start)
+        self._remaining = end - start
+
+    def read(self, size: int = -1) -> bytes:
+        if self._remaining <= 0:
+            return b""
+        if size is None or size < 0 or size > self._remaining:
+            size = self._remaining
+        data = self._file.read(size)
+        self._remaining -= len(data)
+        return data
+
+    def readline(self, size: int = -1) -> bytes:
+        line = self._file.readline(self._remaining if size is None or size < 0 else min(size, self._remaining))
+        self._remaining -= len(line)
+        return line
+
+    def close(self) -> None:
+        self._file.close()
+
+
+def file_md5(path: str) -> str:
+    digest = hashlib.md5()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def csv_partitions(path: str, partition_bytes: int = PARTITION_BYTES) -> tuple:
+    """
+    按字节切分CSV（跳过表头，分区边界对齐到行尾；同一文件的切分结果固定，续传时分区编号不变）
+    :return: (表头字段列表, [(起始字节, 结束字节), ...])
+    """
+    size = os.path.getsize(path)
+    partitions = []
+    with open(path, "rb") as f:
+        header = f.readline().decode("utf-8").strip().split(",")
+        start = f.tell()
+        while start < size:
+            f.seek(min(start + partition_bytes, size))
+            if f.tell() < size:
+                f.readline()
+            partitions.append((start, f.tell()))
+            start = f.tell()
+    return header, partitions
+
+
+def _load_partition(engine, table: str, value_column: str, path: str, source_md5: str,
+                    partition_no: int, start: int, end: int) -> int:
+    """单个分区：COPY进临时中转表 → 构造点几何写入目标表 → 记录检查点，同一事务提交"""
+    conn = engine.raw_connection()
+    reader = _RangeReader(path, start, end)
+    try:
+        cur = conn.cursor()
+        cur.execute("CREATE TEMP TABLE terrain_staging (lon DOUBLE PRECISION, lat DOUBLE PRECISION, "
+                    "value DOUBLE PRECISION) ON COMMIT DROP")
+        cur.copy_expert("COPY terrain_staging (lon, lat, value) FROM STDIN WITH (FORMAT csv)", reader)
+        cur.execute(
+            f"INSERT INTO {table} (geom, {value_column}, create_time) "
+            f"SELECT ST_SetSRID(ST_MakePoint(lon, lat), 4326), round(value::numeric, 2), now() "
+            f"FROM terrain_staging"
+        )
+        row_count = cur.rowcount
+        cur.execute(
+            f"INSERT INTO {CHECKPOINT_TABLE} (target_table, partition_no, source_md5, row_count) "
+            f"VALUES (%s, %s, %s, %s)",
+            (table, partition_no, source_md5, row_count)
+        )
+        conn.commit()
+        return row_count
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        reader.close()
+        conn.close()
+
+
+def bulk_load_points(engine, model, value_column: str, csv_path: str,
+                     workers: int = DEFAULT_LOAD_WORKERS, partition_bytes: int = PARTITION_BYTES) -> int:
+    """
+    把tif_to_csv生成的CSV（lon, lat, 值）并行COPY入库，支持断点续传
+    :param engine: SQLAlchemy引擎
+    :param model: 目标模型（ElevationPoint / SlopePoint）
+    :param value_column: 值字段名（elevation_m / slope_deg，与CSV第3列同名）
+    :param csv_path: CSV路径
+    :param workers: 并行连接数
+    :return: 目标表中本数据来源的总点数（含此前已提交的分区）
+    """
+    table = model.__tablename__
+    model.__table__.create(engine, checkfirst=True)
+    header, partitions = csv_partitions(csv_path, partition_bytes)
+    if header != ["lon", "lat", value_column]:
+        raise ValueError(f"CSV表头应为lon,lat,{value_column}，实际为：{','.join(header)}")
+    source_md5 = file_md5(csv_path)
+
+    with engine.begin() as conn:
+        conn.execute(text(_CHECKPOINT_DDL))
+        done = {row.partition_no: row for row in conn.execute(
+            text(f"SELECT partition_no, source_md5, row_count FROM {CHECKPOINT_TABLE} WHERE target_table = :t"),
+            {"t": table}
+        )}
+        if not done or any(row.source_md5 != source_md5 for row in done.values()):
+            # 全新导入（或CSV内容已变化）：清空旧数据与检查点
+            conn.execute(text(f"TRUNCATE {table} RESTART IDENTITY"))
+            conn.execute(text(f"DELETE FROM {CHECKPOINT_TABLE} WHERE target_table = :t"), {"t": table})
+            done = {}
+        # 加载期间不维护空间索引，全部完成后重建
+        conn.execute(text(f"DROP INDEX IF EXISTS idx_{table}_geom"))
+
+    pending = [(i, start, end) for i, (start, end) in enumerate(partitions) if i not in done]
+    loaded = sum(row.row_count for row in done.values())
+    if done:
+        print(f"{table}：续传导入，已完成 {len(done)}/{len(partitions)} 个分区（{loaded} 条），剩余 {len(pending)} 个分区")
+    started = time.perf_counter()
+    new_rows = 0
+    with ThreadPoolExecutor(max_workers=max(1, min(workers, len(pending) or 1))) as pool:
+        futures = {pool.submit(_load_partition, engine, table, value_column, csv_path, source_md5, i, start, end): i
+                   for i, start, end in pending}
+        for n, future in enumerate(as_completed(futures), 1):
+            new_rows += future.result()
+            elapsed = max(time.perf_counter() - started, 1e-9)
+            print(f"  {table}：分区 {futures[future]} 完成（{n}/{len(pending)}），"
+                  f"本次已导入 {new_rows} 条，{new_rows / elapsed:.0f} 条/秒")
+
+    with engine.begin() as conn:
+        conn.execute(text(f"CREATE INDEX IF NOT EXISTS idx_{table}_geom ON {table} USING GIST (geom)"))
+        conn.execute(text(f"ANALYZE {table}"))
+    total = loaded + new_rows
+    print(f"{table}导入完成，共 {total} 条数据（本次 {new_rows} 条，耗时 {time.perf_counter() - started:.2f} 秒）")
+    return total
+
+
+def iter_raster_blocks(dataset, block_size: int = FINGERPRINT_BLOCK_SIZE):
+    """
+    逐块读取栅格第1波段并计算内容指纹
+    :return: 生成器，每项为 (块行号, 块列号, 块MD5, 块点位外包矩形(min_lon, min_lat, max_lon, max_lat), 块数组, 起始行, 起始列)
+    外包矩形向外扩半个像元，保证与相邻块不重叠且块内点位不落在边界上
+    """
+    band = dataset.GetRasterBand(1)
+    geotransform = dataset.GetGeoTransform()
+    nodata = band.GetNoDataValue()
+    x0, res_x, _, y0, _, res_y = geotransform
+    width, height = dataset.RasterXSize, dataset.RasterYSize
+    for y in range(0, height, block_size):
+        for x in range(0, width, block_size):
+            arr = band.ReadAsArray(x, y, min(block_size, width - x), min(block_size, height - y))
+            digest = hashlib.md5(repr((geotransform, nodata, arr.dtype.str, arr.shape)).encode("utf-8"))
+            digest.update(np.ascontiguousarray(arr).tobytes())
+            xs = (x0 + (x - 0.5) * res_x, x0 + (x + arr.shape[1] - 0.5) * res_x)
+            ys = (y0 + (y - 0.5) * res_y, y0 + (y + arr.shape[0] - 0.5) * res_y)
+            envelope = (min(xs), min(ys), max(xs), max(ys))
+            yield y // block_size, x // block_size, digest.hexdigest(), envelope, arr, y, x
+
+
+def has_block_fingerprints(engine, model) -> bool:
+    """目标表是否已有分块指纹（有则可增量导入）"""
+    with engine.begin() as conn:
+        conn.execute(text(_FINGERPRINT_DDL))
+        return conn.execute(text(f"SELECT 1 FROM {FINGERPRINT_TABLE} WHERE target_table = :t LIMIT 1"),
+                            {"t": model.__tablename__}).first() is not None
+
+
+def record_block_fingerprints(engine, model, dataset, block_size: int = FINGERPRINT_BLOCK_SIZE) -> int:
+    """全量导入完成后记录全部分块指纹（替换该表原有指纹），作为下次增量导入的基准"""
+    table = model.__tablename__
+    nodata = dataset.GetRasterBand(1).GetNoDataValue()
+    geotransform = dataset.GetGeoTransform()
+    conn = engine.raw_connection()
+    try:
+        cur = conn.cursor()
+        cur.execute(_FINGERPRINT_DDL)
+        cur.execute(f"DELETE FROM {FINGERPRINT_TABLE} WHERE target_table = %s", (table,))
+        count = 0
+        for block_row, block_col, md5, envelope, arr, y, x in iter_raster_blocks(dataset, block_size):
+            points = len(raster_block_points(arr, y, x, geotransform, nodata)[0])
+            cur.execute(_UPSERT_FINGERPRINT_SQL, (table, block_row, block_col, md5, *envelope, points))
+            count += 1
+        conn.commit()
+        return count
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        conn.close()
+
+
+def incremental_load(engine, model, value_column: str, dataset, block_size: int = FINGERPRINT_BLOCK_SIZE) -> dict:
+    """
+    增量重新导入：只替换指纹变化的分块（新增分块插入、消失分块删除），每个分块一个事务（中断后重新执行自动续传）
+    :param model: 目标模型（ElevationPoint / SlopePoint）
+    :param value_column: 值字段名（elevation_m / slope_deg）
+    :param dataset: 新栅格的GDAL数据集
+    :return: {"changed_blocks", "removed_blocks", "unchanged_blocks", "deleted_rows", "inserted_rows",
+              "envelopes": 变化分块的外包矩形列表（用于定位受影响的路网边）}
+    """
+    table = model.__tablename__
+    nodata = dataset.GetRasterBand(1).GetNoDataValue()
+    geotransform = dataset.GetGeoTransform()
+    started = time.perf_counter()
+    report = {"changed_blocks": 0, "removed_blocks": 0, "unchanged_blocks": 0,
+              "deleted_rows": 0, "inserted_rows": 0, "envelopes": []}
+    conn = engine.raw_connection()
+    try:
+        cur = conn.cursor()
+        cur.execute(_FINGERPRINT_DDL)
+        cur.execute(f"SELECT block_row, block_col, block_md5, min_lon, min_lat, max_lon, max_lat "
+                    f"FROM {FINGERPRINT_TABLE} WHERE target_table = %s", (table,))
+        stored = {(r[0], r[1]): (r[2], tuple(r[3:])) for r in cur.fetchall()}
+        conn.commit()
+
+        def replace_block(envelopes, key=None, points=None, fingerprint=None):
+            """删除外包矩形内的旧点，写入新点并更新指纹（同一事务）"""
+            for envelope in envelopes:
+                cur.execute(f"DELETE FROM {table} WHERE geom && ST_MakeEnvelope(%s, %s, %s, %s, 4326)", envelope)
+                report["deleted_rows"] += cur.rowcount
+            if points is not None:
+                buffer = io.StringIO()
+                np.savetxt(buffer, np.column_stack(points), delimiter=",", fmt="%.17g")
+                buffer.seek(0)
+                cur.execute("CREATE TEMP TABLE terrain_staging (lon DOUBLE PRECISION, lat DOUBLE PRECISION, "
+                            "value DOUBLE PRECISION) ON COMMIT DROP")
+                cur.copy_expert("COPY terrain_staging (lon, lat, value) FROM STDIN WITH (FORMAT csv)", buffer)
+                cur.execute(
+                    f"INSERT INTO {table} (geom, {value_column}, create_time) "
+                    f"SELECT ST_SetSRID(ST_MakePoint(lon, lat), 4326), round(value::numeric, 2), now() "
+                    f"FROM terrain_staging"
+                )
+                report["inserted_rows"] += cur.rowcount
+                cur.execute(_UPSERT_FINGERPRINT_SQL, (table, *key, fingerprint[0], *fingerprint[1], len(points[0])))
+            else:
+                cur.execute(f"DELETE FROM {FINGERPRINT_TABLE} WHERE target_table = %s AND block_row = %s "
+                            f"AND block_col = %s", (table, *key))
+            conn.commit()
+
+        for block_row, block_col, md5, envelope, arr, y, x in iter_raster_blocks(dataset, block_size):
+            key = (block_row, block_col)
+            old = stored.pop(key, None)
+            if old is not None and old[0] == md5:
+                report["unchanged_blocks"] += 1
+                continue
+            # 旧块范围与新块范围都要清理（栅格地理参数变化时两者不同）
+            envelopes = [envelope] if old is None or old[1] == envelope else [old[1], envelope]
+            replace_block(envelopes, key, raster_block_points(arr, y, x, geotransform, nodata), (md5, envelope))
+            report["changed_blocks"] += 1
+            report["envelopes"].extend(envelopes)
+        # 新栅格中已不存在的分块：删除其范围内的点与指纹
+        for key, (_, envelope) in stored.items():
+            replace_block([envelope], key)
+            report["removed_blocks"] += 1
+            report["envelopes"].append(envelope)
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        conn.close()
+    print(f"{table}增量导入完成：变化 {report['changed_blocks']} 块，删除 {report['removed_blocks']} 块，"
+          f"未变化 {report['unchanged_blocks']} 块；删除 {report['deleted_rows']} 条，写入 {report['inserted_rows']} 条，"
+          f"耗时 {time.perf_counter() - started:.2f} 秒")
+    return report
+
+
+def downsample_2x(arr: np.ndarray) -> np.ndarray:
+    """2×2像元取有效值均值（奇数行/列补NaN），4个像元均无效时为NaN"""
+    h, w = arr.shape
+    padded = np.full((h + h % 2, w + w % 2), np.nan, dtype=np.float32)
+    padded[:h, :w] = arr
+    blocks = padded.reshape(padded.shape[0] // 2, 2, padded.shape[1] // 2, 2)
+    valid = np.isfinite(blocks)
+    total = np.where(valid, blocks, 0).sum(axis=(1, 3))
+    with np.errstate(invalid="ignore", divide="ignore"):
+        return (total / valid.sum(axis=(1, 3))).astype(np.float32)
+
+
+def iter_pyramid_tiles(dataset, tile_size: int = FINGERPRINT_BLOCK_SIZE, max_level: int = MAX_OVERVIEW_LEVEL):
+    """
+    流式切分栅格金字塔：第0级为原始像元，第k级为第k-1级2×2均值降采样（浮点，无效值为NaN）
+    按tile_size行条带逐条读取第0级，每级凑满一个条带即切块输出并继续降采样，内存中每级最多保留一个条带
+    金字塔逐级构建到整幅栅格不超过一个块为止（最多max_level级）
+    :return: 生成器，每项为 (级别, 块行号, 块列号, 块数组, 该级仿射参数, 该级栅格宽, 该级栅格高)
+    """
+    band = dataset.GetRasterBand(1)
+    nodata = band.GetNoDataValue()
+    x0, res_x, _, y0, _, res_y = dataset.GetGeoTransform()
+    dims = [(dataset.RasterXSize, dataset.RasterYSize)]
+    while len(dims) <= max_level and max(dims[-1]) > tile_size:
+        w, h = dims[-1]
+        dims.append(((w + 1) // 2, (h + 1) // 2))
+    top = len(dims) - 1
+    pending = [[] for _ in dims]  # 各级待凑满条带的降采样结果
+    next_row = [0] * len(dims)
+
+    def emit(level, strip):
+        geotransform = (x0, res_x * 2 ** level, 0.0, y0, 0.0, res_y * 2 ** level)
+        tile_row = next_row[level]
+        next_row[level] += 1
+        for x in range(0, strip.shape[1], tile_size):
+            yield level, tile_row, x // tile_size, strip[:, x:x + tile_size], geotransform, *dims[level]
+        if level < top:
+            if level == 0:
+                # 原始像元按无效值规则（nodata/负值/NaN）转为NaN后参与降采样
+                strip = strip.astype(np.float32)
+                invalid = ~np.isfinite(strip) | (strip < 0)
+                if nodata is not None:
+                    invalid |= strip == np.float32(nodata)
+                strip[invalid] = np.nan
+            pending[level + 1].append(downsample_2x(strip))
+            if sum(len(part) for part in pending[level + 1]) >= tile_size:
+                merged, pending[level + 1] = np.vstack(pending[level + 1]), []
+                yield from emit(level + 1, merged)
+
+    for y in range(0, dims[0][1], tile_size):
+        yield from emit(0, band.ReadAsArray(0, y, dims[0][0], min(tile_size, dims[0][1] - y)))
+    # 各级最后不足tile_size行的条带
+    for level in range(1, top + 1):
+        if pending[level]:
+            merged, pending[level] = np.vstack(pending[level]), []
+            yield from emit(level, merged)
+
+
+def load_terrain_tiles(engine, layer: str, dataset, tile_size: int = FINGERPRINT_BLOCK_SIZE,
+                       max_level: int = MAX_OVERVIEW_LEVEL) -> dict:
+    """
+    把栅格金字塔按块写入terrain_tiles（每块一行压缩数组）：只写入指纹变化/新增的块，删除新栅格中已不存在的块
+    :param layer: 图层名（elevation / slope）
+    :param dataset: GDAL数据集
+    :param max_level: 最高降采样级别（第k级像元为原始像元的2^k倍）
+    :return: {"changed_tiles", "removed_tiles", "unchanged_tiles", "stored_bytes", "levels": 金字塔级数,
+              "envelopes": 第0级变化块的外包矩形列表（用于定位受影响的路网边）}
+    """
+    TerrainTile.__table__.create(engine, checkfirst=True)
+    ensure_terrain_tiles_schema(engine)
+    nodata = dataset.GetRasterBand(1).GetNoDataValue()
+    started = time.perf_counter()
+    report = {"changed_tiles": 0, "removed_tiles": 0, "unchanged_tiles": 0, "stored_bytes": 0, "levels": 0,
+              "envelopes": []}
+    with engine.connect() as conn:
+        stored = {(r.level, r.tile_row, r.tile_col): r for r in conn.execute(text(
+            "SELECT level, tile_row, tile_col, block_md5, origin_lon, origin_lat, res_lon, res_lat, tile_size, "
+            "width, height FROM terrain_tiles WHERE layer = :layer"
+        ), {"layer": layer})}
+
+    def envelope_of(origin_lon, origin_lat, res_lon, res_lat, row0, col0, height, width):
+        # 块内像元左上角点位的外包矩形，向外扩半个像元
+        xs = (origin_lon + (col0 - 0.5) * res_lon, origin_lon + (col0 + width - 0.5) * res_lon)
+        ys = (origin_lat + (row0 - 0.5) * res_lat, origin_lat + (row0 + height - 0.5) * res_lat)
+        return min(xs), min(ys), max(xs), max(ys)
+
+    def old_envelope(r):
+        return envelope_of(r.origin_lon, r.origin_lat, r.res_lon, r.res_lat,
+                           r.tile_row * r.tile_size, r.tile_col * r.tile_size, r.height, r.width)
+
+    rows = []
+    with engine.begin() as conn:
+        for level, tile_row, tile_col, arr, geotransform, width, height in iter_pyramid_tiles(dataset, tile_size, max_level):
+            report["levels"] = max(report["levels"], level + 1)
+            tile_nodata = nodata if level == 0 else None
+            digest = hashlib.md5(repr((geotransform, tile_nodata, arr.dtype.str, arr.shape)).encode("utf-8"))
+            digest.update(np.ascontiguousarray(arr).tobytes())
+            md5 = digest.hexdigest()
+            old = stored.pop((level, tile_row, tile_col), None)
+            if old is not None and old.block_md5 == md5:
+                report["unchanged_tiles"] += 1
+                continue
+            data = pack_tile(arr)
+            rows.append({
+                "layer": layer, "level": level, "tile_row": tile_row, "tile_col": tile_col, "tile_size": tile_size,
+                "origin_lon": geotransform[0], "origin_lat": geotransform[3],
+                "res_lon": geotransform[1], "res_lat": geotransform[5],
+                "raster_width": width, "raster_height": height,
+                "width": arr.shape[1], "height": arr.shape[0], "dtype": arr.dtype.str, "nodata": tile_nodata,
+                "data": data, "block_md5": md5
+            })
+            report["changed_tiles"] += 1
+            report["stored_bytes"] += len(data)
+            if level == 0:
+                envelope = envelope_of(geotransform[0], geotransform[3], geotransform[1], geotransform[5],
+                                       tile_row * tile_size, tile_col * tile_size, *arr.shape)
+                report["envelopes"].append(envelope)
+                if old is not None and old_envelope(old) != envelope:
+                    report["envelopes"].append(old_envelope(old))
+            if len(rows) >= 64:
+                _upsert_tiles(conn, rows)
+                rows = []
+        _upsert_tiles(conn, rows)
+        # 新栅格中已不存在的块
+        for (level, tile_row, tile_col), old in stored.items():
+            conn.execute(text("DELETE FROM terrain_tiles WHERE layer = :layer AND level = :level "
+                              "AND tile_row = :r AND tile_col = :c"),
+                         {"layer": layer, "level": level, "r": tile_row, "c": tile_col})
+            report["removed_tiles"] += 1
+            if level == 0:
+                report["envelopes"].append(old_envelope(old))
+    print(f"terrain_tiles[{layer}]导入完成：{report['levels']} 级金字塔，变化 {report['changed_tiles']} 块"
+          f"（{report['stored_bytes']} 字节），删除 {report['removed_tiles']} 块，未变化 {report['unchanged_tiles']} 块，"
+          f"耗时 {time.perf_counter() - started:.2f} 秒")
+    return report
+
+
+def _upsert_tiles(conn, rows: list) -> None:
+    if not rows:
+        return
+    keys = ("layer", "level", "tile_row", "tile_col")
+    stmt = insert(TerrainTile.__table__).values(rows)
+    conn.execute(stmt.on_conflict_do_update(
+        index_elements=list(keys),
+        set_={column: stmt.excluded[column] for column in rows[0] if column not in keys} | {"update_time": text("now()")}
+    ))
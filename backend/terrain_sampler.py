@@ -0,0 +1,459 @@
+# backend/terrain_sampler.py
+"""
+分块栅格采样：DEM（高程）与坡度栅格按固定大小分块按需读取，热点分块保存在限定内存的LRU缓存中
+- 分块来源可以是GeoTIFF文件（GdalRasterSource）或数据库分块地形表（terrain_store.DbTileSource）
+- 支持多个相邻栅格文件拼接（镶嵌）：按各文件覆盖范围定位采样点，跨分块/跨文件边界的双线性插值从相邻分块/文件取像元
+- 不整体读入栅格，单次采样只读取采样点周围涉及的分块；分块缓存命中率与驻留内存可通过status查询
+- 栅格文件增删或修改后（如重新导入地形）自动重新建立索引
+- GDAL或栅格文件不可用时get_terrain_sampler返回None，调用方回退到数据库高程/坡度点查询
+"""
+import glob
+import os
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+try:
+    from osgeo import gdal
+except ImportError:  # 未安装GDAL时仅禁用栅格采样
+    gdal = None
+
+# DEM文件路径（import_terrain.py导入地形时使用同一文件）
+DEM_FILE_PATH = "./terrain_data/fangshan_dem.tiff"
+# 坡度文件路径（由import_terrain.py从DEM生成）
+SLOPE_FILE_PATH = "./terrain_data/slope.tif"
+# 相邻区域的其他DEM/坡度分幅文件目录（与主文件一起拼接，主文件优先）
+DEM_TILE_DIR = "./terrain_data/dem"
+SLOPE_TILE_DIR = "./terrain_data/slope"
+# 分块边长（像元）
+TILE_SIZE = 256
+# 分块缓存内存上限（字节）
+DEFAULT_CACHE_BYTES = 64 * 1024 * 1024
+# 单次窗口读取的像元数上限
+MAX_WINDOW_PIXELS = 4 * 1024 * 1024
+# 地球半径（米，与path_sampling.haversine_distance一致）
+EARTH_RADIUS_M = 6371000
+
+
+def haversine_m(lngs1, lats1, lngs2, lats2) -> np.ndarray:
+    """批量计算两组经纬度点之间的半正矢距离（米）"""
+    lng1, lat1, lng2, lat2 = (np.radians(np.asarray(v, dtype=np.float64)) for v in (lngs1, lats1, lngs2, lats2))
+    a = np.sin((lat2 - lat1) / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin((lng2 - lng1) / 2) ** 2
+    return 2 * EARTH_RADIUS_M * np.arcsin(np.sqrt(np.clip(a, 0.0, 1.0)))
+
+
+def resample_lines(lines: list, interval_m: float) -> list:
+    """
+    多条折线按距离等间隔重采样（含起终点，最后一段可短于interval_m），全部折线一次向量化计算
+    - 各顶点累计距离由半正矢公式批量计算，采样点按累计距离对经纬度线性插值（np.interp），复杂度O(顶点数 + 采样点数)
+    :param lines: 折线列表，每条为经纬度序列 [(lng, lat), ...]（至少1个顶点）
+    :param interval_m: 采样间隔（米）
+    :return: 每条折线的 (距起点距离数组（米）, 经度数组, 纬度数组)
+    """
+    arrays = [np.asarray(coords, dtype=np.float64).reshape(-1, 2) for coords in lines]
+    if not arrays:
+        return []
+    counts = np.array([len(xy) for xy in arrays])
+    xy = np.concatenate(arrays)
+    firsts = np.cumsum(counts) - counts
+    lasts = firsts + counts - 1
+    seg = haversine_m(xy[:-1, 0], xy[:-1, 1], xy[1:, 0], xy[1:, 1])
+    # 相邻两条折线首尾之间留1米间隔，使各折线在拼接后的累计距离轴上互不重叠
+    seg[lasts[:-1]] = 1.0
+    cum = np.concatenate(([0.0], np.cumsum(seg)))
+    totals = cum[lasts] - cum[firsts]
+    # 每条折线的采样点数：0, interval, 2*interval, ... (< total) 再加终点；长度为0时只取起点
+    sample_counts = np.where(totals > 0, np.ceil(totals / interval_m).astype(np.int64) + 1, 1)
+    ends = np.cumsum(sample_counts)
+    line_index = np.repeat(np.arange(len(arrays)), sample_counts)
+    distances = (np.arange(ends[-1]) - np.repeat(ends - sample_counts, sample_counts)) * float(interval_m)
+    distances[ends - 1] = totals
+    positions = distances + cum[firsts][line_index]
+    lngs = np.interp(positions, cum, xy[:, 0])
+    lats = np.interp(positions, cum, xy[:, 1])
+    return list(zip(np.split(distances, ends[:-1]), np.split(lngs, ends[:-1]), np.split(lats, ends[:-1])))
+
+
+def resample_line(coords, interval_m: float):
+    """
+    折线按距离等间隔重采样（含起终点，最后一段可短于interval_m）
+    :param coords: 折线经纬度 [(lng, lat), ...]
+    :return: (距起点距离数组（米）, 经度数组, 纬度数组)
+    """
+    return resample_lines([coords], interval_m)[0]
+
+
+class TileCache:
+    """
+    栅格分块LRU缓存（高程、坡度等多个镶嵌栅格共用），按分块数组字节数限制驻留内存
+    :param max_bytes: 驻留内存上限（字节）
+    """
+
+    def __init__(self, max_bytes: int = DEFAULT_CACHE_BYTES):
+        self.max_bytes = max_bytes
+        self._tiles = OrderedDict()  # (文件路径, 分块行, 分块列) → 分块数组
+        self._lock = threading.Lock()
+        self.resident_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key: tuple, load):
+        """命中则返回缓存分块，否则调用load()读取并缓存"""
+        with self._lock:
+            tile = self._tiles.get(key)
+            if tile is not None:
+                self._tiles.move_to_end(key)
+                self.hits += 1
+                return tile
+            self.misses += 1
+        tile = load()
+        with self._lock:
+            if key not in self._tiles:
+                self._tiles[key] = tile
+                self.resident_bytes += tile.nbytes
+                # 至少保留刚读入的分块
+                while self.resident_bytes > self.max_bytes and len(self._tiles) > 1:
+                    _, evicted = self._tiles.popitem(last=False)
+                    self.resident_bytes -= evicted.nbytes
+                    self.evictions += 1
+        return tile
+
+    @property
+    def status(self) -> dict:
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "tiles": len(self._tiles),
+                "resident_bytes": self.resident_bytes,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": round(self.hits / total, 4) if total else 0.0
+            }
+
+
+class RasterSource:
+    """
+    单个栅格（第1波段），只保留地理参数，像元按分块读取（分块数据来源由子类的_read_tile实现）
+    :param path: 栅格标识（文件路径等，同时作为分块缓存键的一部分）
+    :param geotransform: GDAL仿射参数 (左上角x, 像元宽, 0, 左上角y, 0, 像元高(负))
+    :param nodata: 无效值（另外小于0的值也视为无效）
+    :param cache: 分块缓存
+    """
+
+    def __init__(self, path: str, geotransform, width: int, height: int, nodata, cache: TileCache,
+                 tile_size: int = TILE_SIZE):
+        self.path = path
+        self.cache = cache
+        self.tile_size = tile_size
+        self.x0, self.res_x, _, self.y0, _, self.res_y = geotransform
+        self.width, self.height = width, height
+        self.nodata = nodata
+        x1 = self.x0 + self.width * self.res_x
+        y1 = self.y0 + self.height * self.res_y
+        # 覆盖范围 (最小经度, 最小纬度, 最大经度, 最大纬度)
+        self.bounds = (min(self.x0, x1), min(self.y0, y1), max(self.x0, x1), max(self.y0, y1))
+
+    def fractional_pixel(self, lngs: np.ndarray, lats: np.ndarray):
+        """经纬度 → 浮点(行号, 列号)（像元左上角为整数）"""
+        return (lats - self.y0) / self.res_y, (lngs - self.x0) / self.res_x
+
+    def pixel_center(self, rows: np.ndarray, cols: np.ndarray):
+        """像元行列号 → 像元中心经纬度"""
+        return self.x0 + (cols + 0.5) * self.res_x, self.y0 + (rows + 0.5) * self.res_y
+
+    @property
+    def pixel_size_m(self) -> float:
+        """像元边长（米，取经向/纬向较大者，按覆盖范围中心纬度换算）"""
+        lat = np.radians((self.bounds[1] + self.bounds[3]) / 2)
+        return float(max(abs(self.res_x) * np.cos(lat), abs(self.res_y)) * np.pi / 180 * EARTH_RADIUS_M)
+
+    def _read_tile(self, tile_row: int, tile_col: int) -> np.ndarray:
+        raise NotImplementedError
+
+    def pixels(self, rows: np.ndarray, cols: np.ndarray) -> np.ndarray:
+        """
+        读取一批像元值（行列号须在栅格范围内），按所在分块分组，每个分块只取一次缓存
+        :return: 浮点数组，无效值（nodata/小于0，与import_terrain.tif_to_csv一致）为NaN
+        """
+        values = np.full(len(rows), np.nan)
+        if not len(rows):
+            return values
+        tile_rows, tile_cols = rows // self.tile_size, cols // self.tile_size
+        tile_ids = tile_rows * (self.width // self.tile_size + 1) + tile_cols
+        for tile_id in np.unique(tile_ids):
+            mask = tile_ids == tile_id
+            tr, tc = int(tile_rows[mask][0]), int(tile_cols[mask][0])
+            tile = self.cache.get((self.path, tr, tc), lambda: self._read_tile(tr, tc))
+            values[mask] = tile[rows[mask] - tr * self.tile_size, cols[mask] - tc * self.tile_size]
+        invalid = ~np.isfinite(values) | (values < 0)
+        if self.nodata is not None:
+            invalid |= values == self.nodata
+        values[invalid] = np.nan
+        return values
+
+    def window(self, min_lng: float, min_lat: float, max_lng: float, max_lat: float, max_pixels: int = None):
+        """
+        读取经纬度矩形范围内的像元窗口（按所在分块批量读取）
+        :param max_pixels: 窗口像元数上限，超出抛出ValueError
+        :return: (浮点数组（无效值为NaN）, 窗口的GDAL仿射参数)；范围与栅格不相交时返回(None, None)
+        """
+        if (max_lng < self.bounds[0] or min_lng > self.bounds[2]
+                or max_lat < self.bounds[1] or min_lat > self.bounds[3]):
+            return None, None
+        rows, cols = self.fractional_pixel(np.array([min_lng, max_lng]), np.array([max_lat, min_lat]))
+        r0, r1 = (int(v) for v in np.clip(np.floor(np.sort(rows)), 0, self.height - 1))
+        c0, c1 = (int(v) for v in np.clip(np.floor(np.sort(cols)), 0, self.width - 1))
+        if max_pixels is not None and (r1 - r0 + 1) * (c1 - c0 + 1) > max_pixels:
+            raise ValueError(f"窗口像元数超过上限{max_pixels}")
+        grid_rows, grid_cols = np.mgrid[r0:r1 + 1, c0:c1 + 1]
+        values = self.pixels(grid_rows.ravel(), grid_cols.ravel()).reshape(grid_rows.shape)
+        return values, (self.x0 + c0 * self.res_x, self.res_x, 0.0, self.y0 + r0 * self.res_y, 0.0, self.res_y)
+
+
+class GdalRasterSource(RasterSource):
+    """
+    GeoTIFF栅格文件：只保留数据集句柄，分块从文件读取
+    :param dataset: GDAL数据集
+    """
+
+    def __init__(self, path: str, dataset, cache: TileCache, tile_size: int = TILE_SIZE):
+        self._dataset = dataset
+        self._band = dataset.GetRasterBand(1)
+        self._lock = threading.Lock()  # 同一GDAL数据集不能被多个线程同时读取
+        super().__init__(path, dataset.GetGeoTransform(), dataset.RasterXSize, dataset.RasterYSize,
+                         self._band.GetNoDataValue(), cache, tile_size)
+
+    @classmethod
+    def open(cls, path: str, cache: TileCache) -> "GdalRasterSource":
+        ds = gdal.Open(path)
+        if not ds:
+            raise FileNotFoundError(f"找不到TIF文件：{path}")
+        return cls(path, ds, cache)
+
+    def _read_tile(self, tile_row: int, tile_col: int) -> np.ndarray:
+        x, y = tile_col * self.tile_size, tile_row * self.tile_size
+        with self._lock:
+            return self._band.ReadAsArray(x, y, min(self.tile_size, self.width - x),
+                                          min(self.tile_size, self.height - y))
+
+
+class RasterMosaic:
+    """
+    多个栅格文件拼接成的镶嵌栅格（覆盖范围重叠时靠前的文件优先）
+    :param sources: RasterSource列表
+    """
+
+    def __init__(self, sources: list):
+        self.sources = sources
+        bounds = np.array([s.bounds for s in sources], dtype=np.float64).reshape(-1, 4)
+        self._min_x, self._min_y, self._max_x, self._max_y = bounds.T
+
+    def _candidates(self, lngs: np.ndarray, lats: np.ndarray) -> np.ndarray:
+        """覆盖范围与采样点外包矩形相交的文件下标（按优先级）"""
+        return np.nonzero((self._min_x <= lngs.max()) & (self._max_x >= lngs.min())
+                          & (self._min_y <= lats.max()) & (self._max_y >= lats.min()))[0]
+
+    def _locate(self, lngs: np.ndarray, lats: np.ndarray) -> np.ndarray:
+        """每个采样点所在文件下标（不在任何文件范围内为-1）"""
+        owner = np.full(len(lngs), -1, dtype=np.int64)
+        for i in self._candidates(lngs, lats):
+            mask = ((owner < 0) & (lngs >= self._min_x[i]) & (lngs <= self._max_x[i])
+                    & (lats >= self._min_y[i]) & (lats <= self._max_y[i]))
+            owner[mask] = i
+        return owner
+
+    def _nearest(self, lngs: np.ndarray, lats: np.ndarray) -> np.ndarray:
+        """取采样点所在像元的值（用于本文件范围外的插值邻像元，从相邻文件读取）"""
+        values = np.full(len(lngs), np.nan)
+        if not len(lngs):
+            return values
+        owner = self._locate(lngs, lats)
+        for i in np.unique(owner[owner >= 0]):
+            source = self.sources[i]
+            mask = owner == i
+            rows, cols = source.fractional_pixel(lngs[mask], lats[mask])
+            rows = np.clip(np.floor(rows).astype(np.int64), 0, source.height - 1)
+            cols = np.clip(np.floor(cols).astype(np.int64), 0, source.width - 1)
+            values[mask] = source.pixels(rows, cols)
+        return values
+
+    def _bilinear(self, source: RasterSource, lngs: np.ndarray, lats: np.ndarray) -> np.ndarray:
+        # 像元中心坐标系下的浮点行列号
+        row, col = source.fractional_pixel(lngs, lats)
+        row, col = row - 0.5, col - 0.5
+        r0, c0 = np.floor(row).astype(np.int64), np.floor(col).astype(np.int64)
+        fy, fx = row - r0, col - c0
+        total = np.zeros(len(lngs))
+        weight = np.zeros(len(lngs))
+        for dr, dc, w in ((0, 0, (1 - fx) * (1 - fy)), (0, 1, fx * (1 - fy)),
+                          (1, 0, (1 - fx) * fy), (1, 1, fx * fy)):
+            r, c = r0 + dr, c0 + dc
+            inside = (r >= 0) & (r < source.height) & (c >= 0) & (c < source.width)
+            values = np.full(len(lngs), np.nan)
+            needed = inside & (w > 0)
+            values[needed] = source.pixels(r[needed], c[needed])
+            # 邻像元落在本文件范围外：按像元中心经纬度从相邻文件取值
+            outside = ~inside & (w > 0)
+            if outside.any():
+                values[outside] = self._nearest(*source.pixel_center(r[outside], c[outside]))
+            valid = np.isfinite(values)
+            total += np.where(valid, values * w, 0.0)
+            weight += np.where(valid, w, 0.0)
+        # 有效像元权重重新归一化（无效像元不参与插值）
+        with np.errstate(invalid="ignore", divide="ignore"):
+            result = total / weight
+        result[weight <= 0] = np.nan
+        return result
+
+    def sample(self, lngs, lats) -> np.ndarray:
+        """
+        批量双线性插值
+        :param lngs/lats: 经纬度数组
+        :return: 插值结果数组；不在任何文件范围内或周围4个像元均无效时为NaN
+        """
+        lngs = np.asarray(lngs, dtype=np.float64)
+        lats = np.asarray(lats, dtype=np.float64)
+        result = np.full(len(lngs), np.nan)
+        if not len(lngs) or not self.sources:
+            return result
+        owner = self._locate(lngs, lats)
+        for i in np.unique(owner[owner >= 0]):
+            mask = owner == i
+            result[mask] = self._bilinear(self.sources[i], lngs[mask], lats[mask])
+        return result
+
+    def window(self, min_lng: float, min_lat: float, max_lng: float, max_lat: float, max_pixels: int = None):
+        """矩形范围内的像元窗口（取覆盖该范围的优先级最高的文件，见RasterSource.window）"""
+        for source in self.sources:
+            values, geotransform = source.window(min_lng, min_lat, max_lng, max_lat, max_pixels)
+            if values is not None:
+                return values, geotransform
+        return None, None
+
+    @property
+    def files(self) -> list:
+        return [{"path": s.path, "width": s.width, "height": s.height, "bounds": list(s.bounds)}
+                for s in self.sources]
+
+
+def find_raster_files(main_path: str, tile_dir: str) -> list:
+    """主栅格文件 + 分幅目录下的全部GeoTIFF（存在的文件，主文件在前）"""
+    paths = [main_path] if os.path.isfile(main_path) else []
+    paths += sorted(glob.glob(os.path.join(tile_dir, "*.tif")) + glob.glob(os.path.join(tile_dir, "*.tiff")))
+    return paths
+
+
+class TerrainSampler:
+    """
+    高程 + 坡度镶嵌栅格采样器（共用一个分块缓存）
+    :param elevation: 高程镶嵌栅格
+    :param slope: 坡度镶嵌栅格
+    :param cache: 两者共用的分块缓存
+    """
+
+    def __init__(self, elevation: RasterMosaic, slope: RasterMosaic, cache: TileCache):
+        self.elevation = elevation
+        self.slope = slope
+        self.cache = cache
+
+    @classmethod
+    def from_files(cls, dem_paths: list, slope_paths: list, max_cache_bytes: int = DEFAULT_CACHE_BYTES):
+        """由GeoTIFF文件建立采样器"""
+        cache = TileCache(max_cache_bytes)
+        return cls(RasterMosaic([GdalRasterSource.open(p, cache) for p in dem_paths]),
+                   RasterMosaic([GdalRasterSource.open(p, cache) for p in slope_paths]), cache)
+
+    def sample(self, lngs, lats):
+        """:return: (高程数组（米）, 坡度数组（度）)，无效处为NaN"""
+        return self.elevation.sample(lngs, lats), self.slope.sample(lngs, lats)
+
+    @property
+    def pixel_size_m(self) -> float:
+        """高程栅格像元边长（米，多文件时取最粗者）"""
+        return max((s.pixel_size_m for s in self.elevation.sources), default=0.0)
+
+    def for_resolution(self, resolution_m: float):
+        """
+        满足目标分辨率的最粗采样器（无降采样金字塔时为自身）
+        :return: (采样器, 金字塔级别, 像元边长（米）)
+        """
+        return self, 0, self.pixel_size_m
+
+    def window(self, min_lng: float, min_lat: float, max_lng: float, max_lat: float,
+               max_pixels: int = MAX_WINDOW_PIXELS):
+        """
+        经纬度矩形范围内的高程/坡度像元窗口
+        :return: ((高程数组, 仿射参数), (坡度数组, 仿射参数))，无效像元为NaN；范围外为(None, None)
+        """
+        return (self.elevation.window(min_lng, min_lat, max_lng, max_lat, max_pixels),
+                self.slope.window(min_lng, min_lat, max_lng, max_lat, max_pixels))
+
+    def sample_line(self, coords: list, interval_m: float = 20):
+        """
+        沿折线每隔interval_m米采样高程/坡度（含起终点）
+        :param coords: 折线经纬度 [(lng, lat), ...]
+        :return: (距起点距离数组, 经度数组, 纬度数组, 高程数组, 坡度数组)
+        """
+        distances, lngs, lats = resample_line(coords, interval_m)
+        elevations, slopes = self.sample(lngs, lats)
+        return distances, lngs, lats, elevations, slopes
+
+    @property
+    def status(self) -> dict:
+        return {
+            "tile_size": TILE_SIZE,
+            "cache": self.cache.status,
+            "elevation_sources": self.elevation.files,
+            "slope_sources": self.slope.files
+        }
+
+
+_cached = (None, None)  # (栅格文件及修改时间, TerrainSampler或None（载入失败）)
+_sampler_lock = threading.Lock()
+
+
+def get_terrain_sampler():
+    """
+    进程内共享的地形采样器（首次调用时建立索引，栅格文件增删/更新后重新建立）
+    :return: TerrainSampler；GDAL未安装、栅格文件不存在或打开失败时返回None
+    """
+    global _cached
+    if gdal is None:
+        return None
+    dem_paths = find_raster_files(DEM_FILE_PATH, DEM_TILE_DIR)
+    slope_paths = find_raster_files(SLOPE_FILE_PATH, SLOPE_TILE_DIR)
+    if not dem_paths or not slope_paths:
+        return None
+    try:
+        key = tuple((p, os.path.getmtime(p)) for p in dem_paths + slope_paths)
+    except OSError:
+        return None
+    if _cached[0] == key:
+        return _cached[1]
+    with _sampler_lock:
+        if _cached[0] != key:
+            try:
+                sampler = TerrainSampler.from_files(dem_paths, slope_paths)
+                print(f"✅ 地形栅格索引已建立：DEM {len(dem_paths)} 个文件，坡度 {len(slope_paths)} 个文件，"
+                      f"分块缓存上限 {DEFAULT_CACHE_BYTES // (1024 * 1024)}MB")
+            except Exception as e:
+                sampler = None
+                print(f"⚠️  地形栅格打开失败，回退数据库地形查询：{str(e)}")
+            _cached = (key, sampler)
+    return _cached[1]
+
+
+def reset_terrain_sampler() -> None:
+    """丢弃进程内共享的采样器（fork出的子进程调用：父进程的文件句柄、分块缓存及锁状态不可共用）"""
+    global _cached, _sampler_lock
+    _cached = (None, None)
+    _sampler_lock = threading.Lock()
+
+
+def terrain_files_version():
+    """当前地形栅格文件版本（文件路径及修改时间，随get_terrain_sampler刷新）；无可用栅格时为None"""
+    return _cached[0] if get_terrain_sampler() is not None else None
@@ -0,0 +1,180 @@
+# backend/terrain_store.py
+"""
+数据库分块地形存储（terrain_tiles表）的读取接口
+- 每个图层（elevation/slope）是一幅按固定大小分块的栅格，每块一行，像元值为zlib压缩的紧凑数组
+- 经纬度 → 行列号 → 块号均为算术换算，按主键直接取块，无需空间近邻查询
+- 与GeoTIFF文件采样共用分块LRU缓存与双线性插值（terrain_sampler），提供点批量采样、折线采样与矩形窗口读取
+- 除原始分辨率外还存有逐级2倍降采样的金字塔，长路线剖面可按目标分辨率选用最粗的满足要求的级别，减少读取量
+- 导入新地形后（terrain_tiles块更新）自动重新载入
+"""
+import threading
+import time
+import zlib
+
+import numpy as np
+from sqlalchemy import text
+
+from terrain_sampler import DEFAULT_CACHE_BYTES, RasterMosaic, RasterSource, TerrainSampler, TileCache
+
+# 图层名
+ELEVATION_LAYER = "elevation"
+SLOPE_LAYER = "slope"
+# 检查terrain_tiles是否更新的最小间隔（秒）
+STORE_CHECK_SECONDS = 30
+
+
+def pack_tile(arr: np.ndarray) -> bytes:
+    """块数组 → 压缩字节（行优先）"""
+    return zlib.compress(np.ascontiguousarray(arr).tobytes(), 6)
+
+
+def unpack_tile(data: bytes, dtype: str, height: int, width: int) -> np.ndarray:
+    """压缩字节 → 块数组"""
+    return np.frombuffer(zlib.decompress(data), dtype=np.dtype(dtype)).reshape(height, width)
+
+
+class DbTileSource(RasterSource):
+    """
+    terrain_tiles中一个图层某一金字塔级别的分块栅格（块按需从数据库读取）
+    :param engine: SQLAlchemy引擎（分块读取使用独立连接，不占用请求会话）
+    :param layer: 图层名
+    :param level: 金字塔级别
+    :param grid: 该级栅格参数（terrain_tiles该级任一行的tile_size/origin_*/res_*/raster_*/nodata字段）
+    """
+
+    def __init__(self, engine, layer: str, level: int, grid, cache: TileCache):
+        self.engine = engine
+        self.layer = layer
+        self.level = level
+        geotransform = (grid.origin_lon, grid.res_lon, 0.0, grid.origin_lat, 0.0, grid.res_lat)
+        super().__init__(f"terrain_tiles/{layer}/{level}", geotransform, grid.raster_width, grid.raster_height,
+                         grid.nodata, cache, grid.tile_size)
+
+    def _read_tile(self, tile_row: int, tile_col: int) -> np.ndarray:
+        with self.engine.connect() as conn:
+            row = conn.execute(text(
+                "SELECT width, height, dtype, data FROM terrain_tiles "
+                "WHERE layer = :layer AND level = :level AND tile_row = :r AND tile_col = :c"
+            ), {"layer": self.layer, "level": self.level, "r": tile_row, "c": tile_col}).first()
+        if row is None:
+            # 缺失的块（栅格范围内无数据）按无效值处理
+            return np.full((min(self.tile_size, self.height - tile_row * self.tile_size),
+                            min(self.tile_size, self.width - tile_col * self.tile_size)), np.nan, dtype=np.float32)
+        return unpack_tile(row.data, row.dtype, row.height, row.width)
+
+
+class TerrainStore(TerrainSampler):
+    """
+    数据库分块地形：自身为原始分辨率采样器（接口同TerrainSampler），levels为各级金字塔采样器
+    :param levels: 第0级起各级的TerrainSampler（共用一个分块缓存）
+    """
+
+    def __init__(self, levels: list):
+        super().__init__(levels[0].elevation, levels[0].slope, levels[0].cache)
+        self.levels = levels
+
+    def for_resolution(self, resolution_m: float):
+        """
+        像元边长不超过resolution_m的最粗级别（目标分辨率比原始像元更细时取第0级）
+        :return: (采样器, 金字塔级别, 像元边长（米）)
+        """
+        level = 0
+        for k, sampler in enumerate(self.levels):
+            if sampler.pixel_size_m <= resolution_m:
+                level = k
+        sampler = self.levels[level]
+        return sampler, level, sampler.pixel_size_m
+
+    @property
+    def status(self) -> dict:
+        return {**super().status, "levels": [
+            {"level": k, "pixel_size_m": round(sampler.pixel_size_m, 2),
+             "width": sampler.elevation.sources[0].width, "height": sampler.elevation.sources[0].height}
+            for k, sampler in enumerate(self.levels)
+        ]}
+
+
+_TILE_LEVEL_SQL = """
+DO $$
+BEGIN
+    IF NOT EXISTS (SELECT 1 FROM information_schema.columns
+                   WHERE table_name = 'terrain_tiles' AND column_name = 'level') THEN
+        ALTER TABLE terrain_tiles ADD COLUMN level INTEGER NOT NULL DEFAULT 0;
+        ALTER TABLE terrain_tiles DROP CONSTRAINT terrain_tiles_pkey;
+        ALTER TABLE terrain_tiles ADD PRIMARY KEY (layer, level, tile_row, tile_col);
+    END IF;
+END $$;
+"""
+
+
+def ensure_terrain_tiles_schema(engine) -> None:
+    """为不含金字塔级别列的旧terrain_tiles表补列并调整主键（幂等）"""
+    with engine.begin() as conn:
+        conn.execute(text(_TILE_LEVEL_SQL))
+
+
+_cached = (None, None, None)  # (terrain_tiles版本, TerrainSampler或None, 上次检查时间)
+_store_lock = threading.Lock()
+
+
+def _tiles_version(conn) -> tuple:
+    return tuple(conn.execute(text(
+        "SELECT layer, COUNT(*), MAX(update_time) FROM terrain_tiles GROUP BY layer ORDER BY layer"
+    )).fetchall())
+
+
+def get_terrain_store(engine):
+    """
+    进程内共享的数据库分块地形采样器（接口与terrain_sampler.TerrainSampler相同）
+    :param engine: SQLAlchemy引擎（可传db.get_bind()）
+    :return: TerrainStore；terrain_tiles不存在或缺少高程/坡度图层时返回None
+    """
+    global _cached
+    version, store, checked = _cached
+    if checked is not None and time.monotonic() - checked < STORE_CHECK_SECONDS:
+        return store
+    with _store_lock:
+        version, store, checked = _cached
+        if checked is not None and time.monotonic() - checked < STORE_CHECK_SECONDS:
+            return store
+        try:
+            with engine.connect() as conn:
+                current = _tiles_version(conn)
+                if current != version:
+                    grids = {(row.layer, row.level): row for row in conn.execute(text(
+                        "SELECT DISTINCT ON (layer, level) layer, level, tile_size, origin_lon, origin_lat, "
+                        "res_lon, res_lat, raster_width, raster_height, nodata FROM terrain_tiles "
+                        "ORDER BY layer, level, update_time DESC"
+                    ))}
+                    # 高程、坡度都具备的连续级别
+                    level_count = 0
+                    while (ELEVATION_LAYER, level_count) in grids and (SLOPE_LAYER, level_count) in grids:
+                        level_count += 1
+                    store = None
+                    if level_count:
+                        cache = TileCache(DEFAULT_CACHE_BYTES)
+                        store = TerrainStore([TerrainSampler(
+                            RasterMosaic([DbTileSource(engine, ELEVATION_LAYER, k, grids[(ELEVATION_LAYER, k)], cache)]),
+                            RasterMosaic([DbTileSource(engine, SLOPE_LAYER, k, grids[(SLOPE_LAYER, k)], cache)]),
+                            cache
+                        ) for k in range(level_count)])
+                        print(f"✅ 数据库分块地形已载入：{level_count} 级金字塔，"
+                              f"{dict((row[0], row[1]) for row in current)} 块")
+        except Exception as e:
+            # terrain_tiles尚未创建等：视为不可用，下次检查时重试
+            current, store = None, None
+            print(f"⚠️  数据库分块地形不可用：{str(e)[:200]}")
+        _cached = (current, store, time.monotonic())
+    return store
+
+
+def reset_terrain_store() -> None:
+    """丢弃进程内共享的分块地形采样器（fork出的子进程调用：其数据库引擎、分块缓存及锁属于父进程）"""
+    global _cached, _store_lock
+    _cached = (None, None, None)
+    _store_lock = threading.Lock()
+
+
+def terrain_store_version(engine):
+    """当前数据库分块地形版本（各图层块数与最近更新时间，每STORE_CHECK_SECONDS秒检查一次）；不可用时为None"""
+    return _cached[0] if get_terrain_store(engine) is not None else None
@@ -0,0 +1,6 @@
+# backend/tests/conftest.py
+"""测试时把backend目录加入导入路径（后端模块为平铺结构）"""
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
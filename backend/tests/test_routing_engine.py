@@ -0,0 +1,90 @@
+# backend/tests/test_routing_engine.py
+"""
+RoutingEngine（CSR + 链收缩A*）与NetworkX Dijkstra在随机路网上的路径代价一致性
+- 参考图按原NetworkX建图规则构造：按边ID顺序添加，主路/支路添加反向边（爬升/下降互换），同一节点对后者覆盖前者
+"""
+import random
+
+import networkx as nx
+import pytest
+import shapely
+
+from road_network import BIDIRECTIONAL_EDGE_TYPES, RoadNetwork
+from routing_engine import NoPathError, RoutingEngine, haversine_array
+
+EDGE_TYPES = ("主路", "支路", "POI连接线")
+
+
+def random_network(seed: int, n: int = 60, m: int = 150):
+    """随机路网：(行列表, 折线列表, 节点坐标)，含度为2的折点链与同一节点对的重复边"""
+    rng = random.Random(seed)
+    coords = {node_id: (116.0 + rng.random() * 0.05, 40.0 + rng.random() * 0.05) for node_id in range(1, n + 1)}
+    pairs = [tuple(rng.sample(range(1, n + 1), 2)) for _ in range(m)]
+    # 一条折点链（中间节点度为2）与若干重复节点对
+    pairs += [(k, k + 1) for k in range(1, 8)] + pairs[:5]
+    rows, geoms = [], []
+    for edge_id, (u, v) in enumerate(pairs, start=1):
+        (x1, y1), (x2, y2) = coords[u], coords[v]
+        straight = float(haversine_array(x1, y1, x2, y2))
+        rows.append((edge_id, u, v, straight * rng.uniform(1.0, 1.5), rng.uniform(0, 30), 0.0,
+                     rng.uniform(0, 20), rng.uniform(0, 20), rng.choice(EDGE_TYPES)))
+        geoms.append(shapely.LineString([(x1, y1), ((x1 + x2) / 2, (y1 + y2) / 2 + 0.001), (x2, y2)]))
+    return rows, geoms, coords
+
+
+def reference_graph(rows) -> nx.DiGraph:
+    G = nx.DiGraph()
+    for edge_id, u, v, length_m, slope_avg, _, ascent_m, descent_m, edge_type in rows:
+        G.add_edge(u, v, length_m=length_m, slope_avg=slope_avg, edge_id=edge_id, ascent_m=ascent_m)
+        if edge_type in BIDIRECTIONAL_EDGE_TYPES:
+            G.add_edge(v, u, length_m=length_m, slope_avg=slope_avg, edge_id=edge_id, ascent_m=descent_m)
+    return G
+
+
+@pytest.mark.parametrize("seed", [1, 2, 3])
+@pytest.mark.parametrize("alpha", [0.0, 0.5])
+def test_shortest_path_cost_matches_dijkstra(seed, alpha):
+    rows, geoms, coords = random_network(seed)
+    engine = RoutingEngine(RoadNetwork.from_rows(rows, geoms, coords))
+    G = reference_graph(rows)
+
+    def weight(u, v, d):
+        return d["length_m"] * (1 + alpha * d["slope_avg"])
+
+    rng = random.Random(seed)
+    nodes = sorted(G.nodes)
+    for _ in range(40):
+        s, t = rng.choice(nodes), rng.choice(nodes)
+        try:
+            expected = nx.dijkstra_path_length(G, s, t, weight=weight)
+        except nx.NetworkXNoPath:
+            with pytest.raises(NoPathError):
+                engine.shortest_path(s, t, alpha)
+            continue
+        route = engine.shortest_path(s, t, alpha)
+        assert route.cost == pytest.approx(expected)
+        assert route.node_path[0] == s and route.node_path[-1] == t
+        # 返回的边序列首尾相接，且代价之和等于搜索代价
+        weights = engine.edge_weights(alpha)
+        assert sum(weights[p] for p in route.edge_positions) == pytest.approx(expected)
+        for pos, (a, b) in zip(route.edge_positions, zip(route.node_path, route.node_path[1:])):
+            assert int(engine.node_ids[engine.src[pos]]) == a and int(engine.node_ids[engine.indices[pos]]) == b
+            assert G.edges[a, b]["edge_id"] == int(engine.edge_id[pos])
+            assert G.edges[a, b]["ascent_m"] == pytest.approx(engine.ascent_m[pos])
+
+
+def test_replace_pair_matches_full_build():
+    rows, geoms, coords = random_network(7)
+    network = RoadNetwork.from_rows(rows, geoms, coords)
+    # 删除节点对(u, v)之间的全部边，再新增一条连接新节点的边
+    u, v = rows[0][1], rows[0][2]
+    kept = [i for i, row in enumerate(rows) if {row[1], row[2]} != {u, v}]
+    new_row = (len(rows) + 1, u, 999, 50.0, 3.0, 0.0, 1.0, 2.0, "主路")
+    new_geom = shapely.LineString([coords[u], (116.1, 40.1)])
+    patched = network.replace_pair(u, v, [], [], {})
+    patched = patched.replace_pair(u, 999, [new_row], [new_geom], {999: (116.1, 40.1)})
+    full = RoadNetwork.from_rows([rows[i] for i in kept] + [new_row], [geoms[i] for i in kept] + [new_geom],
+                                 {**coords, 999: (116.1, 40.1)})
+    for key in ("edge_id", "source", "target", "length_m", "coord_ptr", "coords", "node_ids", "lng", "lat"):
+        assert (getattr(patched, key) == getattr(full, key)).all(), key
+    assert [patched.type_names[c] for c in patched.type_code] == [full.type_names[c] for c in full.type_code]
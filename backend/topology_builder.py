@@ -0,0 +1,206 @@
+# backend/topology_builder.py
+"""
+路网拓扑增量构建：按经纬度网格分块节点化，只重算边发生变化的分块
+- 路网按固定边长（度）的网格分块，每块只对与该块外包框相交的边做ST_Node节点化，节点为节点化后各线段的端点（边端点与边交点）
+- 节点按坐标归属唯一的分块（左闭右开），跨块边在相邻两块都参与节点化，交点由坐标所在的块产出，块边界处不重复、不遗漏
+- 各分块节点化相互独立，使用多个数据库连接并行执行
+- 每块记录参与节点化的边（ID + 几何MD5）指纹，再次构建时只重算指纹变化的块；块内坐标不变的节点保留原ID，其余分块完全不动
+- 重算块内的边按起终点重新关联节点（source/target），并更新受影响节点的度数
+"""
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+
+# 分块边长（度，约1公里）
+TOPOLOGY_TILE_DEG = 0.01
+# 节点坐标吸附网格（度，约1厘米）：相邻分块各自计算的同一交点吸附后坐标一致
+NODE_SNAP_DEG = 1e-7
+# 并行节点化的连接数
+DEFAULT_TOPOLOGY_WORKERS = 4
+# 分块指纹表
+TOPOLOGY_TILE_TABLE = "topology_tiles"
+
+_TOPOLOGY_TILE_DDL = f"""
+CREATE TABLE IF NOT EXISTS {TOPOLOGY_TILE_TABLE} (
+    tile_x INTEGER NOT NULL,
+    tile_y INTEGER NOT NULL,
+    tile_deg DOUBLE PRECISION NOT NULL,
+    edges_md5 VARCHAR(32) NOT NULL,
+    edge_count INTEGER NOT NULL,
+    node_count INTEGER NOT NULL,
+    update_time TIMESTAMP NOT NULL DEFAULT now(),
+    PRIMARY KEY (tile_x, tile_y)
+)
+"""
+
+# 各分块的边指纹：边外包框覆盖的全部分块（边ID + 几何MD5按ID排序拼接后取MD5）
+_TILE_FINGERPRINT_SQL = """
+SELECT tx, ty, md5(string_agg(e.id || ':' || md5(ST_AsEWKB(e.geom)), ',' ORDER BY e.id)) AS edges_md5,
+       COUNT(*) AS edge_count
+FROM network_edges e,
+     generate_series(floor(ST_XMin(e.geom) / :s)::int, floor(ST_XMax(e.geom) / :s)::int) tx,
+     generate_series(floor(ST_YMin(e.geom) / :s)::int, floor(ST_YMax(e.geom) / :s)::int) ty
+GROUP BY tx, ty
+"""
+
+# 单个分块节点化：相交边整体节点化，取各线段端点，吸附网格后去重，只保留坐标落在本块内的节点
+_NODE_TILE_SQL = """
+WITH pieces AS (
+    SELECT (ST_Dump(ST_Node(ST_Collect(geom)))).geom AS g
+    FROM network_edges
+    WHERE geom && ST_MakeEnvelope(:x0, :y0, :x1, :y1, 4326)
+), points AS (
+    SELECT ST_SnapToGrid(ST_StartPoint(g), :grid) AS p FROM pieces
+    UNION ALL
+    SELECT ST_SnapToGrid(ST_EndPoint(g), :grid) FROM pieces
+)
+SELECT DISTINCT ST_X(p) AS lng, ST_Y(p) AS lat
+FROM points
+WHERE ST_X(p) >= :x0 AND ST_X(p) < :x1 AND ST_Y(p) >= :y0 AND ST_Y(p) < :y1
+"""
+
+# 起点或终点落在重算分块内的边：按最近节点重新关联source/target
+_REASSIGN_EDGES_SQL = """
+WITH dirty AS (
+    SELECT * FROM unnest(CAST(:txs AS INTEGER[]), CAST(:tys AS INTEGER[])) AS d(tx, ty)
+), affected AS (
+    SELECT e.id, e.source AS old_source, e.target AS old_target
+    FROM network_edges e
+    WHERE (floor(ST_X(ST_StartPoint(e.geom)) / :s)::int, floor(ST_Y(ST_StartPoint(e.geom)) / :s)::int)
+              IN (SELECT tx, ty FROM dirty)
+       OR (floor(ST_X(ST_EndPoint(e.geom)) / :s)::int, floor(ST_Y(ST_EndPoint(e.geom)) / :s)::int)
+              IN (SELECT tx, ty FROM dirty)
+)
+UPDATE network_edges e SET
+    source = (SELECT n.id FROM network_nodes n ORDER BY n.geom <-> ST_StartPoint(e.geom) LIMIT 1),
+    target = (SELECT n.id FROM network_nodes n ORDER BY n.geom <-> ST_EndPoint(e.geom) LIMIT 1)
+FROM affected a
+WHERE e.id = a.id
+RETURNING e.id, a.old_source, a.old_target, e.source, e.target
+"""
+
+_UPDATE_DEGREE_SQL = """
+UPDATE network_nodes n SET degree =
+    (SELECT COUNT(*) FROM network_edges e WHERE e.source = n.id) +
+    (SELECT COUNT(*) FROM network_edges e WHERE e.target = n.id)
+WHERE n.id = ANY(:ids)
+"""
+
+
+def _tile_bounds(tx: int, ty: int, tile_deg: float) -> dict:
+    return {"x0": tx * tile_deg, "y0": ty * tile_deg, "x1": (tx + 1) * tile_deg, "y1": (ty + 1) * tile_deg}
+
+
+def _node_key(lng: float, lat: float) -> tuple:
+    """节点坐标 → 吸附网格整数键（与ST_SnapToGrid一致）"""
+    return round(lng / NODE_SNAP_DEG), round(lat / NODE_SNAP_DEG)
+
+
+def _node_tile(engine, tx: int, ty: int, tile_deg: float) -> list:
+    """独立连接上节点化单个分块，返回块内节点坐标 [(lng, lat), ...]"""
+    with engine.connect() as conn:
+        rows = conn.execute(text(_NODE_TILE_SQL), {**_tile_bounds(tx, ty, tile_deg), "grid": NODE_SNAP_DEG})
+        return [(row.lng, row.lat) for row in rows]
+
+
+def build_topology(db: Session, force: bool = False, tile_deg: float = TOPOLOGY_TILE_DEG,
+                   workers: int = DEFAULT_TOPOLOGY_WORKERS) -> dict:
+    """
+    增量构建路网拓扑（network_nodes + 边source/target + 节点度数），只重算边指纹变化的分块
+    :param db: 数据库会话（在其中提交节点/边/指纹的全部变更）
+    :param force: True：忽略已记录的分块指纹，全部分块重新节点化（坐标不变的节点仍保留原ID）
+    :param tile_deg: 分块边长（度），与上次构建不同时全部分块视为变化
+    :param workers: 并行节点化的连接数
+    :return: 构建统计（分块数、重算分块数、保留/新增/删除节点数、重新关联的边数、耗时）
+    """
+    started = time.perf_counter()
+    db.execute(text(_TOPOLOGY_TILE_DDL))
+    current = {(row.tx, row.ty): row for row in db.execute(text(_TILE_FINGERPRINT_SQL), {"s": tile_deg})}
+    stored = {} if force else {(row.tile_x, row.tile_y): row.edges_md5 for row in db.execute(text(
+        f"SELECT tile_x, tile_y, edges_md5 FROM {TOPOLOGY_TILE_TABLE} WHERE tile_deg = :s"
+    ), {"s": tile_deg})}
+    dirty = sorted({tile for tile, row in current.items() if stored.get(tile) != row.edges_md5} |
+                   {tile for tile in stored if tile not in current})
+    report = {"tile_deg": tile_deg, "tile_count": len(current), "dirty_tiles": len(dirty),
+              "nodes_kept": 0, "nodes_inserted": 0, "nodes_deleted": 0, "edges_reassigned": 0}
+    if not dirty:
+        report["elapsed_s"] = round(time.perf_counter() - started, 2)
+        return report
+
+    # 1. 各变化分块并行节点化（已无边的分块不产生节点）
+    engine = db.get_bind()
+    candidates = {tile: [] for tile in dirty}
+    noding = [tile for tile in dirty if tile in current]
+    with ThreadPoolExecutor(max_workers=max(1, min(workers, len(noding) or 1))) as pool:
+        for tile, points in zip(noding, pool.map(lambda t: _node_tile(engine, t[0], t[1], tile_deg), noding)):
+            candidates[tile] = points
+
+    # 2. 与块内现有节点按吸附坐标比对：坐标不变的保留原ID，其余删除/新增
+    txs, tys = [tile[0] for tile in dirty], [tile[1] for tile in dirty]
+    existing = db.execute(text(
+        "SELECT n.id, ST_X(n.geom) AS lng, ST_Y(n.geom) AS lat FROM network_nodes n "
+        "JOIN unnest(CAST(:txs AS INTEGER[]), CAST(:tys AS INTEGER[])) AS d(tx, ty) "
+        "ON floor(ST_X(n.geom) / :s)::int = d.tx AND floor(ST_Y(n.geom) / :s)::int = d.ty"
+    ), {"txs": txs, "tys": tys, "s": tile_deg}).fetchall()
+    kept, deleted = {}, []
+    for row in existing:
+        key = _node_key(row.lng, row.lat)
+        if key in kept:
+            deleted.append(row.id)  # 吸附后坐标重复的节点只保留一个
+        else:
+            kept[key] = row.id
+    new_points = []
+    wanted = set()
+    for points in candidates.values():
+        for lng, lat in points:
+            key = _node_key(lng, lat)
+            wanted.add(key)
+            if key not in kept:
+                new_points.append((lng, lat))
+    deleted += [node_id for key, node_id in kept.items() if key not in wanted]
+    kept_ids = [node_id for key, node_id in kept.items() if key in wanted]
+
+    if deleted:
+        db.execute(text("DELETE FROM network_nodes WHERE id = ANY(:ids)"), {"ids": deleted})
+    inserted_ids = []
+    if new_points:
+        inserted_ids = [row.id for row in db.execute(text(
+            "INSERT INTO network_nodes (geom, degree, create_time) "
+            "SELECT ST_SetSRID(ST_MakePoint(x, y), 4326), 0, NOW() "
+            "FROM unnest(CAST(:xs AS DOUBLE PRECISION[]), CAST(:ys AS DOUBLE PRECISION[])) AS p(x, y) "
+            "RETURNING id"
+        ), {"xs": [p[0] for p in new_points], "ys": [p[1] for p in new_points]})]
+
+    # 3. 端点落在变化分块内的边重新关联起终点节点
+    reassigned = db.execute(text(_REASSIGN_EDGES_SQL), {"txs": txs, "tys": tys, "s": tile_deg}).fetchall()
+
+    # 4. 更新受影响节点（块内节点、边新旧起终点）的度数
+    touched = set(kept_ids) | set(inserted_ids)
+    for row in reassigned:
+        touched.update((row.old_source, row.old_target, row.source, row.target))
+    touched.difference_update(deleted)
+    if touched:
+        db.execute(text(_UPDATE_DEGREE_SQL), {"ids": sorted(touched)})
+
+    # 5. 记录分块指纹（分块边长变化时清除旧边长的记录）
+    db.execute(text(f"DELETE FROM {TOPOLOGY_TILE_TABLE} WHERE tile_deg <> :s"), {"s": tile_deg})
+    db.execute(text(
+        f"DELETE FROM {TOPOLOGY_TILE_TABLE} t USING unnest(CAST(:txs AS INTEGER[]), CAST(:tys AS INTEGER[])) AS d(tx, ty) "
+        "WHERE t.tile_x = d.tx AND t.tile_y = d.ty"
+    ), {"txs": txs, "tys": tys})
+    rows = [{"tx": tile[0], "ty": tile[1], "s": tile_deg, "md5": current[tile].edges_md5,
+             "edges": current[tile].edge_count, "nodes": len(candidates[tile])} for tile in noding]
+    if rows:
+        db.execute(text(
+            f"INSERT INTO {TOPOLOGY_TILE_TABLE} (tile_x, tile_y, tile_deg, edges_md5, edge_count, node_count, update_time) "
+            "VALUES (:tx, :ty, :s, :md5, :edges, :nodes, NOW())"
+        ), rows)
+    db.commit()
+
+    report.update(nodes_kept=len(kept_ids), nodes_inserted=len(inserted_ids), nodes_deleted=len(deleted),
+                  edges_reassigned=len(reassigned), elapsed_s=round(time.perf_counter() - started, 2))
+    print(f"✅ 拓扑增量构建：{len(dirty)}/{len(current)} 个分块重算，节点保留 {len(kept_ids)}、"
+          f"新增 {len(inserted_ids)}、删除 {len(deleted)}，重新关联 {len(reassigned)} 条边")
+    return report
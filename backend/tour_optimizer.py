@@ -0,0 +1,205 @@
+# backend/tour_optimizer.py
+"""
+POI游览顺序优化（非对称TSP启发式）
+- 初始解：最近邻构造
+- 局部改进：2-opt（片段反转）+ Or-opt（长度1~3的片段平移），交替进行直到无改进
+- 剩余时间预算内做迭代局部搜索：对当前最优解做double-bridge扰动后再次局部改进，更优则接受
+- 可移动点不超过EXACT_MAX_POINTS个时改为枚举全部排列，直接得到最优顺序
+- 代价矩阵来自路网真实路线（matrix.cost_matrix），支持单向边导致的非对称代价
+- 支持固定起点/终点、往返（回到起点）三种约束
+"""
+import itertools
+import math
+import random
+import time
+
+import numpy as np
+
+# 不可达点对的惩罚代价（保证启发式仍能给出顺序，结果中标记为不可达）
+UNREACHABLE_PENALTY = 1e12
+# 迭代局部搜索最多扰动次数（时间预算先到则提前结束）
+MAX_PERTURBATIONS = 500
+# 可移动点数不超过该值时枚举全部排列求精确解（8! = 40320种）
+EXACT_MAX_POINTS = 8
+
+
+class TourResult:
+    """优化结果：访问顺序（矩阵下标）、总代价、局部搜索轮数、是否用尽时间预算"""
+
+    def __init__(self, order: list, cost: float, iterations: int, timed_out: bool, initial_cost: float):
+        self.order = order
+        self.cost = cost
+        self.iterations = iterations
+        self.timed_out = timed_out
+        self.initial_cost = initial_cost
+
+
+def optimize_tour(cost: np.ndarray, start: int = None, end: int = None, round_trip: bool = False,
+                  time_budget_s: float = 1.0) -> TourResult:
+    """
+    求解访问全部点的低代价顺序
+    :param cost: k×k代价矩阵（cost[i][j]为i→j路线代价，不可达为inf）
+    :param start: 固定起点下标（None表示自由）
+    :param end: 固定终点下标（None表示自由；round_trip时忽略；与start相同时按往返处理）
+    :param round_trip: True=回到起点的闭合路线
+    :param time_budget_s: 时间预算（秒）
+    :return: TourResult
+    """
+    deadline = time.perf_counter() + time_budget_s
+    k = len(cost)
+    D = np.where(np.isfinite(cost), cost, UNREACHABLE_PENALTY).tolist()
+    # 起终点为同一点：即从该点出发并回到该点的往返路线
+    if start is not None and start == end:
+        round_trip = True
+    if round_trip:
+        end = None
+    if k <= 1:
+        return TourResult(list(range(k)), 0.0, 0, False, 0.0)
+
+    def path_cost(order):
+        total = sum(D[a][b] for a, b in zip(order, order[1:]))
+        if round_trip:
+            total += D[order[-1]][order[0]]
+        return total
+
+    order = _nearest_neighbour(D, start, end)
+    initial_cost = path_cost(order)
+    # 首尾固定的位置不参与移动
+    lo = 1 if (start is not None or round_trip) else 0
+    hi = k - 1 if end is not None else k
+
+    def local_search(candidate) -> bool:
+        """2-opt与Or-opt交替直到无改进；超出时间预算返回False"""
+        improved = True
+        while improved:
+            if time.perf_counter() > deadline:
+                return False
+            improved = _two_opt(candidate, D, lo, hi, round_trip, deadline)
+            improved = _or_opt(candidate, D, lo, hi, round_trip, deadline) or improved
+        return True
+
+    iterations = 1
+    timed_out = not local_search(order)
+    best_cost = path_cost(order)
+    if hi - lo <= EXACT_MAX_POINTS:
+        # 点数较少：以局部搜索结果为初始上界枚举可移动区间的全部排列
+        order, best_cost, exhausted = _enumerate(order, lo, hi, path_cost, best_cost, deadline)
+        return TourResult(order, best_cost, iterations, timed_out or not exhausted, initial_cost)
+    # 迭代局部搜索：固定随机种子，保证相同输入结果可复现
+    rng = random.Random(0)
+    while not timed_out and iterations <= MAX_PERTURBATIONS:
+        candidate = _double_bridge(order, lo, hi, rng)
+        timed_out = not local_search(candidate)
+        iterations += 1
+        candidate_cost = path_cost(candidate)
+        if candidate_cost < best_cost - 1e-9:
+            order, best_cost = candidate, candidate_cost
+    return TourResult(order, best_cost, iterations, timed_out, initial_cost)
+
+
+def _enumerate(order, lo, hi, path_cost, best_cost, deadline) -> tuple:
+    """
+    枚举order[lo:hi]的全部排列（首尾固定位置不变）
+    :return: (最优顺序, 最优代价, 是否枚举完毕：超出时间预算时为False，返回已找到的最优解)
+    """
+    head, tail = order[:lo], order[hi:]
+    best = order
+    for n, middle in enumerate(itertools.permutations(order[lo:hi])):
+        if n % 1024 == 0 and time.perf_counter() > deadline:
+            return best, best_cost, False
+        candidate = head + list(middle) + tail
+        candidate_cost = path_cost(candidate)
+        if candidate_cost < best_cost - 1e-9:
+            best, best_cost = candidate, candidate_cost
+    return best, best_cost, True
+
+
+def _double_bridge(order, lo, hi, rng) -> list:
+    """double-bridge扰动：可移动区间切成A|B|C|D四段后重排为A|C|B|D（不反转片段，适合非对称代价）"""
+    a, b, c = sorted(rng.sample(range(lo + 1, hi), 3))
+    return order[:a] + order[b:c] + order[a:b] + order[c:]
+
+
+def _nearest_neighbour(D, start, end) -> list:
+    k = len(D)
+    remaining = set(range(k))
+    if end is not None:
+        remaining.discard(end)
+    if start is None:
+        # 自由起点：选出边代价最小的点作为起点
+        start = min(remaining, key=lambda i: min((D[i][j] for j in remaining if j != i), default=0.0))
+    remaining.discard(start)
+    order = [start]
+    while remaining:
+        last = order[-1]
+        nxt = min(remaining, key=lambda j: D[last][j])
+        order.append(nxt)
+        remaining.discard(nxt)
+    if end is not None and end != start:
+        order.append(end)
+    return order
+
+
+def _neighbors(order, i, j, round_trip):
+    """片段order[i..j]的前驱/后继点（开放路线越界为None，闭合路线首尾相接）"""
+    prev_node = order[i - 1] if i > 0 else (order[-1] if round_trip else None)
+    next_node = order[j + 1] if j + 1 < len(order) else (order[0] if round_trip else None)
+    return prev_node, next_node
+
+
+def _c(D, a, b) -> float:
+    """a → b 的代价，任一端为None（开放路线的虚拟端点）时为0"""
+    return 0.0 if a is None or b is None else D[a][b]
+
+
+def _two_opt(order, D, lo, hi, round_trip, deadline) -> bool:
+    """2-opt：反转 order[i..j]，非对称代价需重新累计片段内部边"""
+    improved = False
+    for i in range(lo, hi - 1):
+        if time.perf_counter() > deadline:
+            break
+        for j in range(i + 1, hi):
+            prev_node, next_node = _neighbors(order, i, j, round_trip)
+            inner_old = sum(D[order[x]][order[x + 1]] for x in range(i, j))
+            inner_new = sum(D[order[x + 1]][order[x]] for x in range(i, j))
+            old = _c(D, prev_node, order[i]) + inner_old + _c(D, order[j], next_node)
+            new = _c(D, prev_node, order[j]) + inner_new + _c(D, order[i], next_node)
+            if new - old < -1e-9:
+                order[i:j + 1] = reversed(order[i:j + 1])
+                improved = True
+    return improved
+
+
+def _or_opt(order, D, lo, hi, round_trip, deadline) -> bool:
+    """Or-opt：把长度1~3的片段（保持方向）移动到其他位置，增量O(1)计算代价变化"""
+    improved = False
+    fixed_tail = len(order) - hi  # 末尾固定点个数（固定终点时为1）
+    for seg_len in (1, 2, 3):
+        i = lo
+        while i + seg_len <= hi:
+            if time.perf_counter() > deadline:
+                return improved
+            first, last = order[i], order[i + seg_len - 1]
+            prev_node, next_node = _neighbors(order, i, i + seg_len - 1, round_trip)
+            removed_gain = _c(D, prev_node, first) + _c(D, last, next_node) - _c(D, prev_node, next_node)
+            rest = order[:i] + order[i + seg_len:]
+            best_delta, best_pos = 0.0, None
+            # 插入位置p：插在rest[p-1]与rest[p]之间，固定首尾不可越过
+            for p in range(lo, len(rest) - fixed_tail + 1):
+                if p == i:
+                    continue
+                a = rest[p - 1] if p > 0 else (rest[-1] if round_trip else None)
+                b = rest[p] if p < len(rest) else (rest[0] if round_trip else None)
+                delta = _c(D, a, first) + _c(D, last, b) - _c(D, a, b) - removed_gain
+                if delta < best_delta - 1e-9:
+                    best_delta, best_pos = delta, p
+            if best_pos is not None:
+                order[:] = rest[:best_pos] + order[i:i + seg_len] + rest[best_pos:]
+                improved = True
+            else:
+                i += 1
+    return improved
+
+
+def is_reachable(cost: float) -> bool:
+    return math.isfinite(cost) and cost < UNREACHABLE_PENALTY